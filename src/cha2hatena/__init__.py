@@ -1,6 +1,9 @@
 __version__ = "0.1.0"
 
 import logging
+import time
+
+PROCESS_STARTED_NS = time.time_ns()  # 起動時間（インポート含む）の計測用
 
 logger = logging.getLogger("cha2hatena")
 logger.setLevel(logging.WARNING)
@@ -0,0 +1,398 @@
+import asyncio
+import csv
+import hmac
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import TypeVar
+from urllib.parse import parse_qs
+
+from pydantic import BaseModel, Field
+
+from .ledger import SpendLedger
+from .log_pipeline import current_job_id
+from .scheduler import Job, PublishQueue
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+UPLOAD_SUFFIXES = (".json", ".txt", ".md")
+TERMINAL = ("done", "failed")
+
+# デーモンがジョブごとに付けるjob_id（queue-<ジョブID>-<試行回数>）
+_QUEUE_JOB_ID = re.compile(r"^queue-(\d+)-\d+$")
+_ROUTE = re.compile(r"^/jobs/(\d+)(/events)?$")
+
+# /historyで返すrecord.csvの列（APIキーの末尾・プロンプト等は返さない）
+HISTORY_FIELDS = (
+    "timestamp",
+    "conversation_title",
+    "entry_title",
+    "entry_URL",
+    "Qiita_URL",
+    "Dev.to_URL",
+    "is_draft",
+    "categories",
+    "model",
+    "input_tokens",
+    "output_tokens",
+    "total_fee (USD)",
+    "total_fee (JPY)",
+)
+
+
+class ApiConfig(BaseModel):
+    host: str = "127.0.0.1"
+    port: int = Field(default=8765, ge=0, le=65535)
+    max_upload_mb: float = Field(default=20, gt=0, description="アップロードできる会話ログの最大サイズ（MB）")
+    history_limit: int = Field(default=50, ge=1, description="/historyで返す件数の既定値")
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ProgressHub:
+    """ジョブごとの進捗（ログ）を保持し、SSEで待っている接続に知らせる
+
+    ログはジョブを実行するスレッドから届くため、待っている側へはそれぞれのイベントループ経由で知らせる。
+    終わったジョブ（done/failed）の進捗は、接続中のSSEが最後まで送れるようretain_seconds秒残してから捨てる。
+    """
+
+    def __init__(self, max_events: int = 500, retain_seconds: float = 60.0):
+        self.max_events = max_events
+        self.retain_seconds = retain_seconds
+        self._lock = threading.Lock()
+        self._events: dict[int, list[dict]] = defaultdict(list)
+        self._waiters: dict[int, set[tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = defaultdict(set)
+        self._finished: dict[int, float] = {}  # ジョブID -> 終わった時刻（time.monotonic）
+
+    def publish(self, job_id: int, event: dict) -> None:
+        with self._lock:
+            events = self._events[job_id]
+            if len(events) < self.max_events:
+                events.append(event)
+            waiters = list(self._waiters.get(job_id, ()))
+        self._wake(waiters)
+
+    def finish(self, job_id: int) -> None:
+        """ジョブが終わった（再試行しない）。待っている接続に知らせ、retain_seconds以上前に終わったジョブの進捗を捨てる"""
+        now = time.monotonic()
+        with self._lock:
+            self._finished[job_id] = now
+            for finished_id, finished_at in list(self._finished.items()):
+                if now - finished_at >= self.retain_seconds:
+                    del self._finished[finished_id]
+                    self._events.pop(finished_id, None)
+            waiters = list(self._waiters.get(job_id, ()))
+        self._wake(waiters)
+
+    @staticmethod
+    def _wake(waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Event]]) -> None:
+        for loop, wake in waiters:
+            loop.call_soon_threadsafe(wake.set)
+
+    def events(self, job_id: int, start: int = 0) -> list[dict]:
+        with self._lock:
+            return self._events.get(job_id, [])[start:]
+
+    def subscribe(self, job_id: int) -> asyncio.Event:
+        wake = asyncio.Event()
+        with self._lock:
+            self._waiters[job_id].add((asyncio.get_running_loop(), wake))
+        return wake
+
+    def unsubscribe(self, job_id: int, wake: asyncio.Event) -> None:
+        with self._lock:
+            waiters = {waiter for waiter in self._waiters.get(job_id, ()) if waiter[1] is not wake}
+            if waiters:
+                self._waiters[job_id] = waiters
+            else:
+                self._waiters.pop(job_id, None)
+
+
+class ProgressHandler(logging.Handler):
+    """キューのジョブの実行中に出たログを、そのジョブの進捗としてProgressHubへ送る"""
+
+    def __init__(self, hub: ProgressHub, level: int = logging.WARNING):
+        super().__init__(level)
+        self.hub = hub
+
+    def emit(self, record: logging.LogRecord) -> None:
+        match = _QUEUE_JOB_ID.match(current_job_id() or "")
+        if match is None:
+            return
+        event = {
+            "time": datetime.fromtimestamp(record.created).astimezone().isoformat(timespec="seconds"),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        self.hub.publish(int(match.group(1)), event)
+
+
+def job_view(job: Job) -> dict:
+    """APIで返すジョブの情報（サーバー上のパスや本文は含めない）"""
+    if job.kind == "post":
+        label = job.payload["post"]["title"]
+    else:
+        label = ", ".join(Path(path).name for path in job.payload["inputs"])
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "slot": job.slot.isoformat(),
+        "attempts": job.attempts,
+        "last_error": job.last_error,
+        "label": label,
+    }
+
+
+class ApiApp:
+    """会話ログの受け付け・ジョブの状況・実行履歴・利用額を返すASGIアプリ
+
+    受け付けた会話ログは予約投稿のキュー（PublishQueue）にすぐ実行する要約ジョブとして追加し、
+    同じプロセスのデーモン（run_daemon）が順に実行する。キューはSQLiteなので、サーバーを再起動しても失われない。
+    SQLite・ファイルの読み書きはイベントループを止めないよう専用のスレッドで行い、キューの接続はそのスレッドで1つだけ開いて使い回す。
+    """
+
+    def __init__(
+        self,
+        config: ApiConfig,
+        queue_path: Path,
+        output_dir: Path,
+        ledger_path: Path | None = None,
+        hub: ProgressHub | None = None,
+        wake: threading.Event | None = None,
+        token: str | None = None,
+        poll_interval: float = 1.0,
+    ):
+        self.config = config
+        self.queue_path = queue_path
+        self.output_dir = output_dir
+        self.ledger_path = ledger_path
+        self.hub = hub or ProgressHub()
+        self.wake = wake
+        self.token = token
+        self.poll_interval = poll_interval
+        # SQLiteの接続は開いたスレッドでしか使えないため、スレッドを1つに固定する
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-io")
+        self._queue: PublishQueue | None = None
+
+    @property
+    def queue(self) -> PublishQueue:
+        """キューの接続（_ioのスレッドからだけ使う）"""
+        if self._queue is None:
+            self._queue = PublishQueue(self.queue_path)
+        return self._queue
+
+    async def _in_io_thread(self, func: Callable[..., T], *args) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._io, partial(func, *args))
+
+    def _close_queue(self) -> None:
+        if self._queue is not None:
+            self._queue.close()
+            self._queue = None
+
+    def close(self) -> None:
+        self._io.submit(self._close_queue).result()
+        self._io.shutdown()
+
+    async def __call__(self, scope: dict, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            while (await receive())["type"] != "lifespan.shutdown":
+                await send({"type": "lifespan.startup.complete"})
+            await self._in_io_thread(self._close_queue)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+        if scope["type"] != "http":
+            return
+        try:
+            self._authorize(scope)
+            await self._dispatch(scope, receive, send)
+        except ApiError as e:
+            await _send_json(send, e.status, {"error": e.message})
+        except Exception as e:
+            logger.error(f"APIの処理中にエラーが発生しました: {e!r}")
+            logger.info("詳細: ", exc_info=True)
+            await _send_json(send, 500, {"error": "internal error"})
+
+    def _authorize(self, scope: dict) -> None:
+        if not self.token:
+            return
+        given = _headers(scope).get("authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(given.encode(), self.token.encode()):
+            raise ApiError(401, "unauthorized")
+
+    async def _dispatch(self, scope: dict, receive, send) -> None:
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        query = {key: values[-1] for key, values in parse_qs(scope.get("query_string", b"").decode()).items()}
+
+        if path == "/jobs" and method == "POST":
+            body = await self._read_body(scope, receive)
+            job = await self._in_io_thread(self.submit, query.get("name", "upload.json"), body, query)
+            return await _send_json(send, 202, job)
+        if path == "/jobs" and method == "GET":
+            return await _send_json(send, 200, await self._in_io_thread(self.jobs))
+        if route := _ROUTE.match(path):
+            if method != "GET":
+                raise ApiError(405, "method not allowed")
+            job = await self._in_io_thread(self._job, int(route.group(1)))
+            if route.group(2):
+                return await self._stream_events(job, scope, send)
+            return await _send_json(send, 200, {**job_view(job), "events": self.hub.events(job.id)})
+        if path == "/history" and method == "GET":
+            limit = query.get("limit", str(self.config.history_limit))
+            if not limit.isdigit():
+                raise ApiError(400, "limit must be a positive integer")
+            return await _send_json(send, 200, await self._in_io_thread(self.history, int(limit)))
+        if path == "/spend" and method == "GET":
+            return await _send_json(send, 200, await self._in_io_thread(self.spend, query.get("period", "month")))
+        raise ApiError(404, "not found")
+
+    async def _read_body(self, scope: dict, receive) -> bytes:
+        limit = int(self.config.max_upload_mb * 1024 * 1024)
+        content_length = _headers(scope).get("content-length") or "0"
+        if not content_length.isdigit():
+            raise ApiError(400, "content-length must be a non-negative integer")
+        if int(content_length) > limit:
+            raise ApiError(413, f"upload exceeds {self.config.max_upload_mb} MB")
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > limit:
+                raise ApiError(413, f"upload exceeds {self.config.max_upload_mb} MB")
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    def submit(self, name: str, body: bytes, query: dict) -> dict:
+        """会話ログを保存して、すぐ実行する要約ジョブを追加"""
+        name = Path(name).name
+        if not name.endswith(UPLOAD_SUFFIXES):
+            raise ApiError(400, f"file name must end with {', '.join(UPLOAD_SUFFIXES)}")
+        if not body:
+            raise ApiError(400, "empty upload")
+        try:
+            text = body.decode("utf-8-sig")
+            if name.endswith(".json"):
+                json.loads(text)
+        except ValueError as e:
+            raise ApiError(400, f"invalid upload: {e}") from e
+
+        # 会話ログの種類はファイル名から判定するため、名前は変えずにアップロードごとのディレクトリに保存する
+        upload_dir = self.output_dir / "uploads" / uuid.uuid4().hex[:12]
+        upload_dir.mkdir(parents=True)
+        path = upload_dir / name
+        path.write_text(text, encoding="utf-8")
+        payload = {"inputs": [str(path.resolve())], "compare": query.get("compare", "") in ("1", "true")}
+        job = self.queue.submit("summarize", payload, datetime.now().astimezone())
+        if self.wake is not None:
+            self.wake.set()
+        logger.warning(f"APIから要約ジョブ{job.id}を受け付けました: {name}")
+        return {**job_view(job), "events_url": f"/jobs/{job.id}/events"}
+
+    def jobs(self) -> list[dict]:
+        """新しい順に100件"""
+        jobs = self.queue.jobs(("pending", "running", "done", "failed"))
+        return [job_view(job) for job in reversed(jobs[-100:])]
+
+    def _job(self, job_id: int) -> Job:
+        job = self.queue.get(job_id)
+        if job is None:
+            raise ApiError(404, f"job {job_id} not found")
+        return job
+
+    async def _stream_events(self, job: Job, scope: dict, send) -> None:
+        """進捗をServer-Sent Eventsで送る。ジョブが終わったら（done/failed）閉じる"""
+        last_event_id = _headers(scope).get("last-event-id") or "-1"
+        try:
+            sent = max(int(last_event_id) + 1, 0)
+        except ValueError as e:
+            raise ApiError(400, "Last-Event-ID must be an integer") from e
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache")],
+            }
+        )
+        status = None
+        wake = self.hub.subscribe(job.id)
+        try:
+            while True:
+                wake.clear()
+                for event in self.hub.events(job.id, sent):
+                    await _send_event(send, "log", event, sent)
+                    sent += 1
+                job = await self._in_io_thread(self._job, job.id)
+                if job.status != status:
+                    status = job.status
+                    await _send_event(send, "status", job_view(job))
+                if status in TERMINAL:
+                    break
+                try:
+                    await asyncio.wait_for(wake.wait(), self.poll_interval)
+                except TimeoutError:
+                    pass
+        finally:
+            self.hub.unsubscribe(job.id, wake)
+        await send({"type": "http.response.body", "body": b""})
+
+    def history(self, limit: int) -> list[dict]:
+        """record.csvの新しい順の実行履歴（HISTORY_FIELDSの列だけ）"""
+        csv_path = self.output_dir / "record.csv"
+        if not csv_path.exists():
+            return []
+        with csv_path.open(newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.DictReader(f))
+        return [{field: row.get(field, "") for field in HISTORY_FIELDS} for row in rows[::-1][:limit]]
+
+    def spend(self, period: str) -> list[dict]:
+        if period not in ("day", "month"):
+            raise ApiError(400, "period must be day or month")
+        if self.ledger_path is None:
+            raise ApiError(404, "budget ledger is disabled (budget.enable)")
+        with SpendLedger(self.ledger_path) as ledger:
+            return ledger.report(period)
+
+
+def _headers(scope: dict) -> dict[str, str]:
+    return {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+
+
+async def _send_json(send, status: int, data) -> None:
+    body = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_event(send, event: str, data: dict, event_id: int | None = None) -> None:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, default=str)}")
+    await send({"type": "http.response.body", "body": ("\n".join(lines) + "\n\n").encode("utf-8"), "more_body": True})
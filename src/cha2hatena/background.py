@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import threading
+from collections.abc import Coroutine
+from concurrent.futures import Future, wait
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundLoop:
+    """専用スレッドで動くイベントループ
+
+    通知など、投稿の完了を待たせたくない処理をここへ流す。HTTPクライアントはループ内で1つを共有し、
+    接続を使い回す。終了時はshutdownで未完了の処理を待ってから閉じる。
+    """
+
+    def __init__(self, name: str = "background"):
+        self.loop = asyncio.new_event_loop()
+        self._client: httpx.AsyncClient | None = None
+        self._pending: set[Future] = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """ループ内で共有するHTTPクライアント（リクエストはループ内のコルーチンから行う）"""
+        if self._client is None:
+            self._client = httpx.AsyncClient()
+        return self._client
+
+    def submit(self, coro: Coroutine) -> Future:
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"バックグラウンド処理でエラーが発生しました: {future.exception()!r}")
+
+    def shutdown(self, timeout: float | None = None) -> bool:
+        """未完了の処理をtimeout秒まで待ってからループを止める。すべて完了していればTrue"""
+        with self._lock:
+            pending = list(self._pending)
+        _, not_done = wait(pending, timeout=timeout)
+        for future in not_done:
+            future.cancel()
+        if not_done:
+            logger.warning("一部のバックグラウンド処理が時間内に終わらなかったため中断しました。")
+
+        asyncio.run_coroutine_threadsafe(self._close(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        return not not_done
+
+    async def _close(self) -> None:
+        # shieldで守られた内側のタスクなど、呼び出し元のキャンセルが届かないものも止める
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
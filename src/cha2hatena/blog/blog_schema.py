@@ -22,6 +22,12 @@ class HatenaSecretKeys(BaseModel):
         return self.model_dump(exclude={"hatena_entry_url"}, by_alias=True)
 
 
+class BlogConfig(BaseModel):
+    qiita: bool = False
+    devto: bool = False
+    preset_category: list[str] = Field(default_factory=list, description="LLMが付けたカテゴリーに加えるカテゴリー")
+
+
 class AbstractBlogPoster(BaseModel, ABC):
     @abstractmethod
     async def blog_post(self): ...
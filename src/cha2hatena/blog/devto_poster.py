@@ -1,17 +1,20 @@
 import logging
+import os
+from datetime import UTC, datetime
 from typing import ClassVar
 import json
 
 from httpx import AsyncClient, Response
 from pydantic import Field, ValidationError
 
+from ..tracing import span
 from .blog_schema import AbstractBlogPoster, DevToResponseSchema
 
 logger = logging.getLogger(__name__)
 
 
 class DevToPoster(AbstractBlogPoster):
-    entry_point: ClassVar[str] = "https://dev.to/api/articles"
+    entry_point: ClassVar[str] = os.getenv("DEVTO_ENTRY_URL", "https://dev.to/api/articles")
 
     title: str
     body_markdown: str = Field(alias="content", description="マークダウン方式のブログ本文")
@@ -20,20 +23,21 @@ class DevToPoster(AbstractBlogPoster):
     tags: list[str] = Field(
         default_factory=list, 
         alias="categories", 
-        max_length=4, 
-        description="タグは最大4個まで"
+        description="タグ（最大4個・英数字のみ。DevToRendererで整形済みのものを渡す）"
     )
     preset_tags: list[str] = Field(
         default_factory=list,
         alias="preset_categories",
-        max_length=4,
-        description="プリセットタグ。tagsと合わせて最大4個まで",
+        description="プリセットタグ",
         exclude=True
     )
     description: str | None = None
     canonical_url: str | None = None
     series: str | None = None
     main_image: str | None = None
+    published_at: datetime | None = Field(
+        default=None, alias="updated", description="予約公開の時刻（未来の場合のみ送信）"
+    )
 
     def model_post_init(self, __context):
         """初期化後にtagsを結合"""
@@ -41,10 +45,15 @@ class DevToPoster(AbstractBlogPoster):
         if hasattr(self, 'published'):
             self.published = not self.published
         
-        # tagsとpreset_tagsを結合
-        all_tags = list(self.tags) + list(self.preset_tags)
-        # 最大4個に制限
-        self.tags = all_tags[:4]
+        # tagsとpreset_tagsを結合（上限や表記の調整はDevToRenderer.tagsで行う）
+        self.tags = list(self.tags) + list(self.preset_tags)
+
+        # 過去の時刻を指定すると投稿日が遡るため、未来の場合のみ予約公開にする
+        if self.published_at is not None:
+            if self.published_at.tzinfo is None:
+                self.published_at = self.published_at.astimezone()
+            if self.published_at <= datetime.now(UTC):
+                self.published_at = None
 
     async def blog_post(self, httpx_client: AsyncClient) -> dict:
         response = await self.devto_auth(httpx_client)
@@ -56,20 +65,23 @@ class DevToPoster(AbstractBlogPoster):
         # Dev.to APIは {"article": {...}} という入れ子構造が必要
         payload = {
             "article": self.model_dump(
+                mode="json",
                 exclude_none=True
             )
         }
         
         logger.debug(f"送信するペイロード: {payload}")
         
-        response = await httpx_client.post(
-            url=self.entry_point,
-            json=payload,
-            headers={
-                "api-key": self.api_key,
-                "Content-Type": "application/json"
-            },
-        )
+        with span("http.post", service="devto") as s:
+            response = await httpx_client.post(
+                url=self.entry_point,
+                json=payload,
+                headers={
+                    "api-key": self.api_key,
+                    "Content-Type": "application/json"
+                },
+            )
+            s.set_attribute("status_code", response.status_code)
         
         logger.debug(f"レスポンス: {response.text}")
         response.raise_for_status()
@@ -3,10 +3,10 @@ import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta, timezone
 from typing import Any
 from pydantic import Field
-from ..setup import DEBUG
 import httpx
 from authlib.integrations.httpx_client import OAuth1Auth
 
+from ..tracing import span
 from .blog_schema import AbstractBlogPoster, HatenaResponseSchema, HatenaSecretKeys
 
 logger = logging.getLogger(__name__)
@@ -88,9 +88,11 @@ class HatenaBlogPoster(AbstractBlogPoster):
             **self.hatena_secret_keys.get_auth_params(),
             force_include_body=True,  # ← これを追加
         )
-        response = await httpx_client.post(
-            URL, auth=auth, content=xml_str, headers={"Content-Type": "application/xml; charset=utf-8"}
-        )
+        with span("http.post", service="hatena") as s:
+            response = await httpx_client.post(
+                URL, auth=auth, content=xml_str, headers={"Content-Type": "application/xml; charset=utf-8"}
+            )
+            s.set_attribute("status_code", response.status_code)
 
         logger.debug(f"Status: {response.status_code}")
         if response.status_code == 201:
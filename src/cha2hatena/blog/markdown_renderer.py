@@ -0,0 +1,358 @@
+import re
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+FENCE = re.compile(r"^(\s{0,3})(`{3,}|~{3,})\s*([^`\s]*)\s*(.*)$")
+HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+TABLE_DELIMITER = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+FOOTNOTE_DEF = re.compile(r"^\[\^([^\]]+)\]:\s*(.*)$")
+FOOTNOTE_REF = re.compile(r"\[\^([^\]]+)\](?!:)")
+LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+THEMATIC_BREAK = re.compile(r"^\s{0,3}([-*_])(\s*\1){2,}\s*$")
+BARE_URL = re.compile(r"^<?(https?://[^\s<>]+)>?$")
+CODE_SPAN = re.compile(r"(`+)(.+?)\1")
+
+LANGUAGE_ALIASES = {
+    "py": "python",
+    "python3": "python",
+    "sh": "bash",
+    "shell": "bash",
+    "zsh": "bash",
+    "console": "bash",
+    "js": "javascript",
+    "ts": "typescript",
+    "yml": "yaml",
+    "c++": "cpp",
+    "golang": "go",
+    "txt": "text",
+    "plaintext": "text",
+    "ps1": "powershell",
+}
+
+
+# --- AST ---
+
+
+class Heading(BaseModel):
+    kind: Literal["heading"] = "heading"
+    level: int
+    text: str
+
+
+class Paragraph(BaseModel):
+    kind: Literal["paragraph"] = "paragraph"
+    text: str
+
+
+class CodeBlock(BaseModel):
+    kind: Literal["code"] = "code"
+    language: str = ""
+    filename: str = ""
+    code: str
+
+
+class Table(BaseModel):
+    kind: Literal["table"] = "table"
+    header: list[str]
+    align: list[Literal["left", "center", "right", ""]]
+    rows: list[list[str]]
+
+
+class BlockQuote(BaseModel):
+    kind: Literal["quote"] = "quote"
+    children: list["Block"]
+
+
+class ListBlock(BaseModel):
+    """リストは入れ子を含めて元のMarkdownのまま保持する（どのサービスでも同じ書き方で通じるため）"""
+
+    kind: Literal["list"] = "list"
+    lines: list[str]
+
+
+class LinkCard(BaseModel):
+    kind: Literal["link_card"] = "link_card"
+    url: str
+
+
+class ThematicBreak(BaseModel):
+    kind: Literal["hr"] = "hr"
+
+
+Block = Heading | Paragraph | CodeBlock | Table | BlockQuote | ListBlock | LinkCard | ThematicBreak
+BlockQuote.model_rebuild()
+
+
+class MarkdownDocument(BaseModel):
+    blocks: list[Block]
+    footnotes: dict[str, str] = Field(default_factory=dict, description="脚注のラベル→本文（出現順）")
+
+
+# --- パーサー ---
+
+
+def _split_row(line: str) -> list[str]:
+    line = line.strip().removeprefix("|")
+    if line.endswith("|") and not line.endswith("\\|"):
+        line = line[:-1]
+    return [cell.strip() for cell in re.split(r"(?<!\\)\|", line)]
+
+
+def _alignment(cell: str) -> Literal["left", "center", "right", ""]:
+    cell = cell.strip()
+    if cell.startswith(":") and cell.endswith(":"):
+        return "center"
+    if cell.endswith(":"):
+        return "right"
+    if cell.startswith(":"):
+        return "left"
+    return ""
+
+
+def _starts_block(lines: list[str], idx: int) -> bool:
+    line = lines[idx]
+    return bool(
+        FENCE.match(line)
+        or HEADING.match(line)
+        or line.lstrip().startswith(">")
+        or LIST_ITEM.match(line)
+        or THEMATIC_BREAK.match(line)
+        or FOOTNOTE_DEF.match(line)
+        or ("|" in line and idx + 1 < len(lines) and TABLE_DELIMITER.match(lines[idx + 1]))
+    )
+
+
+def parse_markdown(text: str) -> MarkdownDocument:
+    """LLMが出力したMarkdownをブロック単位のASTに変換する（インラインの記法は文字列のまま持つ）"""
+    footnotes: dict[str, str] = {}
+    blocks = _parse_blocks(text.replace("\r\n", "\n").split("\n"), footnotes)
+    return MarkdownDocument(blocks=blocks, footnotes=footnotes)
+
+
+def _parse_blocks(lines: list[str], footnotes: dict[str, str]) -> list[Block]:
+    blocks: list[Block] = []
+    idx = 0
+    while idx < len(lines):
+        line = lines[idx]
+        if not line.strip():
+            idx += 1
+            continue
+
+        if fence := FENCE.match(line):
+            indent, marker, info, rest = fence.groups()
+            language, _, filename = info.partition(":")
+            closing = re.compile(rf"^\s{{0,3}}{re.escape(marker[0])}{{{len(marker)},}}\s*$")
+            code_lines = []
+            idx += 1
+            while idx < len(lines) and not closing.match(lines[idx]):
+                code_lines.append(lines[idx].removeprefix(indent))
+                idx += 1
+            idx += 1  # 閉じフェンス（なければ末尾まで）
+            blocks.append(CodeBlock(language=language, filename=filename or rest, code="\n".join(code_lines)))
+        elif heading := HEADING.match(line):
+            blocks.append(Heading(level=len(heading.group(1)), text=heading.group(2)))
+            idx += 1
+        elif THEMATIC_BREAK.match(line):
+            blocks.append(ThematicBreak())
+            idx += 1
+        elif footnote := FOOTNOTE_DEF.match(line):
+            body = [footnote.group(2)]
+            idx += 1
+            while idx < len(lines) and lines[idx].startswith(("    ", "\t")):
+                body.append(lines[idx].strip())
+                idx += 1
+            footnotes[footnote.group(1)] = " ".join(body).strip()
+        elif line.lstrip().startswith(">"):
+            quoted = []
+            while idx < len(lines) and lines[idx].lstrip().startswith(">"):
+                quoted.append(re.sub(r"^\s*>\s?", "", lines[idx]))
+                idx += 1
+            blocks.append(BlockQuote(children=_parse_blocks(quoted, footnotes)))
+        elif "|" in line and idx + 1 < len(lines) and TABLE_DELIMITER.match(lines[idx + 1]):
+            header = _split_row(line)
+            align = [_alignment(cell) for cell in _split_row(lines[idx + 1])]
+            idx += 2
+            rows = []
+            while idx < len(lines) and "|" in lines[idx] and lines[idx].strip():
+                rows.append(_split_row(lines[idx]))
+                idx += 1
+            blocks.append(Table(header=header, align=(align + [""] * len(header))[: len(header)], rows=rows))
+        elif LIST_ITEM.match(line):
+            items = []
+            while idx < len(lines) and (
+                LIST_ITEM.match(lines[idx])
+                or (lines[idx].startswith((" ", "\t")) and lines[idx].strip())
+                or (not lines[idx].strip() and idx + 1 < len(lines) and lines[idx + 1].startswith((" ", "\t")))
+            ):
+                items.append(lines[idx])
+                idx += 1
+            blocks.append(ListBlock(lines=items))
+        else:
+            paragraph = [line]
+            idx += 1
+            while idx < len(lines) and lines[idx].strip() and not _starts_block(lines, idx):
+                paragraph.append(lines[idx])
+                idx += 1
+            url = BARE_URL.match(paragraph[0].strip()) if len(paragraph) == 1 else None
+            if url:
+                blocks.append(LinkCard(url=url.group(1)))
+            else:
+                blocks.append(Paragraph(text="\n".join(paragraph)))
+    return blocks
+
+
+# --- レンダラー ---
+
+
+class MarkdownRenderer:
+    """ASTから各サービス向けのMarkdownを組み立てる。サービスごとの違いはサブクラスで上書きする"""
+
+    max_tags: int | None = None
+    min_heading_level: int = 1
+
+    def render(self, document: MarkdownDocument) -> str:
+        self._footnote_numbers = {label: idx for idx, label in enumerate(document.footnotes, 1)}
+        self._footnotes = document.footnotes
+        levels = [block.level for block in document.blocks if isinstance(block, Heading)]
+        self._heading_shift = max(0, self.min_heading_level - min(levels)) if levels else 0
+        body = self.render_blocks(document.blocks)
+        notes = self.render_footnotes(document.footnotes)
+        return (body + ("\n\n" + notes if notes else "")).strip() + "\n"
+
+    def render_blocks(self, blocks: list[Block]) -> str:
+        return "\n\n".join(getattr(self, f"render_{block.kind}")(block) for block in blocks)
+
+    # ブロック
+    def render_heading(self, block: Heading) -> str:
+        return f"{'#' * min(block.level + self._heading_shift, 6)} {self.inline(block.text)}"
+
+    def render_paragraph(self, block: Paragraph) -> str:
+        return self.inline(block.text)
+
+    def render_code(self, block: CodeBlock) -> str:
+        language = self.language(block.language)
+        fence = "~~~" if "```" in block.code else "```"
+        caption = f"`{block.filename}`\n" if block.filename else ""
+        return f"{caption}{fence}{language}\n{block.code}\n{fence}"
+
+    def render_table(self, block: Table) -> str:
+        delimiters = {"left": ":---", "center": ":---:", "right": "---:", "": "---"}
+        lines = [
+            "| " + " | ".join(self.inline(cell) for cell in block.header) + " |",
+            "| " + " | ".join(delimiters[align] for align in block.align) + " |",
+        ]
+        for row in block.rows:
+            cells = (row + [""] * len(block.header))[: len(block.header)]
+            lines.append("| " + " | ".join(self.inline(cell) for cell in cells) + " |")
+        return "\n".join(lines)
+
+    def render_quote(self, block: BlockQuote) -> str:
+        return "\n".join(f"> {line}" if line else ">" for line in self.render_blocks(block.children).split("\n"))
+
+    def render_list(self, block: ListBlock) -> str:
+        return self.inline("\n".join(block.lines))
+
+    def render_link_card(self, block: LinkCard) -> str:
+        return block.url
+
+    def render_hr(self, block: ThematicBreak) -> str:
+        return "---"
+
+    # インライン
+    def inline(self, text: str) -> str:
+        """コードスパンの外側の脚注参照を置き換える"""
+        if not self._footnotes:
+            return text
+        parts = CODE_SPAN.split(text)
+        # splitはキャプチャグループを含むため、3つ組(本文, 区切り, コード)の本文だけを処理する
+        for idx in range(0, len(parts), 3):
+            parts[idx] = FOOTNOTE_REF.sub(lambda m: self.footnote_ref(m.group(1)), parts[idx])
+        return "".join(
+            part if idx % 3 == 0 else (part + parts[idx + 1] + part if idx % 3 == 1 else "")
+            for idx, part in enumerate(parts)
+        )
+
+    def footnote_ref(self, label: str) -> str:
+        return f"[^{label}]"
+
+    def render_footnotes(self, footnotes: dict[str, str]) -> str:
+        return "\n".join(f"[^{label}]: {text}" for label, text in footnotes.items())
+
+    def language(self, language: str) -> str:
+        language = language.lower()
+        return LANGUAGE_ALIASES.get(language, language)
+
+    # タグ
+    def normalize_tag(self, tag: str) -> str:
+        return tag.strip()
+
+    def tags(self, categories: list[str], preset_categories: list[str]) -> list[str]:
+        """重複を除き、上限を超える分はプリセットを優先して残す"""
+        seen: set[str] = set()
+
+        def _unique(tags: list[str]) -> list[str]:
+            result = []
+            for tag in map(self.normalize_tag, tags):
+                if tag and tag.lower() not in seen:
+                    seen.add(tag.lower())
+                    result.append(tag)
+            return result
+
+        presets = _unique(preset_categories)
+        categories = _unique(categories)
+        if self.max_tags is None:
+            return categories + presets
+        presets = presets[: self.max_tags]
+        return categories[: self.max_tags - len(presets)] + presets
+
+
+class HatenaRenderer(MarkdownRenderer):
+    """はてなブログ（Markdownモード）：脚注は((...))記法、リンクはブログカードで埋め込む"""
+
+    def footnote_ref(self, label: str) -> str:
+        text = self._footnotes.get(label)
+        return f"(({text}))" if text is not None else f"[^{label}]"
+
+    def render_footnotes(self, footnotes: dict[str, str]) -> str:
+        return ""
+
+    def render_link_card(self, block: LinkCard) -> str:
+        return f"[{block.url}:embed:cite]"
+
+
+class QiitaRenderer(MarkdownRenderer):
+    """Qiita：コードブロックは言語:ファイル名、単独行のURLはそのままでリンクカードになる。タグは5個まで"""
+
+    max_tags = 5
+
+    def render_code(self, block: CodeBlock) -> str:
+        language = self.language(block.language) or ("text" if block.filename else "")
+        info = f"{language}:{block.filename}" if block.filename else language
+        fence = "~~~" if "```" in block.code else "```"
+        return f"{fence}{info}\n{block.code}\n{fence}"
+
+    def normalize_tag(self, tag: str) -> str:
+        return re.sub(r"\s+", "-", tag.strip())
+
+
+class DevToRenderer(MarkdownRenderer):
+    """Dev.to：見出しはh2から、リンクは{% embed %}、脚注は番号と末尾の一覧。タグは英数字の小文字で4個まで"""
+
+    max_tags = 4
+    min_heading_level = 2
+
+    def footnote_ref(self, label: str) -> str:
+        number = self._footnote_numbers.get(label)
+        return f"<sup>[{number}](#fn-{number})</sup>" if number else f"[^{label}]"
+
+    def render_footnotes(self, footnotes: dict[str, str]) -> str:
+        if not footnotes:
+            return ""
+        return "\n".join(f'{idx}. <a id="fn-{idx}"></a>{text}' for idx, text in enumerate(footnotes.values(), 1))
+
+    def render_link_card(self, block: LinkCard) -> str:
+        return f"{{% embed {block.url} %}}"
+
+    def normalize_tag(self, tag: str) -> str:
+        return re.sub(r"[^a-z0-9]", "", tag.lower())
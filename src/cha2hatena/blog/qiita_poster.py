@@ -1,18 +1,19 @@
 import json
 import logging
+import os
 from typing import ClassVar
 
 from httpx import AsyncClient, Response
 from pydantic import Field, ValidationError, computed_field, field_serializer
 
-from ..setup import DEBUG
+from ..tracing import span
 from .blog_schema import AbstractBlogPoster, QiitaResponseSchema, QiitaTag
 
 logger = logging.getLogger(__name__)
 
 
 class QiitaPoster(AbstractBlogPoster):
-    entry_point: ClassVar[str] = "https://qiita.com/api/v2/items"
+    entry_point: ClassVar[str] = os.getenv("QIITA_ENTRY_URL", "https://qiita.com/api/v2/items")
 
     title: str
     body: str = Field(alias="content", description="マークダウン方式のブログ本文")
@@ -21,13 +22,11 @@ class QiitaPoster(AbstractBlogPoster):
     tweet: bool | None = Field(default=None)
     cats: list[str] = Field(
         alias="categories",
-        max_length=4,
-        description="ブログのタグ（カテゴリー）。プリセットと合わせて最大5個まで",
+        description="ブログのタグ（カテゴリー）。プリセットと合わせて最大5個まで（QiitaRendererで調整済みのものを渡す）",
         exclude=True,
     )
     preset_cats: list[str] = Field(
         alias="preset_categories",
-        max_length=1,
         description="ブログのタグ（カテゴリー）。tagsとあわせて最大5個まで",
         exclude=True,
     )
@@ -52,11 +51,13 @@ class QiitaPoster(AbstractBlogPoster):
     async def qiita_auth(self, httpx_client: AsyncClient) -> Response:
         logger.warning("Qiitaへのリクエスト開始...")
         logger.debug(f"パラメータ: {self.model_dump()}")
-        response = await httpx_client.post(
-            url=self.entry_point,
-            json=self.model_dump(exclude_none=True),
-            headers={"Authorization": f"Bearer {self.access_token}", "Content-Type": "application/json"},
-        )
+        with span("http.post", service="qiita") as s:
+            response = await httpx_client.post(
+                url=self.entry_point,
+                json=self.model_dump(exclude_none=True),
+                headers={"Authorization": f"Bearer {self.access_token}", "Content-Type": "application/json"},
+            )
+            s.set_attribute("status_code", response.status_code)
         return response
 
     @staticmethod
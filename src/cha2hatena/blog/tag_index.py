@@ -0,0 +1,156 @@
+import csv
+import logging
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+_SEPARATORS = re.compile(r"[\s\-_.・/]+")
+_DIGITS = re.compile(r"\d+")
+
+
+class TagIndexConfig(BaseModel):
+    enable: bool = False
+    threshold: float = Field(
+        default=0.9, gt=0, le=1, description="Jaro-Winkler類似度がこれ以上なら既存のカテゴリーに揃える"
+    )
+    min_length_ratio: float = Field(
+        default=0.6, ge=0, le=1, description="短い方/長い方の文字数の比がこれ未満なら別物とみなす（Java/JavaScript等）"
+    )
+    ngram: int = Field(default=2, ge=1, description="候補を絞り込むn-gramの長さ")
+
+
+def normalize_tag(tag: str) -> str:
+    """表記ゆれの比較用キー（全角半角・大文字小文字・区切り文字を無視）"""
+    return _SEPARATORS.sub("", unicodedata.normalize("NFKC", tag).casefold())
+
+
+def is_variant(a: str, b: str) -> bool:
+    """比較用キーが別物ではなく表記ゆれになりうるか
+
+    数字（バージョン）が違うもの（Gemini 2.5/2.0、Python 3.13/3.12、python3/python）と、
+    先頭の文字が違うもの（Preact/React）は、綴りが近くても別物とみなす。
+    """
+    return a[:1] == b[:1] and _DIGITS.findall(a) == _DIGITS.findall(b)
+
+
+def ngrams(text: str, n: int) -> set[str]:
+    if len(text) <= n:
+        return {text}
+    return {text[i : i + n] for i in range(len(text) - n + 1)}
+
+
+def jaro_winkler(a: str, b: str, prefix_scale: float = 0.1) -> float:
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    window = max(max(len(a), len(b)) // 2 - 1, 0)
+    a_matched = [False] * len(a)
+    b_matched = [False] * len(b)
+    matches = 0
+    for i, char in enumerate(a):
+        for j in range(max(0, i - window), min(len(b), i + window + 1)):
+            if not b_matched[j] and b[j] == char:
+                a_matched[i] = b_matched[j] = True
+                matches += 1
+                break
+    if matches == 0:
+        return 0.0
+    a_chars = [char for char, matched in zip(a, a_matched) if matched]
+    b_chars = [char for char, matched in zip(b, b_matched) if matched]
+    transpositions = sum(x != y for x, y in zip(a_chars, b_chars)) / 2
+    jaro = (matches / len(a) + matches / len(b) + (matches - transpositions) / matches) / 3
+
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_scale * (1 - jaro)
+
+
+class TagIndex:
+    """過去に使ったカテゴリーの転置インデックス
+
+    LLMが毎回自由に付けるカテゴリーを、表記ゆれ・ほぼ同じ既存のカテゴリーに揃える。
+    候補はn-gramの転置インデックスで絞り込み、Jaro-Winkler類似度で比較するためLLMを呼ばずに済む。
+    数字・先頭の文字が違うものは類似度によらず揃えない（is_variant）。
+    """
+
+    def __init__(self, config: TagIndexConfig | None = None):
+        self.config = config or TagIndexConfig()
+        self.surfaces: dict[str, Counter[str]] = defaultdict(Counter)  # 比較用キー -> 表記ごとの使用回数
+        self.postings: dict[str, set[str]] = defaultdict(set)  # n-gram -> 比較用キー
+
+    def __len__(self) -> int:
+        return len(self.surfaces)
+
+    def add(self, tags: list[str]) -> None:
+        for tag in tags:
+            tag = tag.strip()
+            key = normalize_tag(tag)
+            if not key:
+                continue
+            if key not in self.surfaces:
+                for gram in ngrams(key, self.config.ngram):
+                    self.postings[gram].add(key)
+            self.surfaces[key][tag] += 1
+
+    def count(self, key: str) -> int:
+        return sum(self.surfaces[key].values())
+
+    def canonical(self, key: str) -> str:
+        """最も多く使われている表記"""
+        return self.surfaces[key].most_common(1)[0][0]
+
+    @classmethod
+    def from_csv(cls, path: Path, config: TagIndexConfig | None = None) -> "TagIndex":
+        """record.csvのcategories列から作成"""
+        index = cls(config)
+        if not path.exists():
+            return index
+        with path.open(newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                index.add((row.get("categories") or "").split(","))
+        return index
+
+    def match(self, tag: str) -> tuple[str, float] | None:
+        """最も近い既存のカテゴリーと類似度。閾値未満ならNone"""
+        key = normalize_tag(tag)
+        if not key:
+            return None
+        if key in self.surfaces:
+            return self.canonical(key), 1.0
+
+        candidates: set[str] = set()
+        for gram in ngrams(key, self.config.ngram):
+            candidates |= self.postings.get(gram, set())
+        best: tuple[float, int, str] | None = None
+        for candidate in candidates:
+            if min(len(key), len(candidate)) / max(len(key), len(candidate)) < self.config.min_length_ratio:
+                continue
+            if not is_variant(key, candidate):
+                continue
+            score = jaro_winkler(key, candidate)
+            if score >= self.config.threshold and (best is None or (score, self.count(candidate)) > best[:2]):
+                best = (score, self.count(candidate), candidate)
+        if best is None:
+            return None
+        return self.canonical(best[2]), best[0]
+
+    def snap(self, tags: list[str]) -> list[str]:
+        """既存のカテゴリーに揃え、揃えた結果の重複を除く"""
+        result: list[str] = []
+        for tag in tags:
+            matched = self.match(tag)
+            snapped = matched[0] if matched else tag.strip()
+            if matched and snapped != tag:
+                logger.info(f"カテゴリーを揃えました: {tag} → {snapped}（類似度{matched[1]:.2f}）")
+            if snapped and normalize_tag(snapped) not in {normalize_tag(done) for done in result}:
+                result.append(snapped)
+        return result
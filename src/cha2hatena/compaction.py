@@ -0,0 +1,156 @@
+import hashlib
+import logging
+import re
+
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+CODE_FENCE_PATTERN = re.compile(r"```[^\n]*\n.*?```", re.DOTALL)
+TRACEBACK_HEAD = "Traceback (most recent call last):"
+# テキスト形式の会話ログで発言の始まりとみなす行（「agent: You」「[👤 User ...]」「User:」など）
+SPEAKER_PATTERN = re.compile(
+    r"^(?=agent:\s|\[(?:👤|🤖) |(?:user|assistant|human|you|ai)\s*[:：])", re.IGNORECASE | re.MULTILINE
+)
+
+
+class CompactionConfig(BaseModel):
+    enable: bool = Field(default=False, description="LLM送信前に会話ログを圧縮するか")
+    max_code_lines: int = Field(default=40, ge=4, description="コードブロックの最大行数")
+    max_traceback_lines: int = Field(default=12, ge=2, description="スタックトレースの最大行数")
+    max_message_chars: int = Field(default=4000, ge=200, description="1発言あたりの最大文字数")
+    min_duplicate_chars: int = Field(default=200, ge=1, description="重複判定の対象とする最小文字数")
+
+
+def estimate_tokens(text: str) -> int:
+    """トークン数の概算: ASCIIは約4文字で1トークン、それ以外（日本語等）は約1文字で1トークン"""
+    ascii_count = len(text.encode("ascii", "ignore"))  # 1文字ずつ数えるより桁違いに速い
+    return (ascii_count + 3) // 4 + (len(text) - ascii_count)
+
+
+def _omitted(count: int, unit: str = "行") -> str:
+    return f"...（{count}{unit}省略）..."
+
+
+def truncate_code_blocks(text: str, max_lines: int) -> str:
+    """長すぎるコードブロックの中間を省略"""
+
+    def _truncate(match: re.Match) -> str:
+        lines = match.group(0).split("\n")
+        # 先頭のフェンス行と末尾のフェンス行を除いた本体
+        body = lines[1:-1]
+        if len(body) <= max_lines:
+            return match.group(0)
+        head = max_lines * 2 // 3
+        tail = max_lines - head
+        kept = body[:head] + [_omitted(len(body) - head - tail)] + body[-tail:]
+        return "\n".join([lines[0], *kept, lines[-1]])
+
+    return CODE_FENCE_PATTERN.sub(_truncate, text)
+
+
+def truncate_tracebacks(text: str, max_lines: int) -> str:
+    """Pythonのスタックトレースを先頭行と末尾のフレームのみに短縮"""
+    if TRACEBACK_HEAD not in text:
+        return text
+
+    lines = text.split("\n")
+    result = []
+    i = 0
+    while i < len(lines):
+        if lines[i].strip() != TRACEBACK_HEAD:
+            result.append(lines[i])
+            i += 1
+            continue
+
+        # インデントされたフレーム行と、最後の例外行までをひとかたまりとみなす
+        start = i
+        i += 1
+        while i < len(lines) and lines[i].startswith((" ", "\t")):
+            i += 1
+        if i < len(lines) and lines[i].strip():
+            i += 1
+        block = lines[start:i]
+
+        if len(block) > max_lines:
+            tail = max_lines - 1
+            block = [block[0], _omitted(len(block) - 1 - tail), *block[-tail:]]
+        result.extend(block)
+    return "\n".join(result)
+
+
+def truncate_message(text: str, max_chars: int) -> str:
+    """長すぎる発言の中間を省略"""
+    if len(text) <= max_chars:
+        return text
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    return text[:head] + f"\n{_omitted(len(text) - head - tail, '文字')}\n" + text[-tail:]
+
+
+class Compactor:
+    """会話ログの圧縮器。重複判定のため複数ファイルをまたいで同じインスタンスを使う"""
+
+    def __init__(self, config: CompactionConfig):
+        self.config = config
+        self._seen_hashes: set[str] = set()
+        self.original_tokens = 0
+        self.compacted_tokens = 0
+
+    @property
+    def reduction_rate(self) -> float:
+        if self.original_tokens == 0:
+            return 0.0
+        return 1 - self.compacted_tokens / self.original_tokens
+
+    def dedupe(self, text: str) -> str:
+        """既出の貼り付け内容（コードブロック・段落）を参照に置換"""
+
+        def _replace(block: str) -> str:
+            normalized = re.sub(r"\s+", " ", block).strip()
+            if len(normalized) < self.config.min_duplicate_chars:
+                return block
+            digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+            if digest in self._seen_hashes:
+                return "（既出の内容と重複のため省略）"
+            self._seen_hashes.add(digest)
+            return block
+
+        text = CODE_FENCE_PATTERN.sub(lambda m: _replace(m.group(0)), text)
+        # コードブロック以外は空行区切りの段落単位で判定
+        parts = re.split(r"(```[^\n]*\n.*?```)", text, flags=re.DOTALL)
+        for idx in range(0, len(parts), 2):
+            parts[idx] = "\n\n".join(_replace(p) for p in parts[idx].split("\n\n"))
+        return "".join(parts)
+
+    def compact(self, text: str, truncate: bool = True) -> str:
+        """1発言分のテキストを圧縮。truncate=Falseなら発言の長さは切り詰めない"""
+        text = self.dedupe(text)
+        text = truncate_code_blocks(text, self.config.max_code_lines)
+        text = truncate_tracebacks(text, self.config.max_traceback_lines)
+        text = re.sub(r"\n{3,}", "\n\n", text)
+        return truncate_message(text, self.config.max_message_chars) if truncate else text
+
+    def compact_document(self, text: str) -> str:
+        """テキスト形式の会話ログ全体を圧縮
+
+        発言の区切りが分かる場合は発言ごとに圧縮する。分からない場合は会話全体を1発言とみなさず、
+        発言の長さでは切り詰めない（会話の中間が丸ごと省略されるのを防ぐ）。
+        """
+        starts = [match.start() for match in SPEAKER_PATTERN.finditer(text)]
+        if not starts:
+            return self.compact(text, truncate=False)
+        bounds = [0, *starts] if starts[0] > 0 else starts
+        messages = [text[start:end] for start, end in zip(bounds, [*bounds[1:], len(text)])]
+        return "".join(self.compact(message) for message in messages)
+
+    def record(self, original: str, compacted: str) -> None:
+        """圧縮前後のトークン数（概算）を集計"""
+        self.original_tokens += estimate_tokens(original)
+        self.compacted_tokens += estimate_tokens(compacted)
+
+    def report(self) -> None:
+        logger.warning(
+            f"会話ログを圧縮しました: 約{self.original_tokens}→{self.compacted_tokens}トークン"
+            f"（{self.reduction_rate:.1%}削減）"
+        )
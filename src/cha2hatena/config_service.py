@@ -0,0 +1,149 @@
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pydantic import BaseModel, ConfigDict
+
+from .api import ApiConfig
+from .blog.blog_schema import BlogConfig
+from .blog.tag_index import TagIndexConfig
+from .compaction import CompactionConfig
+from .ledger import BudgetConfig
+from .llm.comparison import ComparisonConfig
+from .llm.conversational_ai import LlmConfig
+from .llm.factory import AiConfig
+from .media import MediaConfig
+from .metrics import MetricsConfig
+from .notification.notifier_schema import NotificationConfig
+from .records import GoogleSheetsConfig
+from .retrieval import ContextConfig
+from .scheduler import ScheduleConfig
+from .search_index import SearchConfig
+from .setup import OtherConfig, PathsConfig, build_llm_config, config_setup, get_DEBUG, get_yaml_config
+from .tenants import TenantsConfig
+from .tracing import TracingConfig
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigSnapshot(BaseModel):
+    """検証済みの設定一式。読み込んだ後は変更せず、再読み込みのたびに新しいものを作る"""
+
+    model_config = ConfigDict(frozen=True)
+
+    version: int
+    loaded_at: datetime
+    config: dict
+    secret_keys: dict
+    llm_config: LlmConfig
+    debug: bool
+    ai: AiConfig
+    paths: PathsConfig
+    blog: BlogConfig
+    budget: BudgetConfig
+    schedule: ScheduleConfig
+    search: SearchConfig
+    context: ContextConfig
+    category_index: TagIndexConfig
+    tenants: TenantsConfig
+    notification: NotificationConfig
+    media: MediaConfig
+    compaction: CompactionConfig
+    comparison: ComparisonConfig
+    api: ApiConfig
+    tracing: TracingConfig
+    metrics: MetricsConfig
+    google_sheets: GoogleSheetsConfig
+    other: OtherConfig
+
+    @classmethod
+    def build(cls, config: dict, secret_keys: dict, version: int = 1) -> "ConfigSnapshot":
+        """config.yamlの各節を検証する。不正な値があればValidationError"""
+
+        def section(name: str) -> dict:
+            return config.get(name) or {}
+
+        return cls(
+            version=version,
+            loaded_at=datetime.now(),
+            config=config,
+            secret_keys=secret_keys,
+            llm_config=build_llm_config(config, secret_keys),
+            debug=get_DEBUG(config),
+            ai=AiConfig.model_validate(section("ai")),
+            paths=PathsConfig.model_validate(section("paths")),
+            blog=BlogConfig.model_validate(section("blog")),
+            budget=BudgetConfig.model_validate(section("budget")),
+            schedule=ScheduleConfig.model_validate(section("schedule")),
+            search=SearchConfig.model_validate(section("search")),
+            context=ContextConfig.model_validate(section("search").get("context") or {}),
+            category_index=TagIndexConfig.model_validate(section("blog").get("category_index") or {}),
+            tenants=TenantsConfig.model_validate(section("tenants")),
+            notification=NotificationConfig.model_validate(section("notification")),
+            media=MediaConfig.model_validate(section("media")),
+            compaction=CompactionConfig.model_validate(section("compaction")),
+            comparison=ComparisonConfig.model_validate(section("comparison")),
+            api=ApiConfig.model_validate(section("api")),
+            tracing=TracingConfig.model_validate(section("tracing")),
+            metrics=MetricsConfig.model_validate(section("metrics")),
+            google_sheets=GoogleSheetsConfig.model_validate(section("google_sheets")),
+            other=OtherConfig.model_validate(section("other")),
+        )
+
+
+def _stamp(path: Path) -> tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ConfigService:
+    """config.yamlと.envの変更を検知して、検証済みの設定に丸ごと差し替える
+
+    current()は参照を1回読むだけなので、処理の途中で取得した設定が書き換わることはない。
+    新しい設定の読み込み・検証に失敗した場合は、エラーを記録して前の設定を使い続ける。
+    """
+
+    def __init__(
+        self,
+        config_path: Path = Path("config.yaml"),
+        env_path: Path = Path(".env"),
+        snapshot: ConfigSnapshot | None = None,
+    ):
+        self.config_path = config_path
+        self.env_path = env_path
+        self._lock = threading.Lock()
+        self._stamps = self._current_stamps()
+        self._snapshot = snapshot or self._load(version=1)
+
+    def current(self) -> ConfigSnapshot:
+        return self._snapshot
+
+    def _current_stamps(self) -> tuple:
+        return _stamp(self.config_path), _stamp(self.env_path)
+
+    def _load(self, version: int) -> ConfigSnapshot:
+        config = get_yaml_config(self.config_path)
+        if self.env_path.exists():
+            load_dotenv(self.env_path, override=True)
+        return ConfigSnapshot.build(*config_setup(config), version=version)
+
+    def reload_if_changed(self) -> bool:
+        """ファイルが変更されていれば読み込み直す。差し替えた場合はTrue"""
+        with self._lock:
+            stamps = self._current_stamps()
+            if stamps == self._stamps:
+                return False
+            self._stamps = stamps
+            try:
+                snapshot = self._load(version=self._snapshot.version + 1)
+            except Exception as e:
+                logger.error(f"設定を再読み込みできなかったため、前の設定のまま続けます: {e}")
+                return False
+            self._snapshot = snapshot
+        logger.warning(f"設定を再読み込みしました（版{snapshot.version}）。")
+        return True
@@ -3,6 +3,8 @@ import logging
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from .compaction import Compactor
+
 logger = logging.getLogger(__name__)
 
 
@@ -45,7 +47,14 @@ def get_agent(message: dict, ai_name: str) -> str:
     return agent
 
 
-def convert_to_str(messages: dict, ai_name: str) -> tuple[list, datetime | None]:
+def format_message(agent: str, timestamp: str | None, text: str, compact: bool = False) -> str:
+    """1発言分のテキストを整形。compact時は簡潔なヘッダーにする"""
+    if compact:
+        return f"[{agent} {timestamp}]\n{text}\n" if timestamp else f"[{agent}]\n{text}\n"
+    return f"## agent: {agent} | date: {timestamp}  \nmessage:  \n{text}\n\n{'-' * 3}\n\n"
+
+
+def convert_to_str(messages: dict, ai_name: str, compactor: Compactor | None = None) -> tuple[list, datetime | None]:
     """jsonの本丸を処理"""
 
     logger.warning(f"{len(messages)}件のメッセージを処理中...")
@@ -85,21 +94,33 @@ def convert_to_str(messages: dict, ai_name: str) -> tuple[list, datetime | None]
 
         # メッセージを取得
         if "say" in message:
-            text = message.get("say", "").replace("\n\n", "\n")
+            raw_text = message.get("say", "")
         elif "content" in message:  # for Claude-Conversation-Extractor
-            text = message.get("content", "").replace("\n\n", "\n")
+            raw_text = message.get("content", "")
         else:
             raise KeyError
 
-        logs.append(f"## agent: {agent} | date: {timestamp}  \nmessage:  \n{text}\n\n{'-' * 3}\n\n")
+        text = raw_text.replace("\n\n", "\n")
+        if compactor is None:
+            logs.append(format_message(agent, timestamp, text))
+        else:
+            # 重複判定は段落単位で行うため、空行をまとめる前に圧縮する
+            log = format_message(agent, timestamp, compactor.compact(raw_text).replace("\n\n", "\n"), compact=True)
+            compactor.record(format_message(agent, timestamp, text), log)
+            logs.append(log)
 
         if timestamp:
             previous_dt = msg_dt
     return logs, timestamp
 
 
-def json_loader(paths: list[Path,]) -> str:
-    """複数のjsonファイルをstrに"""
+def json_loader(paths: list[Path,], compactor: Compactor | None = None) -> str:
+    """複数のjsonファイルをstrに。compactorを渡すと圧縮してから結合"""
+    return "\n\n\n".join(load_conversations(paths, compactor))
+
+
+def load_conversations(paths: list[Path,], compactor: Compactor | None = None) -> list[str]:
+    """ファイルごとの会話ログのテキスト。compactorを渡すと圧縮する"""
 
     logger.warning(f"{len(paths)}個のjsonファイルの読み込みを開始します")
 
@@ -121,7 +142,7 @@ def json_loader(paths: list[Path,]) -> str:
 
             # 会話の抽出→文字列へ
             try:
-                logs, timestamp = convert_to_str(messages, ai_name)
+                logs, timestamp = convert_to_str(messages, ai_name, compactor)
             except KeyError as e:
                 raise KeyError(f"エラー： jsonファイルの構成を確認してください - {path}") from e
 
@@ -137,7 +158,12 @@ def json_loader(paths: list[Path,]) -> str:
 
         elif path.suffix in [".txt", ".md"]:
             conversation = f"{'=' * 20} {idx}個目の会話 {'=' * 20}\n\n"
-            conversation += path.read_text(encoding="utf-8")
+            text = path.read_text(encoding="utf-8")
+            if compactor is not None:
+                compacted = compactor.compact_document(text)
+                compactor.record(text, compacted)
+                text = compacted
+            conversation += text
 
         else:
             raise ValueError(f"エラー：対応していないファイル形式です - {path.name}")
@@ -146,5 +172,7 @@ def json_loader(paths: list[Path,]) -> str:
         ai_names.append(ai_name)
 
     logger.warning(f"☑ {len(paths)}件のjsonファイルをテキストに変換しました。\n")
+    if compactor is not None:
+        compactor.report()
 
-    return "\n\n\n".join(conversations)
+    return conversations
@@ -0,0 +1,300 @@
+import hashlib
+import logging
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+from .compaction import estimate_tokens
+from .llm.conversational_ai import LlmConfig
+from .llm.llm_stats import TokenStats
+from .llm.pricing import get_price_table
+from .metrics import record_token_stats
+from .setup import get_api_key
+
+logger = logging.getLogger(__name__)
+
+EXIT_DEFERRED = 75  # sysexits.hのEX_TEMPFAIL。予算超過で見送ったジョブは後で再実行できる
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spend (
+    id INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL,
+    model TEXT NOT NULL,
+    key_id TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    usd REAL NOT NULL,
+    jpy REAL
+);
+CREATE TABLE IF NOT EXISTS totals (
+    period TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    usd REAL NOT NULL DEFAULT 0,
+    jpy REAL NOT NULL DEFAULT 0,
+    runs INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (period, scope)
+) WITHOUT ROWID;
+"""
+
+
+def key_fingerprint(api_key: str | None) -> str:
+    """APIキーそのものは保存せず、識別用の短いハッシュだけを残す"""
+    if not api_key:
+        return "-"
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def _periods(now: datetime) -> tuple[str, str]:
+    return f"day:{now:%Y-%m-%d}", f"month:{now:%Y-%m}"
+
+
+class SpendLedger:
+    """実行ごとのLLM料金を蓄積するSQLiteの台帳
+
+    明細（spend）とは別に、日・月ごと×全体/モデル/APIキーの累計（totals）を同じトランザクションで更新する。
+    予算チェックは累計を主キーで引くだけなので、明細が何件あっても一定の時間で済む。
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        # 複数プロセスが同時に書き込むバッチ実行を想定
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(
+        self,
+        model: str,
+        api_key: str | None,
+        usd: float,
+        jpy: float | None = None,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        now: datetime | None = None,
+    ) -> None:
+        now = now or datetime.now()
+        key_id = key_fingerprint(api_key)
+        scopes = ("all", f"model:{model}", f"key:{key_id}")
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute(
+                "INSERT INTO spend (recorded_at, model, key_id, input_tokens, output_tokens, usd, jpy)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (now.isoformat(timespec="seconds"), model, key_id, input_tokens, output_tokens, usd, jpy),
+            )
+            self.conn.executemany(
+                "INSERT INTO totals (period, scope, usd, jpy, runs) VALUES (?, ?, ?, ?, 1)"
+                " ON CONFLICT (period, scope) DO UPDATE SET"
+                " usd = usd + excluded.usd, jpy = jpy + excluded.jpy, runs = runs + 1",
+                [(period, scope, usd, jpy or 0) for period in _periods(now) for scope in scopes],
+            )
+        logger.debug(f"台帳に記録しました: {model} ${usd:.6f}")
+
+    def spent(self, scopes: list[str], now: datetime | None = None) -> dict[tuple[str, str], float]:
+        """(期間の種類 "day"/"month", scope) -> 累計USD。記録がなければ0"""
+        day, month = _periods(now or datetime.now())
+        keys = [(period, scope) for period in (day, month) for scope in scopes]
+        placeholders = ",".join("(?, ?)" for _ in keys)
+        rows = self.conn.execute(
+            f"SELECT period, scope, usd FROM totals WHERE (period, scope) IN (VALUES {placeholders})",
+            [value for key in keys for value in key],
+        ).fetchall()
+        found = {(period, scope): usd for period, scope, usd in rows}
+        return {(period.split(":")[0], scope): found.get((period, scope), 0.0) for period, scope in keys}
+
+    def report(self, period: Literal["day", "month"] = "month", now: datetime | None = None) -> list[dict]:
+        """指定期間の累計。scopeごとに1行"""
+        day, month = _periods(now or datetime.now())
+        rows = self.conn.execute(
+            "SELECT scope, usd, jpy, runs FROM totals WHERE period = ? ORDER BY scope",
+            (day if period == "day" else month,),
+        ).fetchall()
+        return [{"scope": scope, "usd": usd, "jpy": jpy, "runs": runs} for scope, usd, jpy, runs in rows]
+
+
+class BudgetLimit(BaseModel):
+    daily_usd: float | None = Field(default=None, ge=0)
+    monthly_usd: float | None = Field(default=None, ge=0)
+
+
+class BudgetConfig(BaseModel):
+    enable: bool = False
+    ledger_path: str = "outputs/ledger.sqlite3"
+    daily_usd: float | None = Field(default=None, ge=0, description="全モデル合計の1日の上限")
+    monthly_usd: float | None = Field(default=None, ge=0, description="全モデル合計の1か月の上限")
+    models: dict[str, BudgetLimit] = Field(default_factory=dict, description="モデルごとの上限")
+    action: Literal["downgrade", "defer", "refuse"] = Field(default="downgrade", description="上限を超える場合の動作")
+    downgrade_model: str | None = Field(default=None, description="action=downgradeの切り替え先")
+    expected_output_tokens: int = Field(default=4000, ge=0, description="試算に使う出力トークン数")
+
+
+class BudgetDecision(BaseModel):
+    action: Literal["allow", "downgrade", "defer", "refuse"]
+    model: str
+    estimated_usd: float
+    reason: str = ""
+
+
+def estimate_cost(model: str, prompt: str, expected_output_tokens: int) -> float:
+    """リクエスト前の料金の概算（キャッシュヒットは考慮しない上限寄りの値）"""
+    return get_price_table().fee(model, estimate_tokens(prompt), expected_output_tokens)
+
+
+class SpendBudget:
+    """台帳の累計と予算を比べて、LLMへリクエストする前に実行可否を決める"""
+
+    def __init__(self, config: BudgetConfig, ledger: SpendLedger):
+        self.config = config
+        self.ledger = ledger
+
+    def _exceeded(self, estimates: dict[str, float], now: datetime | None) -> str | None:
+        """estimates: モデルごとの見込み額。全体の予算とはその合計で比べる"""
+        limits = {("day", "all"): self.config.daily_usd, ("month", "all"): self.config.monthly_usd}
+        expected = {"all": sum(estimates.values())}
+        for model, estimated_usd in estimates.items():
+            model_limit = self.config.models.get(model, BudgetLimit())
+            limits[("day", f"model:{model}")] = model_limit.daily_usd
+            limits[("month", f"model:{model}")] = model_limit.monthly_usd
+            expected[f"model:{model}"] = estimated_usd
+        spent = self.ledger.spent(list(expected), now)
+        for (period, scope), limit in limits.items():
+            estimated_usd = expected[scope]
+            if limit is not None and spent[(period, scope)] + estimated_usd > limit:
+                label = "1日" if period == "day" else "1か月"
+                target = "全体" if scope == "all" else scope.removeprefix("model:")
+                return f"{target}の{label}の予算${limit}を超えます（使用済み${spent[(period, scope)]:.4f} + 見込み${estimated_usd:.4f}）"
+        return None
+
+    def check_all(self, requests: list[tuple[str, int]], now: datetime | None = None) -> BudgetDecision:
+        """1回の実行で複数のリクエストを行う場合（--compareの各モデル、multi_fileの各ファイルの要約と統合）
+
+        requestsは(モデル, 入力トークン数の見込み)のリスト。合計の見込み額で判定し、モデルの切り替えはしない。
+        """
+        estimates: dict[str, float] = {}
+        for model, input_tokens in requests:
+            fee = get_price_table().fee(model, input_tokens, self.config.expected_output_tokens)
+            estimates[model] = estimates.get(model, 0.0) + fee
+        estimated = sum(estimates.values())
+        models = ",".join(estimates)
+        reason = self._exceeded(estimates, now)
+        if reason is None:
+            return BudgetDecision(action="allow", model=models, estimated_usd=estimated)
+        action = "defer" if self.config.action == "defer" else "refuse"
+        return BudgetDecision(action=action, model=models, estimated_usd=estimated, reason=reason)
+
+    def check(self, model: str, prompt: str, now: datetime | None = None) -> BudgetDecision:
+        estimated = estimate_cost(model, prompt, self.config.expected_output_tokens)
+        reason = self._exceeded({model: estimated}, now)
+        if reason is None:
+            return BudgetDecision(action="allow", model=model, estimated_usd=estimated)
+
+        action = self.config.action
+        downgrade_model = self.config.downgrade_model
+        if action == "downgrade":
+            if downgrade_model and downgrade_model != model:
+                downgrade_estimated = estimate_cost(downgrade_model, prompt, self.config.expected_output_tokens)
+                if self._exceeded({downgrade_model: downgrade_estimated}, now) is None:
+                    return BudgetDecision(
+                        action="downgrade", model=downgrade_model, estimated_usd=downgrade_estimated, reason=reason
+                    )
+            # 切り替え先でも超える場合は実行しない
+            action = "refuse"
+        return BudgetDecision(action=action, model=model, estimated_usd=estimated, reason=reason)
+
+
+def get_usdjpy_rate(fixed_rate: float | None = None) -> float | None:
+    """USD/JPYレートを取得。fixed_rate（other.usdjpy_rate）があればその値を使う（オフライン検証用）"""
+    if fixed_rate:
+        return fixed_rate
+
+    import yfinance as yf
+
+    ticker = "USDJPY=X"
+    try:
+        return yf.Ticker(ticker).history(period="1d").Close.iloc[0]
+    except Exception as e:
+        logger.error("ヤフーファイナンスから為替レートを取得できませんでした。詳細はapp.logを確認してください")
+        logger.info(f"詳細: {e}", exc_info=True)
+        return None
+
+
+def record_spend(all_stats: list[TokenStats], dy_rate: float | None, config: BudgetConfig) -> None:
+    """LLMの使用量をメトリクスと予算の台帳に記録"""
+    for stats in all_stats:
+        record_token_stats(stats)
+    if not config.enable:
+        return
+    with SpendLedger(Path(config.ledger_path)) as ledger:
+        for stats in all_stats:
+            ledger.record(
+                stats.model_name,
+                get_api_key(stats.model_name),
+                stats.total_fee,
+                stats.total_fee * dy_rate if dy_rate is not None else None,
+                input_tokens=stats.input_tokens or 0,
+                output_tokens=(stats.output_tokens or 0) + (stats.thoughts_tokens or 0),
+            )
+
+
+def apply_budget(budget: SpendBudget, config: LlmConfig, requests: list[tuple[str, int]] | None = None) -> None:
+    """予算を超える見込みならモデルを切り替える。見送り・中止の場合は終了する
+
+    requests（1回の実行で行う全リクエストの(モデル, 入力トークン数の見込み)）があれば、その合計の見込み額で判定する。
+    """
+    if requests:
+        decision = budget.check_all(requests)
+    else:
+        decision = budget.check(config.model, config.prompt + config.conversation)
+    logger.debug(f"予算チェック: {decision}")
+    if decision.action == "allow":
+        return
+    if decision.action == "downgrade":
+        logger.warning(f"{decision.reason}。{decision.model}に切り替えます。")
+        config.model = decision.model
+        config.api_key = get_api_key(decision.model) or ""
+        return
+    if decision.action == "defer":
+        logger.warning(f"{decision.reason}。今回の実行は見送ります。")
+        sys.exit(EXIT_DEFERRED)
+    logger.error(f"{decision.reason}。実行を中止します。")
+    sys.exit(1)
+
+
+def check_budget(
+    budget_config: BudgetConfig,
+    config: LlmConfig,
+    requests: list[tuple[str, int]] | None = None,
+    hedge_model: str | None = None,
+) -> None:
+    """台帳を開いてapply_budgetを行う
+
+    hedge_model（ヘッジの切り替え先）があれば、各リクエストをそのモデルにも同時に送ることがあるため両方の料金を見込む。
+    """
+    if hedge_model:
+        requests = requests or [(config.model, estimate_tokens(config.prompt + config.conversation))]
+        requests = requests + [(hedge_model, tokens) for _, tokens in requests]
+    with SpendLedger(Path(budget_config.ledger_path)) as ledger:
+        apply_budget(SpendBudget(budget_config, ledger), config, requests)
+
+
+def print_spend_report(config: BudgetConfig) -> None:
+    """台帳の今日・今月の累計を表示"""
+    with SpendLedger(Path(config.ledger_path)) as ledger:
+        for period, label in (("day", "今日"), ("month", "今月")):
+            print(f"{label}の利用額")
+            for row in ledger.report(period):
+                print(f"  {row['scope']:<36}{row['runs']:>5}回  ${row['usd']:.4f}  {row['jpy']:.1f}円")
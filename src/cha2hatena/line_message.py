@@ -1,28 +1,101 @@
+import asyncio
 import logging
+import os
+import random
+import uuid
 
-import requests
+import httpx
 
 logger = logging.getLogger(__name__)
 
+BROADCAST_URL = os.getenv("LINE_BROADCAST_URL", "https://api.line.me/v2/bot/message/broadcast")
+MAX_MESSAGES_PER_REQUEST = 5  # broadcastで1回に送れるメッセージ数の上限
+MAX_TEXT_LENGTH = 5000  # テキストメッセージの文字数上限
 
-def line_messenger(content: str, line_access_token: str):
-    URL = r"https://api.line.me/v2/bot/message/broadcast"
 
-    logger.debug(f"LINEアクセストークン: ... {line_access_token[-5:]}")
+class LineNotifier:
+    """LINE公式アカウントからのブロードキャスト通知
 
-    if line_access_token:
-        logger.warning("アクセストークンを取得")
+    - タイムアウト付きで送信し、429・5xx・通信エラーは指数バックオフ（Retry-Afterがあればそれに従う）でリトライ
+    - リトライ時はX-Line-Retry-Keyを付け、二重送信を防ぐ
+    - 1リクエスト最大5件ずつ送る（通知をまとめるのはNotificationDispatcherのbatch_window）
+    """
+
+    def __init__(
+        self,
+        access_token: str,
+        client: httpx.AsyncClient,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+    ):
+        self.access_token = access_token
+        self.client = client
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    async def broadcast(self, texts: list[str]) -> bool:
+        """textsを5件ずつのリクエストで送信。すべて成功すればTrue"""
+        messages = [{"type": "text", "text": text[:MAX_TEXT_LENGTH]} for text in texts]
+        chunks = [messages[i : i + MAX_MESSAGES_PER_REQUEST] for i in range(0, len(messages), MAX_MESSAGES_PER_REQUEST)]
+        results = await asyncio.gather(*(self._send(chunk) for chunk in chunks))
+        return all(results)
+
+    async def _send(self, messages: list[dict]) -> bool:
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.access_token}",
+            "X-Line-Retry-Key": str(uuid.uuid4()),  # リトライしても同じキーで送り、受付済みなら409が返る
+        }
+        for attempt in range(self.max_retries + 1):
+            try:
+                res = await self.client.post(
+                    BROADCAST_URL, headers=headers, json={"messages": messages}, timeout=self.timeout
+                )
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    logger.error("LINE通知出来ませんでした。詳細は`app.log`を確認してください")
+                    logger.info(f"詳細: {e!r}")
+                    return False
+                await asyncio.sleep(self._backoff_seconds(attempt))
+                continue
+
+            if res.status_code == 200:
+                logger.warning(f"✓ LINE通知に成功しました。（{len(messages)}件）")
+                return True
+            if res.status_code == 409 and attempt > 0:
+                logger.warning("✓ LINE通知は受付済みでした。")
+                return True
+            if self._is_retryable(res) and attempt < self.max_retries:
+                wait = self._retry_after(res) or self._backoff_seconds(attempt)
+                logger.warning(f"LINE通知をリトライします（{res.status_code}、{wait:.1f}秒後）")
+                await asyncio.sleep(wait)
+                continue
+
+            self._log_failure(res)
+            return False
+        return False
 
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer <{line_access_token}>"}
+    @staticmethod
+    def _is_retryable(res: httpx.Response) -> bool:
+        if res.status_code == 429:
+            # 月間の送信上限は時間をおいても回復しない
+            return "monthly limit" not in res.text
+        return res.status_code >= 500
 
-    message = {"type": "text", "text": content}
-    body = {"messages": [message]}
+    @staticmethod
+    def _retry_after(res: httpx.Response) -> float | None:
+        try:
+            return max(float(res.headers.get("Retry-After", "")), 0.0)
+        except ValueError:
+            return None
 
-    res = requests.post(URL, headers=headers, json=body)
+    def _backoff_seconds(self, attempt: int) -> float:
+        return self.backoff * 2**attempt * random.uniform(0.5, 1.5)
 
-    if res.status_code == 200:
-        logger.warning("✓ LINE通知に成功しました。")
-    else:
+    @staticmethod
+    def _log_failure(res: httpx.Response) -> None:
         logger.error("LINE通知出来ませんでした。詳細は`app.log`を確認してください")
         logger.error(f"ステータスコード：{res.status_code}")
         try:
@@ -31,3 +104,16 @@ def line_messenger(content: str, line_access_token: str):
             logger.info(f"{res_dict['details'][0]['message']}")
         except Exception:
             logger.info("レスポンス内容を解析できませんでした。")
+
+
+async def _line_messenger(content: str, line_access_token: str) -> bool:
+    async with httpx.AsyncClient() as client:
+        return await LineNotifier(line_access_token, client).broadcast([content])
+
+
+def line_messenger(content: str, line_access_token: str) -> bool:
+    """1件だけ同期的に送る（単体での利用向け）"""
+    logger.debug(f"LINEアクセストークン: ... {line_access_token[-5:]}")
+    if line_access_token:
+        logger.warning("アクセストークンを取得")
+    return asyncio.run(_line_messenger(content, line_access_token))
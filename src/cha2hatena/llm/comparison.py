@@ -0,0 +1,174 @@
+import contextvars
+import json
+import logging
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from ..setup import get_api_key
+from ..tracing import span
+from .conversational_ai import AiOutput, ConversationalAi, LlmConfig
+from .llm_stats import TokenStats
+
+logger = logging.getLogger(__name__)
+
+
+class ComparisonConfig(BaseModel):
+    models: list[str] = Field(
+        default_factory=lambda: ["gemini-3-flash-preview", "gemini-2.5-pro", "deepseek-reasoner"],
+        min_length=1,
+        description="同じ会話ログを同時に要約させるモデル",
+    )
+    report_dir: str = Field(default="outputs/comparison", description="比較レポートの保存先")
+    auto_select: bool = Field(default=False, description="条件を満たすモデルの要約を自動で採用して投稿する")
+    max_latency: float | None = Field(default=None, gt=0, description="採用条件: 応答時間の上限（秒）")
+    max_cost_usd: float | None = Field(default=None, ge=0, description="採用条件: 料金の上限（USD）")
+    prefer: Literal["cost", "latency"] = Field(default="cost", description="条件を満たすモデルが複数ある場合の優先")
+
+
+class ComparisonResult(BaseModel):
+    """1モデル分の比較結果"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model: str
+    latency: float = Field(description="秒")
+    output: AiOutput | None = None
+    stats: TokenStats | None = Field(default=None, exclude=True)
+    error: str | None = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.output is not None
+
+    @property
+    def fee(self) -> float | None:
+        return self.stats.total_fee if self.stats else None
+
+    def quality_indicators(self) -> dict:
+        """本文の機械的な指標（良し悪しの判断は人が行う前提の参考値）"""
+        if not self.output:
+            return {}
+        lines = self.output.content.splitlines()
+        return {
+            "chars": len(self.output.content),
+            "headings": sum(1 for line in lines if line.lstrip().startswith("#")),
+            "bullets": sum(1 for line in lines if line.lstrip().startswith(("- ", "* ", "1. "))),
+            "code_blocks": self.output.content.count("```") // 2,
+            "categories": len(self.output.categories),
+        }
+
+    def to_record(self) -> dict:
+        stats = self.stats
+        return {
+            "model": self.model,
+            "latency": round(self.latency, 3),
+            "error": self.error,
+            "input_tokens": stats.input_tokens if stats else None,
+            "cached_tokens": stats.cached_tokens if stats else None,
+            "thoughts_tokens": stats.thoughts_tokens if stats else None,
+            "output_tokens": stats.output_tokens if stats else None,
+            "fee_usd": self.fee,
+            "quality": self.quality_indicators(),
+            "output": self.output.model_dump() if self.output else None,
+        }
+
+
+def _summarize(client: ConversationalAi) -> ComparisonResult:
+    started = time.perf_counter()
+    try:
+        with span("compare.model", model=client.model):
+            data, stats = client.get_summary()
+        return ComparisonResult(
+            model=client.model,
+            latency=time.perf_counter() - started,
+            output=AiOutput.model_validate(data),
+            stats=stats,
+        )
+    except (Exception, SystemExit) as e:  # sys.exitも含め、1モデルの失敗で比較全体を止めない（Ctrl-Cは止める）
+        logger.warning(f"{client.model}の要約に失敗しました: {e!r}")
+        return ComparisonResult(model=client.model, latency=time.perf_counter() - started, error=repr(e))
+
+
+def compare_models(
+    config: LlmConfig, models: list[str], create_client: Callable[[LlmConfig], ConversationalAi]
+) -> list[ComparisonResult]:
+    """同じ会話ログを複数モデルへ同時に送り、モデルの指定順に結果を返す"""
+    clients = []
+    for model in models:
+        try:
+            model_config = LlmConfig.model_validate(
+                {**config.model_dump(), "model": model, "api_key": get_api_key(model) or ""}
+            )
+        except ValueError as e:
+            logger.warning(f"{model}の設定が不正なため比較から除外します: {e}")
+            continue
+        clients.append(create_client(model_config))
+
+    logger.warning(f"{len(clients)}モデルで同時に要約します: {', '.join(client.model for client in clients)}")
+    with ThreadPoolExecutor(max_workers=max(len(clients), 1), thread_name_prefix="compare") as executor:
+        # トレースの親子関係を引き継ぐため呼び出し元のコンテキストで実行
+        futures = [executor.submit(contextvars.copy_context().run, _summarize, client) for client in clients]
+        return [future.result() for future in futures]
+
+
+def select_winner(results: list[ComparisonResult], config: ComparisonConfig) -> ComparisonResult | None:
+    """採用条件を満たす結果のうち、preferに従って最良のもの。なければNone"""
+    candidates = [
+        result
+        for result in results
+        if result.succeeded
+        and (config.max_latency is None or result.latency <= config.max_latency)
+        and (config.max_cost_usd is None or (result.fee or 0) <= config.max_cost_usd)
+    ]
+    if not candidates:
+        return None
+    if config.prefer == "latency":
+        return min(candidates, key=lambda result: result.latency)
+    return min(candidates, key=lambda result: (result.fee or 0, result.latency))
+
+
+def render_markdown(results: list[ComparisonResult], winner: ComparisonResult | None = None) -> str:
+    lines = [
+        f"# モデル比較 {datetime.now():%Y-%m-%d %H:%M}",
+        "",
+        "| モデル | 応答時間(s) | 入力 | キャッシュ | 思考 | 出力 | 料金(USD) | 文字数 | 見出し | 箇条書き | 結果 |",
+        "|---|---:|---:|---:|---:|---:|---:|---:|---:|---:|---|",
+    ]
+    for result in results:
+        record = result.to_record()
+        quality = record["quality"]
+        status = "採用" if result is winner else ("OK" if result.succeeded else "失敗")
+        fee = f"{record['fee_usd']:.6f}" if record["fee_usd"] is not None else "-"
+        lines.append(
+            f"| {result.model} | {record['latency']:.2f} | {record['input_tokens'] or '-'} "
+            f"| {record['cached_tokens'] or '-'} | {record['thoughts_tokens'] or '-'} | {record['output_tokens'] or '-'} "
+            f"| {fee} | {quality.get('chars', '-')} | {quality.get('headings', '-')} "
+            f"| {quality.get('bullets', '-')} | {status} |"
+        )
+
+    for result in results:
+        lines += ["", f"## {result.model}", ""]
+        if result.output:
+            lines += [f"**{result.output.title}**", "", f"カテゴリー: {', '.join(result.output.categories)}", ""]
+            lines.append(result.output.content)
+        else:
+            lines.append(f"エラー: `{result.error}`")
+    return "\n".join(lines) + "\n"
+
+
+def write_report(results: list[ComparisonResult], report_dir: Path, winner: ComparisonResult | None = None) -> Path:
+    """Markdown（人が読む用）とJSON（集計用）を保存し、Markdownのパスを返す"""
+    report_dir.mkdir(parents=True, exist_ok=True)
+    stem = datetime.now().strftime("%y%m%d-%H%M%S")
+    markdown_path = report_dir / f"{stem}.md"
+    markdown_path.write_text(render_markdown(results, winner), encoding="utf-8")
+    records = [{**result.to_record(), "selected": result is winner} for result in results]
+    (report_dir / f"{stem}.json").write_text(json.dumps(records, ensure_ascii=False, indent=2), encoding="utf-8")
+    logger.warning(f"比較レポートを保存しました: {markdown_path}")
+    return markdown_path
@@ -1,6 +1,6 @@
-import json
 import logging
 import sys
+import threading
 import time
 from abc import ABC, abstractmethod
 from pathlib import Path
@@ -8,6 +8,8 @@ from typing import List
 
 from pydantic import BaseModel, Field
 
+from ..metrics import LLM_RETRIES
+from ..tracing import span
 from .llm_stats import TokenStats
 
 logger = logging.getLogger(__name__)
@@ -15,10 +17,22 @@ logger = logging.getLogger(__name__)
 
 class LlmConfig(BaseModel):
     prompt: str = Field(min_length=1, description="AIに送るプロンプト")
-    model: str = Field(pattern=r"^(gemini|deepseek)-.+", default="gemini-2.5-flash", description="使用するLLMモデル")
+    model: str = Field(
+        pattern=r"^((gemini|deepseek)-|local:).+",
+        default="gemini-2.5-flash",
+        description="使用するLLMモデル。OpenAI互換のローカルサーバーは'local:モデル名'",
+    )
     temperature: float = Field(ge=0, le=2.0, default=1.1, description="生成時の温度パラメータ")
     api_key: str = Field(min_length=1, description="API キー")
     conversation: str = Field(description="会話ログ")
+    context_cache: bool = Field(default=False, description="固定プロンプトをGeminiのコンテキストキャッシュに載せるか")
+    base_url: str | None = Field(default=None, description="OpenAI互換サーバーのベースURL（localモデル用）")
+    max_concurrency: int = Field(default=1, ge=1, description="同一サーバーへの同時リクエスト数の上限（localモデル用）")
+    repair_model: str | None = Field(
+        default=None,
+        pattern=r"^((gemini|deepseek)-|local:).+",
+        description="出力のJSONが修復できない場合に、JSONの修正だけを依頼する安価なモデル",
+    )
 
 
 # llm_outputs, llm_stats = hinge(llm_config)
@@ -26,6 +40,10 @@ class LlmConfig(BaseModel):
 # llm_stats = {input_tokens:, thoughts_tokens:, output_tokens:}
 
 
+class LlmOverloadedError(Exception):
+    """プロバイダの過負荷・レート制限でリトライを使い切った場合の例外"""
+
+
 class AiOutput(BaseModel):
     title: str = Field(description="ブログのタイトル。")
     content: str = Field(description="ブログの本文（マークダウン形式）。")
@@ -34,30 +52,53 @@ class AiOutput(BaseModel):
 
 class ConversationalAi(ABC):
     def __init__(self, config: LlmConfig):
+        self.config = config
         self.model = config.model
+        self.repair_model = config.repair_model
+        self.repair_stats: TokenStats | None = None  # JSONの修正を依頼した場合の使用量
+        self.cancelled = threading.Event()  # ルーターで不要になったリクエスト（リトライ・修正依頼をしない）
         self.api_key = config.api_key
         self.temperature = config.temperature
-        self.company_name = "Google" if self.model.startswith("gemini") else "Deepseek"
+        if self.model.startswith("gemini"):
+            self.company_name = "Google"
+        elif self.model.startswith("deepseek"):
+            self.company_name = "Deepseek"
+        else:
+            self.company_name = "ローカルLLMサーバー"
         STATEMENT = ""
 
         #    f"またその最後には、「この記事は {self.model} により自動生成されています」と目立つように注記してください。"
 
-        self.prompt = config.prompt + STATEMENT + "\n\n" + config.conversation
+        # プロバイダのプレフィックスキャッシュを効かせるため、固定の指示部分と会話ログを分けて送る
+        self.instruction = config.prompt + STATEMENT
+        self.conversation = config.conversation
+        self.context_cache = config.context_cache
+        self.prompt = self.instruction + "\n\n" + self.conversation
 
     @abstractmethod
     def get_summary(self) -> tuple[dict, TokenStats]:
         pass
 
+    def cancel(self) -> None:
+        """応答を使わなくなったことを知らせる。実行中のリクエストは止められないが、以降のリトライ等は行わない"""
+        self.cancelled.set()
+
     def handle_server_error(self, i, max_retries):
+        if self.cancelled.is_set():
+            raise LlmOverloadedError(f"{self.model}: キャンセルされました")
         if i < max_retries - 1:
+            LLM_RETRIES.inc(model=self.model)
             logger.warning(f"{self.company_name}の計算資源が逼迫しているようです。{5 * (i + 1)}秒後にリトライします。")
-            time.sleep(5 * (i + 1))
+            with span("llm.retry_wait", model=self.model, seconds=5 * (i + 1)):
+                time.sleep(5 * (i + 1))
         else:
             logger.warning(f"{self.company_name}は現在過負荷のようです。少し時間をおいて再実行する必要があります。")
-            logger.warning("実行を中止します。")
-            sys.exit(1)
+            raise LlmOverloadedError(f"{self.model}: リトライ上限に達しました")
 
     def handle_client_error(self, e: Exception):
+        if getattr(e, "code", None) == 429:
+            logger.warning(f"{self.company_name}のAPIレート制限に達しました。")
+            raise LlmOverloadedError(f"{self.model}: APIレート制限") from e
         logger.error("エラー：APIレート制限。")
         logger.error("詳細はapp.logを確認してください。実行を中止します。")
         logger.info(f"詳細: {e}")
@@ -69,20 +110,64 @@ class ConversationalAi(ABC):
         logger.info(f"詳細: {e}")
         raise
 
-    def check_response(self, response_text):
-        required_keys = {"title", "content", "categories"}
+    def check_response(self, response_text: str) -> dict:
+        """出力をAiOutputとして読む。壊れていれば修復し、それでも駄目ならrepair_modelにJSONの修正だけを依頼する"""
+        from .output_repair import OutputRepairError, parse_ai_output
+
+        # 採用されなかったリクエストの結果は使われないため、進捗として表示しない
+        log = logger.debug if self.cancelled.is_set() else logger.warning
         try:
-            data = json.loads(response_text)
-            if set(data.keys()) == required_keys:
-                logger.warning(f"{self.model}が構造化出力に成功")
-        except Exception:
+            output, stage = parse_ai_output(response_text)
+            if stage == "as_is":
+                log(f"{self.model}が構造化出力に成功")
+            else:
+                log(f"{self.model}の出力が壊れていたため修復しました（{stage}）")
+            return output.model_dump()
+        except OutputRepairError as e:
+            if self.cancelled.is_set():
+                # 結果は使われないが、使用量を記録できるよう修復せずに応答を終える
+                return {}
             logger.error(f"{self.model}が構造化出力に失敗。")
-            output_path = Path.cwd() / "outputs"
-            output_path.mkdir(exist_ok=True)
-            file_path = output_path / "__summary.txt"
-            file_path.write_text(response_text, encoding="utf-8")
+            logger.info(f"詳細: {e}")
+
+        data = self.request_json_fix(response_text) if self.repair_model else None
+        if data is not None:
+            return data
 
-            logger.error(f"{file_path}へ出力を保存しました。")
-            sys.exit(1)
+        output_path = Path.cwd() / "outputs"
+        output_path.mkdir(exist_ok=True)
+        file_path = output_path / "__summary.txt"
+        file_path.write_text(response_text, encoding="utf-8")
 
+        logger.error(f"{file_path}へ出力を保存しました。")
+        sys.exit(1)
+
+    def request_json_fix(self, broken_text: str) -> dict | None:
+        """壊れたJSONの修正だけをrepair_modelに依頼（要約のやり直しはしない）。失敗した場合はNone"""
+        from ..setup import get_api_key
+        from .factory import create_ai_client
+        from .output_repair import FIX_JSON_PROMPT
+
+        logger.warning(f"{self.repair_model}にJSONの修正を依頼します。")
+        try:
+            config = LlmConfig.model_validate(
+                {
+                    **self.config.model_dump(),
+                    "prompt": FIX_JSON_PROMPT,
+                    "conversation": broken_text,
+                    "model": self.repair_model,
+                    "api_key": get_api_key(self.repair_model) or "",
+                    "repair_model": None,  # 修正の修正はしない
+                    "context_cache": False,
+                    "temperature": 0,
+                }
+            )
+            data, self.repair_stats = create_ai_client(config).get_summary()
+        except (Exception, SystemExit) as e:
+            logger.error(f"JSONの修正に失敗しました: {e!r}")
+            return None
         return data
+
+    def add_repair_stats(self, stats: TokenStats) -> TokenStats:
+        """JSONの修正を依頼していればその料金を合算"""
+        return stats + self.repair_stats if self.repair_stats else stats
@@ -1,10 +1,15 @@
 import logging
+import os
 import sys
 
-from .conversational_ai import AiOutput, ConversationalAi, TokenStats
+from ..metrics import LLM_REQUEST_SECONDS
+from ..tracing import span
+from .conversational_ai import AiOutput, ConversationalAi, LlmOverloadedError, TokenStats
 
 logger = logging.getLogger(__name__)
 
+BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+
 
 class DeepseekClient(ConversationalAi):
     def get_summary(self) -> tuple[dict, TokenStats]:
@@ -12,22 +17,31 @@ class DeepseekClient(ConversationalAi):
 
         statement = f"次の行から示すプロンプトはこのPydanticモデルに合うJSONで出力してください: {AiOutput.model_json_schema()}\n"
         self.prompt = statement + self.prompt
+        # 固定部分をsystemメッセージとして先頭に置き、DeepSeekのプレフィックスキャッシュに乗せる
+        messages = [
+            {"role": "system", "content": statement + self.instruction},
+            {"role": "user", "content": self.conversation},
+        ]
 
         logger.warning("Deepseekからの応答を待っています。")
         logger.debug(f"APIリクエスト中。APIキー: ...{self.api_key[-5:]}")
 
-        client = OpenAI(api_key=self.api_key, base_url="https://api.deepseek.com")
+        client = OpenAI(api_key=self.api_key, base_url=BASE_URL)
 
         max_retries = 3
         for i in range(max_retries):
             try:
-                response = client.chat.completions.create(
-                    model=self.model,
-                    temperature=self.temperature,
-                    messages=[{"role": "user", "content": self.prompt}],
-                    response_format={"type": "json_object"},
-                    stream=False,
-                )
+                with (
+                    span("llm.request", model=self.model, attempt=i + 1),
+                    LLM_REQUEST_SECONDS.time(model=self.model),
+                ):
+                    response = client.chat.completions.create(
+                        model=self.model,
+                        temperature=self.temperature,
+                        messages=messages,
+                        response_format={"type": "json_object"},
+                        stream=False,
+                    )
                 break
             except Exception as e:
                 # https://api-docs.deepseek.com/quick_start/error_codes
@@ -35,7 +49,7 @@ class DeepseekClient(ConversationalAi):
                     super().handle_server_error(i, max_retries)
                 elif "429" in str(e):
                     logger.error("APIレート制限。しばらく経ってから再実行してください。")
-                    raise
+                    raise LlmOverloadedError(f"{self.model}: APIレート制限") from e
                 elif "401" in str(e):
                     logger.error("エラー：APIキーが誤っているか、入力されていません。")
                     logger.error(f"実行を中止します。詳細：{e}")
@@ -61,6 +75,7 @@ class DeepseekClient(ConversationalAi):
             len(self.prompt),
             len(generated_text),
             self.model,
+            cached_tokens=getattr(response.usage, "prompt_cache_hit_tokens", 0) or 0,
         )
 
-        return data, stats
+        return data, self.add_repair_stats(stats)
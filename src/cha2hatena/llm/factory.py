@@ -0,0 +1,70 @@
+import logging
+from collections.abc import Callable
+
+from pydantic import BaseModel, Field
+
+from ..setup import get_api_key
+from .conversational_ai import ConversationalAi, LlmConfig
+from .llm_stats import TokenStats
+from .multi_file import MultiFileConfig
+from .router import LlmRouter
+
+logger = logging.getLogger(__name__)
+
+
+class LocalServerConfig(BaseModel):
+    base_url: str | None = Field(default=None, description="OpenAI互換のローカルサーバーのURL")
+    max_concurrency: int = Field(default=1, ge=1, description="同時リクエスト数の上限")
+
+
+class AiConfig(BaseModel):
+    """config.yamlのaiのうち、LlmConfig（1回のリクエストの設定）以外の項目"""
+
+    fallback_model: str | None = Field(default=None, description="過負荷時の切り替え先モデル")
+    hedge_after: float | None = Field(
+        default=None, gt=0, description="この秒数以内に応答がなければ切り替え先へも同時にリクエスト"
+    )
+    local: LocalServerConfig = Field(default_factory=LocalServerConfig)
+    multi_file: MultiFileConfig = Field(default_factory=MultiFileConfig)
+
+
+def create_ai_client(config: LlmConfig) -> ConversationalAi:
+    """モデル名に合うAIクライアントを作成（gemini-*/deepseek-*/local:*）"""
+    if config.model.startswith("gemini"):
+        from .gemini_client import GeminiClient
+
+        return GeminiClient(config)
+    if config.model.startswith("deepseek"):
+        from .deepseek_client import DeepseekClient
+
+        return DeepseekClient(config)
+    if config.model.startswith("local:"):
+        from .openai_compatible_client import OpenAiCompatibleClient
+
+        return OpenAiCompatibleClient(config)
+    raise ValueError(f"モデル名が正しくありません: {config.model}")
+
+
+def create_summarizer(
+    config: LlmConfig, ai_config: AiConfig, on_discarded: Callable[[TokenStats], None] | None = None
+) -> ConversationalAi | LlmRouter:
+    """ai.fallback_modelが設定されていればフェイルオーバー用のルーターを返す。on_discardedは採用しなかった応答の使用量"""
+    primary = create_ai_client(config)
+    fallback_model = ai_config.fallback_model
+    if not fallback_model:
+        return primary
+
+    try:
+        fallback_config = LlmConfig.model_validate(
+            {**config.model_dump(), "model": fallback_model, "api_key": get_api_key(fallback_model) or ""}
+        )
+    except ValueError as e:
+        logger.warning(f"フォールバック用モデル({fallback_model})の設定が不正なため、フェイルオーバーは行いません。")
+        logger.info(f"詳細: {e}")
+        return primary
+
+    return LlmRouter(
+        [primary, create_ai_client(fallback_config)],
+        hedge_after=ai_config.hedge_after,
+        on_discarded=on_discarded,
+    )
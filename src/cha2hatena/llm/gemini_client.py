@@ -1,10 +1,17 @@
+import hashlib
 import logging
+import os
 
+from ..metrics import LLM_REQUEST_SECONDS
+from ..tracing import span
 from .conversational_ai import AiOutput, ConversationalAi
 from .llm_stats import TokenStats
 
 logger = logging.getLogger(__name__)
 
+CACHE_TTL = "3600s"
+BASE_URL = os.getenv("GEMINI_BASE_URL")  # 検証用のモックサーバー等へ向ける場合のみ設定
+
 
 class GeminiClient(ConversationalAi):
     def get_summary(self):
@@ -15,22 +22,40 @@ class GeminiClient(ConversationalAi):
         logger.warning("Geminiからの応答を待っています。")
         logger.debug(f"APIリクエスト中。APIキー: ...{self.api_key[-5:]}")
 
+        http_options = types.HttpOptions(base_url=BASE_URL) if BASE_URL else None
         # api_key引数なしでも、環境変数"GEMNI_API_KEY"の値を勝手に参照するが、可読性のため代入
-        client = genai.Client(api_key=self.api_key)
+        client = genai.Client(api_key=self.api_key, http_options=http_options)
+
+        # 固定の指示はsystem_instructionとして先頭に置き、暗黙キャッシュの対象にする
+        cache_name = self.get_context_cache(client) if self.context_cache else None
+        if cache_name:
+            generation_config = types.GenerateContentConfig(
+                cached_content=cache_name,
+                temperature=self.temperature,
+                response_mime_type="application/json",  # 構造化出力
+                response_json_schema=AiOutput.model_json_schema(),
+            )
+        else:
+            generation_config = types.GenerateContentConfig(
+                system_instruction=self.instruction,
+                temperature=self.temperature,
+                response_mime_type="application/json",  # 構造化出力
+                response_json_schema=AiOutput.model_json_schema(),
+            )
 
         max_retries = 3
         for i in range(max_retries):
             # generate_contentメソッドは内部的にHTTPレスポンスコード200以外の場合は例外を発生させる
             try:
-                response = client.models.generate_content(  # リクエスト
-                    model=self.model,
-                    contents=self.prompt,
-                    config=types.GenerateContentConfig(
-                        temperature=self.temperature,
-                        response_mime_type="application/json",  # 構造化出力
-                        response_json_schema=AiOutput.model_json_schema(),
-                    ),
-                )
+                with (
+                    span("llm.request", model=self.model, attempt=i + 1),
+                    LLM_REQUEST_SECONDS.time(model=self.model),
+                ):
+                    response = client.models.generate_content(  # リクエスト
+                        model=self.model,
+                        contents=self.conversation,
+                        config=generation_config,
+                    )
                 print("Geminiによる要約を受け取りました。")
                 break
             except ServerError:
@@ -49,6 +74,37 @@ class GeminiClient(ConversationalAi):
             len(self.prompt),
             len(response.text),
             self.model,
+            cached_tokens=response.usage_metadata.cached_content_token_count or 0,
         )
 
-        return data, stats
+        return data, self.add_repair_stats(stats)
+
+    def get_context_cache(self, client) -> str | None:
+        """固定の指示部分の明示的キャッシュを取得（なければ作成）し、キャッシュ名を返す"""
+        from google.genai import types
+
+        # 指示内容とモデルが同じなら同じキャッシュを再利用する
+        digest = hashlib.sha1(f"{self.model}\n{self.instruction}".encode("utf-8")).hexdigest()[:16]
+        display_name = f"cha2hatena-{digest}"
+
+        try:
+            for cache in client.caches.list():
+                if cache.display_name == display_name and (cache.model or "").endswith(self.model):
+                    logger.debug(f"既存のコンテキストキャッシュを使用: {cache.name}")
+                    return cache.name
+
+            cache = client.caches.create(
+                model=self.model,
+                config=types.CreateCachedContentConfig(
+                    display_name=display_name,
+                    system_instruction=self.instruction,
+                    ttl=CACHE_TTL,
+                ),
+            )
+            logger.warning("プロンプトのコンテキストキャッシュを作成しました。")
+            return cache.name
+        except Exception as e:
+            # プロンプトが最小トークン数に満たない場合などは作成できない
+            logger.warning("コンテキストキャッシュを利用できません。暗黙キャッシュのみで続行します。")
+            logger.info(f"詳細: {e}")
+            return None
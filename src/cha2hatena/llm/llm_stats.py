@@ -1,5 +1,8 @@
 import logging
 from abc import ABC, abstractmethod
+from datetime import date
+
+from .pricing import PriceTable, get_price_table
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +16,8 @@ class TokenStats:
         input_letter_count: int,
         output_letter_count: int,
         model: str,
+        cached_tokens: int = 0,
+        on: date | None = None,
     ):
         self.input_tokens = input_tokens
         self.thoughts_tokens = thoughts_tokens
@@ -20,32 +25,52 @@ class TokenStats:
         self.input_letter_count = input_letter_count
         self.output_letter_count = output_letter_count
         self.model_name = model
-        # 遅延計算用のキャッシュ
-        self._input_fee = None
-        self._thoughts_fee = None
-        self._output_fee = None
-        
+        self.cached_tokens = cached_tokens or 0  # input_tokensのうちキャッシュヒットした分
+        self.on = on  # 料金表の適用日（省略時は今日）
+        # 遅延計算用のキャッシュ (input, thoughts, output)
+        self._fees: tuple[float, float, float] | None = None
+
+    def _calculate(self) -> tuple[float, float, float]:
+        if self._fees is None:
+            input_tokens = self.input_tokens or 0
+            input_rate, cache_hit_rate, output_rate = get_price_table().rates(self.model_name, input_tokens, self.on)
+            self._fees = (
+                (input_tokens - self.cached_tokens) * input_rate + self.cached_tokens * cache_hit_rate,
+                (self.thoughts_tokens or 0) * output_rate,
+                (self.output_tokens or 0) * output_rate,
+            )
+        return self._fees
+
+    def __add__(self, other: "TokenStats") -> "TokenStats":
+        """使用量を合算。料金はそれぞれのモデルの単価で計算した額の和（モデル名は左側のもの）"""
+        combined = TokenStats(
+            (self.input_tokens or 0) + (other.input_tokens or 0),
+            (self.thoughts_tokens or 0) + (other.thoughts_tokens or 0),
+            (self.output_tokens or 0) + (other.output_tokens or 0),
+            self.input_letter_count + other.input_letter_count,
+            self.output_letter_count + other.output_letter_count,
+            self.model_name,
+            cached_tokens=self.cached_tokens + other.cached_tokens,
+            on=self.on,
+        )
+        combined._fees = tuple(a + b for a, b in zip(self._calculate(), other._calculate()))
+        return combined
+
     @property
     def input_fee(self) -> float:
-        if self._input_fee is None:
-            self._input_fee = LlmFee(self.model_name).calculate(self.input_tokens, "input")
-        return self._input_fee
-    
+        return self._calculate()[0]
+
     @property
     def thoughts_fee(self) -> float:
-        if self._thoughts_fee is None:
-            self._thoughts_fee = LlmFee(self.model_name).calculate(self.thoughts_tokens, "thoughts")
-        return self._thoughts_fee
-    
+        return self._calculate()[1]
+
     @property
     def output_fee(self) -> float:
-        if self._output_fee is None:
-            self._output_fee = LlmFee(self.model_name).calculate(self.output_tokens, "output")
-        return self._output_fee
-    
+        return self._calculate()[2]
+
     @property
     def total_fee(self) -> float:
-        return self.input_fee + self.thoughts_fee + self.output_fee
+        return sum(self._calculate())
 
 
 class BaseLlmFee(ABC):
@@ -64,58 +89,26 @@ class BaseLlmFee(ABC):
     def calculate(self, tokens: int, token_type: str) -> float:
         pass
 
+
 class LlmFee(BaseLlmFee):
-    """2025/12/09現在"""
-
-    _fees = {
-        "gemini-2.5-flash": {"input": 0.3, "output": 2.5},  # $per 1M tokens
-        "gemini-3-flash-preview": {"input": 0.5, "output": 3.0},
-        "gemini-2.5-pro": {
-            "under_0.2M": {"input": 1.25, "output": 10.00},
-            "over_0.2M": {"input": 2.5, "output": 15.0},
-        },
-        "deepseek": {"input(cache_hit)": 0.028, "input(cache_miss)": 0.28, "output": 0.42},
-    }
-    _model_list = ["gemini-2.5-flash", "gemini-2.5-pro", "gemini-3-flash-preview", "deepseek-chat", "deepseek-reasoner"]
+    """料金表（pricing.yaml）による料金計算"""
+
+    _rate_index = {"input": 0, "input(cache_miss)": 0, "input(cache_hit)": 1, "thoughts": 2, "output": 2}
 
     @property
-    def fees(self):
-        return self._fees
+    def fees(self) -> PriceTable:
+        return get_price_table()
 
     @property
     def model_list(self):
-        return self._model_list
+        return self.fees.models
 
-    def calculate(self, tokens: int | None, token_type: str) -> float:
-        token_type = "output" if token_type == "thoughts" else token_type
+    def calculate(self, tokens: int | None, token_type: str, tier_tokens: int | None = None) -> float:
+        """token_type: "input", "input(cache_hit)", "thoughts", "output"
+        tier_tokens: 料金区分の判定に使うトークン数（省略時はtokens）"""
         tokens = 0 if not tokens else tokens
-        if self.model not in self.model_list:
-            logger.warning("料金表に登録されていないモデルです")
-            logger.warning("gemini-2.5-proの料金で試算します")
-            self.model = "gemini-2.5-pro"
-
-        if self.model.startswith("deepseek"):
-            base_fee = self.fees["deepseek"]
-
-            if token_type == "output":
-                dollar_per_1M_tokens = base_fee["output"]
-            else:
-                dollar_per_1M_tokens = base_fee["input(cache_miss)"]
-
-        elif self.model == "gemini-2.5-flash":
-            dollar_per_1M_tokens = self.fees[self.model][token_type]
-
-        elif self.model == "gemini-3-flash-preview":
-            dollar_per_1M_tokens = self.fees[self.model][token_type]
-
-        else:
-            base_fee = self.fees["gemini-2.5-pro"]
-            if tokens <= 200000:
-                dollar_per_1M_tokens = base_fee["under_0.2M"][token_type]
-            else:
-                dollar_per_1M_tokens = base_fee["over_0.2M"][token_type]
-
-        return dollar_per_1M_tokens * tokens / 1000000
+        tier_tokens = tokens if tier_tokens is None else tier_tokens
+        return self.fees.rates(self.model, tier_tokens)[self._rate_index[token_type]] * tokens
 
 """
 class DeepseekFee(LlmFee):
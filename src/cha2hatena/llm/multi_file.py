@@ -0,0 +1,131 @@
+import contextvars
+import logging
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Protocol
+
+from pydantic import BaseModel, Field
+
+from ..compaction import estimate_tokens
+from ..setup import get_api_key
+from ..tracing import span
+from .conversational_ai import LlmConfig
+from .llm_stats import TokenStats
+
+logger = logging.getLogger(__name__)
+
+MERGE_PROMPT = (
+    "以下は複数の会話ログからそれぞれ作成したブログ記事の下書きです。これらを1本の記事に統合してください。\n"
+    "- 重複する内容はまとめ、各下書きの要点は漏らさないでください\n"
+    "- タイトルとカテゴリーは統合後の記事全体を表すものにしてください\n"
+    "- 文体・構成は次の元の指示に従ってください（元の指示の「会話ログ」は下書きに読み替えてください）\n\n"
+    "元の指示：\n"
+)
+
+
+class MultiFileConfig(BaseModel):
+    enable: bool = False
+    max_workers: int = Field(default=4, ge=1, description="同時に要約するファイル数")
+    merge_model: str | None = Field(default=None, description="統合に使うモデル。Noneならai.modelと同じ")
+
+
+class Summarizer(Protocol):
+    model: str
+
+    def get_summary(self) -> tuple[dict, TokenStats]: ...
+
+
+def format_drafts(drafts: list[dict]) -> str:
+    """統合用に下書きを並べたテキスト"""
+    return "\n\n".join(
+        f"{'=' * 20} {idx}本目の下書き {'=' * 20}\n"
+        f"タイトル: {draft['title']}\nカテゴリー: {', '.join(draft['categories'])}\n\n{draft['content']}"
+        for idx, draft in enumerate(drafts, 1)
+    )
+
+
+class MultiFileSummarizer:
+    """入力ファイルごとに同時に要約し、最後に1本の記事へ統合する
+
+    所要時間は全ファイルの合計ではなく、最も大きいファイルの要約＋統合の1回分になる。
+    一部のファイルの要約に失敗した場合は残りで統合する。
+    get_summaryが返す使用量は全体の合計で、リクエストごとの使用量はcall_statsに残す（台帳にはモデルごとに記録するため）。
+    """
+
+    def __init__(
+        self,
+        config: LlmConfig,
+        conversations: list[str],
+        create_summarizer: Callable[[LlmConfig], Summarizer],
+        merge_model: str | None = None,
+        max_workers: int = 4,
+        context: str = "",
+    ):
+        if not conversations:
+            raise ValueError("会話ログが1つもありません")
+        self.config = config
+        self.conversations = conversations
+        self.create_summarizer = create_summarizer
+        self.merge_model = merge_model or config.model
+        self.max_workers = max_workers
+        self.context = context  # 統合時に下書きの前に置く参考情報（過去の関連記事の要点など）
+        self.model = config.model  # 実際に統合したモデル（get_summary後に更新）
+        self.call_stats: list[TokenStats] = []  # 各ファイルの要約と統合の使用量（get_summary後に更新）
+
+    def planned_requests(self, expected_output_tokens: int) -> list[tuple[str, int]]:
+        """予算の試算用。行うリクエストごとの(モデル, 入力トークン数の見込み)
+
+        統合の入力は、各ファイルの下書きがexpected_output_tokensずつあるものとして見積もる。
+        """
+        requests = [(self.config.model, estimate_tokens(self.config.prompt + c)) for c in self.conversations]
+        merge_prompt = MERGE_PROMPT + self.config.prompt + self.context
+        merge_tokens = estimate_tokens(merge_prompt) + expected_output_tokens * len(self.conversations)
+        return [*requests, (self.merge_model, merge_tokens)]
+
+    def _summarize_file(self, idx: int, conversation: str) -> tuple[dict, TokenStats]:
+        with span("summarize.file", index=idx, chars=len(conversation)):
+            return self.create_summarizer(self.config.model_copy(update={"conversation": conversation})).get_summary()
+
+    def get_summary(self) -> tuple[dict, TokenStats]:
+        logger.warning(f"{len(self.conversations)}個の会話を同時に要約します。")
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="summarize") as executor:
+            # トレースの親子関係を引き継ぐため呼び出し元のコンテキストで実行
+            futures = [
+                executor.submit(contextvars.copy_context().run, self._summarize_file, idx, conversation)
+                for idx, conversation in enumerate(self.conversations, 1)
+            ]
+            results = []
+            for idx, future in enumerate(futures, 1):
+                try:
+                    results.append(future.result())
+                except (Exception, SystemExit) as e:  # クライアントのsys.exitも1ファイルの失敗として扱う
+                    logger.warning(f"{idx}個目の会話の要約に失敗しました。残りの会話で記事を作成します: {e!r}")
+
+        self.call_stats = [stats for _, stats in results]
+        if not results:
+            raise RuntimeError("すべての会話の要約に失敗しました")
+        if len(results) == 1:
+            self.model = results[0][1].model_name
+            return results[0]
+
+        merge_config = LlmConfig.model_validate(
+            {
+                **self.config.model_dump(),
+                "prompt": MERGE_PROMPT + self.config.prompt,
+                "conversation": self.context + format_drafts([data for data, _ in results]),
+                "model": self.merge_model,
+                "api_key": get_api_key(self.merge_model) or "",
+            }
+        )
+        logger.warning(f"{len(results)}本の下書きを{self.merge_model}で統合します。")
+        with span("merge", drafts=len(results), model=self.merge_model):
+            summarizer = self.create_summarizer(merge_config)
+            data, stats = summarizer.get_summary()
+        self.model = summarizer.model
+        self.call_stats.append(stats)
+
+        # 返す料金は各要約と統合の合計（モデル名は統合したモデル）
+        total = stats
+        for _, sub_stats in results:
+            total = total + sub_stats
+        return data, total
@@ -0,0 +1,106 @@
+import logging
+import sys
+import threading
+from contextlib import contextmanager
+from typing import ClassVar
+
+from ..metrics import LLM_REQUEST_SECONDS, QUEUE_DEPTH
+from ..tracing import span
+from .conversational_ai import AiOutput, ConversationalAi, LlmConfig, LlmOverloadedError, TokenStats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "http://localhost:11434/v1"
+REQUEST_TIMEOUT = 600  # ローカル環境は生成が遅いことがあるため長めに
+
+
+class OpenAiCompatibleClient(ConversationalAi):
+    """OpenAI互換APIを持つローカルサーバー（llama.cpp server, vLLM, Ollama等）用クライアント"""
+
+    # 同じサーバーへの同時リクエスト数をプロセス全体で制限する
+    # 同時実行数の上限が設定の再読み込みで変わった場合は新しいセマフォを使う
+    _semaphores: ClassVar[dict[tuple[str, int], threading.BoundedSemaphore]] = {}
+    _semaphores_lock = threading.Lock()
+
+    def __init__(self, config: LlmConfig):
+        super().__init__(config)
+        self.base_url = config.base_url or DEFAULT_BASE_URL
+        self.server_model = self.model.removeprefix("local:")
+        key = (self.base_url, config.max_concurrency)
+        with self._semaphores_lock:
+            if key not in self._semaphores:
+                self._semaphores[key] = threading.BoundedSemaphore(config.max_concurrency)
+            self.semaphore = self._semaphores[key]
+
+    @contextmanager
+    def acquire_slot(self):
+        """サーバーの空きを待つ。待機中の件数はqueue_depthに反映"""
+        with QUEUE_DEPTH.track(queue="local_llm"):
+            self.semaphore.acquire()
+        try:
+            yield
+        finally:
+            self.semaphore.release()
+
+    def get_summary(self) -> tuple[dict, TokenStats]:
+        from openai import APIConnectionError, APIStatusError, OpenAI
+
+        statement = f"次の行から示すプロンプトはこのPydanticモデルに合うJSONで出力してください: {AiOutput.model_json_schema()}\n"
+        self.prompt = statement + self.prompt
+        messages = [
+            {"role": "system", "content": statement + self.instruction},
+            {"role": "user", "content": self.conversation},
+        ]
+
+        logger.warning(f"ローカルLLMサーバー({self.base_url})からの応答を待っています。")
+        client = OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=REQUEST_TIMEOUT)
+
+        max_retries = 3
+        for i in range(max_retries):
+            try:
+                with (
+                    self.acquire_slot(),
+                    span("llm.request", model=self.model, attempt=i + 1),
+                    LLM_REQUEST_SECONDS.time(model=self.model),
+                ):
+                    response = client.chat.completions.create(
+                        model=self.server_model,
+                        temperature=self.temperature,
+                        messages=messages,
+                        response_format={
+                            "type": "json_schema",
+                            "json_schema": {"name": "AiOutput", "schema": AiOutput.model_json_schema()},
+                        },
+                        stream=False,
+                    )
+                break
+            except APIConnectionError as e:
+                logger.error(f"ローカルLLMサーバーに接続できません: {self.base_url}")
+                raise LlmOverloadedError(f"{self.model}: サーバーに接続できません") from e
+            except APIStatusError as e:
+                if e.status_code in (429, 500, 502, 503):
+                    super().handle_server_error(i, max_retries)
+                elif e.status_code == 404:
+                    logger.error(f"モデル{self.server_model}がサーバーに見つかりません。モデル名を確認してください。")
+                    logger.error(f"実行を中止します。詳細：{e}")
+                    sys.exit(1)
+                else:
+                    super().handle_unexpected_error(e)
+            except Exception as e:
+                super().handle_unexpected_error(e)
+
+        generated_text = response.choices[0].message.content
+        data = super().check_response(generated_text)
+
+        # サーバーによってはusageを返さない
+        usage = response.usage
+        stats = TokenStats(
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(getattr(usage, "completion_tokens_details", None), "reasoning_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+            len(self.prompt),
+            len(generated_text),
+            self.model,
+        )
+
+        return data, self.add_repair_stats(stats)
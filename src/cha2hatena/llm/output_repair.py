@@ -0,0 +1,121 @@
+import json
+import logging
+import re
+
+from pydantic import ValidationError
+
+from .conversational_ai import AiOutput
+
+logger = logging.getLogger(__name__)
+
+FENCED_BLOCK = re.compile(r"```(?:json|JSON)?[ \t]*\n(.*?)(?:\n```|$)", re.DOTALL)
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+DANGLING_KEY = re.compile(r'([{,])\s*"[^"]*"\s*:?\s*$')  # 値のないキー、または書きかけの最後の要素
+
+FIX_JSON_PROMPT = (
+    "次のテキストはブログ記事（title, content, categories）のJSONですが、形式が壊れています。\n"
+    "内容は一切変更・要約・翻訳せず、そのままの文言でスキーマに合う正しいJSONに直してください。\n"
+    "壊れたJSON：\n"
+)
+
+# 途中で切れた出力を補完した場合に本文の先頭へ付ける注意書き（この記事は下書きとして投稿する）
+PARTIAL_NOTICE = "> **注意：** AIの出力が途中で切れていたため、本文の末尾が欠けている可能性があります。\n\n"
+
+
+class OutputRepairError(ValueError):
+    """どの修復方法でもAiOutputとして読めなかった場合の例外"""
+
+
+def extract_json_text(text: str) -> str:
+    """コードブロックや前後の説明文からJSON部分を取り出す"""
+    text = text.strip().lstrip("\ufeff")
+    match = FENCED_BLOCK.search(text)
+    if match:
+        text = match.group(1).strip()
+    start = text.find("{")
+    if start == -1:
+        return text
+    end = text.rfind("}")
+    candidate = text[start : end + 1]
+    # 閉じ括弧がない（途中で切れた）場合は末尾まで残し、repair_partial_jsonで補う
+    return candidate if end > start and _scan(candidate) == ([], False) else text[start:]
+
+
+def _scan(text: str) -> tuple[list[str], bool]:
+    """閉じられていない括弧のスタックと、文字列の途中で終わっているか"""
+    stack: list[str] = []
+    in_string = escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack and stack[-1] == ch:
+            stack.pop()
+    return stack, in_string
+
+
+def repair_partial_json(text: str) -> str:
+    """出力上限などで途中まで切れたJSONを閉じる。末尾の書きかけの要素は捨てる"""
+    stack, in_string = _scan(text)
+    if in_string:
+        text = text.removesuffix("\\") + '"'
+    text = DANGLING_KEY.sub(lambda m: "{" if m.group(1) == "{" else "", text.rstrip())
+    text = text.rstrip().rstrip(",")
+    text += "".join(reversed(stack))
+    return TRAILING_COMMA.sub(r"\1", text)
+
+
+def coerce_ai_output(data) -> AiOutput:
+    """よくある形の崩れを直してからAiOutputとして検証"""
+    if isinstance(data, list) and len(data) == 1:
+        data = data[0]
+    if not isinstance(data, dict):
+        raise OutputRepairError(f"JSONのトップレベルがオブジェクトではありません: {type(data).__name__}")
+    data = {key.strip().lower(): value for key, value in data.items()}
+    categories = data.get("categories", [])
+    if isinstance(categories, str):
+        categories = [category.strip() for category in re.split(r"[,、]", categories) if category.strip()]
+    data["categories"] = [str(category) for category in categories][:4]
+    try:
+        return AiOutput.model_validate(data)
+    except ValidationError as e:
+        raise OutputRepairError(f"AiOutputの形式に合いません: {e}") from e
+
+
+def parse_ai_output(text: str) -> tuple[AiOutput, str]:
+    """LLMの出力をAiOutputとして読む。(結果, 使った方法)を返す
+
+    そのまま → コードブロック・前後の文章の除去 → 末尾のカンマの除去 → 途中で切れたJSONの補完 の順に試す。
+    途中で切れたJSONを補完した場合は、本文の先頭にPARTIAL_NOTICEを付ける。
+    """
+    attempts = (
+        ("as_is", lambda t: t),
+        ("extracted", extract_json_text),
+        ("trailing_comma", lambda t: TRAILING_COMMA.sub(r"\1", extract_json_text(t))),
+        ("partial", lambda t: repair_partial_json(extract_json_text(t))),
+    )
+    last_error: Exception | None = None
+    for stage, transform in attempts:
+        try:
+            candidate = transform(text)
+            # strict=Falseで文字列中の生の改行・タブを許容する
+            output = coerce_ai_output(json.loads(candidate, strict=False))
+            if stage == "partial" and not is_partial(output.content):
+                output.content = PARTIAL_NOTICE + output.content
+            return output, stage
+        except (json.JSONDecodeError, OutputRepairError) as e:
+            last_error = e
+    raise OutputRepairError(str(last_error))
+
+
+def is_partial(content: str) -> bool:
+    """途中で切れた出力を補完した本文か"""
+    return content.startswith(PARTIAL_NOTICE)
@@ -0,0 +1,196 @@
+"""データファイル（pricing.yaml）から読み込む料金表
+
+    python -m cha2hatena.llm.pricing outputs/record.csv
+
+で、記録済みのCSVを現在の料金表で再計算し、記録時の料金と比較できる。
+"""
+
+import bisect
+import csv
+import logging
+import os
+import sys
+from collections.abc import Sequence
+from datetime import date, datetime
+from functools import lru_cache
+from importlib import resources
+from pathlib import Path
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+Rates = tuple[float, float, float]  # (input, input_cache_hit, output) USD / 1トークン
+FREE: Rates = (0.0, 0.0, 0.0)
+
+
+class UnknownModelError(KeyError):
+    """料金表に登録がなく、fallback_modelも設定されていないモデル"""
+
+
+class PriceTable:
+    """料金表を検索用の構造に変換したもの
+
+    モデルごとに、版の適用開始日の昇順リストと、版ごとの料金区分の上限・単価を持つ。
+    1件の検索は辞書引きと二分探索2回で済み、recostではNumPyで一括計算する。
+    """
+
+    def __init__(self, data: dict):
+        self.version = str(data.get("version", ""))
+        self.fallback_model: str | None = data.get("fallback_model") or None
+        unit = float(data.get("unit_tokens", 1_000_000))
+
+        self._dates: dict[str, list[date]] = {}
+        self._tiers: dict[str, list[tuple[list[float], list[Rates]]]] = {}
+        for model, versions in (data.get("models") or {}).items():
+            versions = sorted(versions, key=lambda v: v["effective_from"])
+            self._dates[model] = [_to_date(v["effective_from"]) for v in versions]
+            self._tiers[model] = []
+            for version in versions:
+                tiers = version["tiers"]
+                bounds = [float(t["up_to"]) for t in tiers[:-1]] + [float("inf")]
+                rates = [(t["input"] / unit, t["input_cache_hit"] / unit, t["output"] / unit) for t in tiers]
+                self._tiers[model].append((bounds, rates))
+
+        if self.fallback_model and self.fallback_model not in self._tiers:
+            raise ValueError(f"fallback_modelが料金表にありません: {self.fallback_model}")
+        self._warned: set[str] = set()
+
+    @classmethod
+    def from_file(cls, path: Path) -> "PriceTable":
+        return cls(yaml.safe_load(path.read_text(encoding="utf-8")))
+
+    @property
+    def models(self) -> list[str]:
+        return list(self._tiers)
+
+    def resolve(self, model: str) -> str:
+        """料金表上のモデル名。未登録ならfallback_model"""
+        if model in self._tiers:
+            return model
+        if self.fallback_model is None:
+            raise UnknownModelError(f"料金表に登録されていないモデルです: {model}")
+        if model not in self._warned:
+            self._warned.add(model)
+            logger.warning(f"料金表に登録されていないモデルです: {model}")
+            logger.warning(f"{self.fallback_model}の料金で試算します")
+        return self.fallback_model
+
+    def rates(self, model: str, tier_tokens: int = 0, on: date | None = None) -> Rates:
+        """1トークンあたりの単価。tier_tokensは料金区分の判定に使うプロンプトのトークン数"""
+        if model.startswith("local:"):  # 自前のサーバーはトークン課金なし
+            return FREE
+        model = self.resolve(model)
+        dates = self._dates[model]
+        version = max(bisect.bisect_right(dates, on or date.today()) - 1, 0)
+        bounds, rates = self._tiers[model][version]
+        return rates[bisect.bisect_left(bounds, tier_tokens)]
+
+    def fee(
+        self,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+        thoughts_tokens: int = 0,
+        cached_tokens: int = 0,
+        on: date | None = None,
+    ) -> float:
+        input_rate, cache_hit_rate, output_rate = self.rates(model, input_tokens, on)
+        return (
+            (input_tokens - cached_tokens) * input_rate
+            + cached_tokens * cache_hit_rate
+            + (output_tokens + thoughts_tokens) * output_rate
+        )
+
+    def recost(
+        self,
+        models: Sequence[str],
+        input_tokens,
+        output_tokens,
+        thoughts_tokens=None,
+        cached_tokens=None,
+        dates=None,
+    ):
+        """多数の実行記録の料金をまとめて再計算し、USDのndarrayを返す
+
+        モデル・版ごとに行をまとめ、料金区分はnp.searchsortedで一括判定する。
+        dates（datetime64に変換できる配列）を省略すると今日の料金表で計算する。
+        """
+        import numpy as np
+
+        input_tokens = np.asarray(input_tokens, dtype=np.float64)
+        output_tokens = np.asarray(output_tokens, dtype=np.float64)
+        thoughts_tokens = np.asarray(0 if thoughts_tokens is None else thoughts_tokens, dtype=np.float64)
+        cached_tokens = np.asarray(0 if cached_tokens is None else cached_tokens, dtype=np.float64)
+        if dates is None:
+            days = np.full(len(input_tokens), np.datetime64(date.today(), "D"))
+        else:
+            days = np.asarray(dates).astype("datetime64[D]")
+
+        rates = np.zeros((len(input_tokens), 3))
+        names, inverse = np.unique(np.asarray(models, dtype=str), return_inverse=True)
+        for idx, name in enumerate(names):
+            rows = np.flatnonzero(inverse == idx)
+            if name.startswith("local:"):
+                continue
+            model = self.resolve(str(name))
+            version_dates = np.array(self._dates[model], dtype="datetime64[D]")
+            versions = np.maximum(np.searchsorted(version_dates, days[rows], side="right") - 1, 0)
+            for version in np.unique(versions):
+                version_rows = rows[versions == version]
+                bounds, tier_rates = self._tiers[model][version]
+                tiers = np.searchsorted(np.array(bounds), input_tokens[version_rows], side="left")
+                rates[version_rows] = np.array(tier_rates)[tiers]
+
+        return (
+            (input_tokens - cached_tokens) * rates[:, 0]
+            + cached_tokens * rates[:, 1]
+            + (output_tokens + thoughts_tokens) * rates[:, 2]
+        )
+
+
+def _to_date(value) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+@lru_cache
+def get_price_table() -> PriceTable:
+    """同梱の料金表を一度だけ読み込む。環境変数CHA2HATENA_PRICINGで別のファイルを指定できる"""
+    override = os.getenv("CHA2HATENA_PRICING")
+    if override:
+        return PriceTable.from_file(Path(override))
+    text = resources.files(__package__).joinpath("pricing.yaml").read_text(encoding="utf-8")
+    return PriceTable(yaml.safe_load(text))
+
+
+def recost_csv(path: Path, table: PriceTable | None = None):
+    """record.csvを料金表で再計算。(記録時のUSD, 再計算したUSD)のndarrayを返す"""
+    import numpy as np
+
+    table = table or get_price_table()
+    with path.open(encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.DictReader(f))
+
+    def _column(name: str) -> np.ndarray:
+        return np.array([float(row.get(name) or 0) for row in rows])
+
+    dates = [datetime.fromisoformat(row["timestamp"]).date() for row in rows]
+    recorded = _column("total_fee (USD)")
+    recalculated = table.recost(
+        [row["model"] for row in rows],
+        _column("input_tokens"),
+        _column("output_tokens"),
+        thoughts_tokens=_column("thoughts_tokens"),
+        cached_tokens=_column("cached_tokens"),  # 列がない古い記録は0（キャッシュなし）
+        dates=dates,
+    )
+    return recorded, recalculated
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    recorded, recalculated = recost_csv(Path(sys.argv[1]))
+    print(f"料金表の版: {get_price_table().version}  件数: {len(recorded)}")
+    print(f"記録時の合計: ${recorded.sum():.6f}  再計算: ${recalculated.sum():.6f}")
@@ -0,0 +1,134 @@
+import contextvars
+import logging
+import sys
+import threading
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+from .conversational_ai import ConversationalAi, LlmOverloadedError
+from .llm_stats import TokenStats
+
+logger = logging.getLogger(__name__)
+
+
+class LlmAttemptError(Exception):
+    """クライアントが実行の中止（sys.exit）を求めた場合の例外。ヘッジ中の他のリクエストが成功する可能性があるため中止はしない"""
+
+
+def _run_in_background(client: ConversationalAi) -> Future:
+    """get_summaryをデーモンスレッドで実行。負けたリクエストの完了を終了時に待たないため"""
+    future: Future = Future()
+
+    def _target():
+        try:
+            future.set_result(client.get_summary())
+        except SystemExit as e:
+            future.set_exception(LlmAttemptError(f"{client.model}が終了コード{e.code}で中止しました"))
+        except Exception as e:
+            future.set_exception(e)
+
+    # トレースの親子関係を引き継ぐため呼び出し元のコンテキストで実行
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(_target,), name=f"llm-{client.model}", daemon=True).start()
+    return future
+
+
+class LlmRouter:
+    """複数のAIクライアントを優先順に使うルーター
+
+    - 過負荷（LlmOverloadedError）の場合は次のクライアントへフェイルオーバー
+    - hedge_after秒以内に応答がなければ次のクライアントへ同時にリクエストし、先に返った方を採用
+
+    採用しなかったリクエストも料金は発生するため、応答が届いた時点で使用量をon_discardedへ渡す。
+    """
+
+    def __init__(
+        self,
+        clients: list[ConversationalAi],
+        hedge_after: float | None = None,
+        on_discarded: Callable[[TokenStats], None] | None = None,
+    ):
+        if not clients:
+            raise ValueError("AIクライアントが1つもありません")
+        self.clients = clients
+        self.hedge_after = hedge_after
+        self.on_discarded = on_discarded
+        self.model = clients[0].model  # 実際に応答したモデル（get_summary後に更新）
+        self._discarded: list[Future] = []  # 採用しなかったリクエストの使用量の記録（完了したら結果が入る）
+
+    def _discard(self, future: Future) -> None:
+        """採用しなかったリクエストの応答が届いたら、その使用量をon_discardedへ渡す"""
+        recorded: Future = Future()
+        self._discarded.append(recorded)
+
+        def _done(_future: Future) -> None:
+            try:
+                _, stats = _future.result()
+                logger.debug(f"採用しなかった{stats.model_name}の料金: ${stats.total_fee:.6f}")
+                if self.on_discarded:
+                    self.on_discarded(stats)
+                recorded.set_result(stats)
+            except Exception as e:
+                # 失敗したリクエストは使用量が分からない
+                recorded.set_exception(e)
+
+        future.add_done_callback(_done)
+
+    def wait_discarded(self, timeout: float | None = None) -> list[TokenStats]:
+        """採用しなかったリクエストの使用量の記録を待つ（最大timeout秒）。記録できた使用量を返す"""
+        done, _ = wait(self._discarded, timeout=timeout)
+        return [future.result() for future in done if future.exception() is None]
+
+    def get_summary(self) -> tuple[dict, TokenStats]:
+        pending: dict[Future, ConversationalAi] = {}
+        next_idx = 0
+
+        def _launch() -> None:
+            nonlocal next_idx
+            client = self.clients[next_idx]
+            next_idx += 1
+            pending[_run_in_background(client)] = client
+
+        _launch()
+        while pending:
+            can_hedge = self.hedge_after is not None and next_idx < len(self.clients)
+            done, _ = wait(pending, timeout=self.hedge_after if can_hedge else None, return_when=FIRST_COMPLETED)
+
+            if not done:
+                logger.warning(
+                    f"{self.hedge_after}秒以内に応答がないため、{self.clients[next_idx].model}へも同時にリクエストします。"
+                )
+                _launch()
+                continue
+
+            for future in done:
+                client = pending.pop(future)
+                try:
+                    data, stats = future.result()
+                except LlmOverloadedError as e:
+                    logger.warning(f"{client.model}が利用できません: {e}")
+                    if not pending and next_idx < len(self.clients):
+                        logger.warning(f"{self.clients[next_idx].model}へ切り替えます。")
+                        _launch()
+                    continue
+                except Exception as e:
+                    # ヘッジ中のリクエストが残っていればそちらの応答を待つ
+                    if pending:
+                        logger.warning(f"{client.model}でエラーが発生しました: {e}")
+                        logger.info("詳細: ", exc_info=True)
+                        continue
+                    if isinstance(e, LlmAttemptError):
+                        sys.exit(1)  # 単独のクライアントと同じく実行を中止する
+                    raise
+
+                if pending:
+                    logger.warning(
+                        f"{client.model}の応答を採用しました。もう一方の応答は破棄されます（料金は発生します）。"
+                    )
+                    for loser_future, loser in pending.items():
+                        loser.cancel()
+                        self._discard(loser_future)
+                self.model = client.model
+                return data, stats
+
+        raise LlmOverloadedError("すべてのAIプロバイダが過負荷のため要約できませんでした")
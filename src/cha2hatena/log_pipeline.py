@@ -0,0 +1,125 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+_job_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("job_id", default=None)
+
+TEXT_FORMAT = (
+    "%(levelname)s | %(asctime)s | %(job_id)s | %(module)s | %(lineno)s | %(funcName)s | %(taskName)s | %(name)s "
+    "| %(message)s"
+)
+
+# JSONに含めないLogRecordの標準の属性（extra=で渡した値だけを残す）
+_RESERVED = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "taskName", "job_id"}
+
+
+class LogConfig(BaseModel):
+    path: str = Field(default="app.log", description="ログファイル。空欄ならファイルに書き出さない")
+    format: Literal["json", "text"] = Field(default="json", description="ファイルの形式（jsonは1行1レコード）")
+    max_bytes: int = Field(default=10 * 1024 * 1024, ge=0, description="ローテーションするサイズ（0で無効）")
+    backup_count: int = Field(default=5, ge=0, description="残す古いログファイルの数")
+
+
+def current_job_id() -> str | None:
+    return _job_id.get()
+
+
+@contextmanager
+def job_context(job_id: str | None = None) -> Iterator[str]:
+    """この中で出したログにジョブIDを付ける。asyncioのタスクやcontextvars.copy_contextで起動したスレッドにも引き継がれる"""
+    job_id = job_id or os.urandom(6).hex()
+    token = _job_id.set(job_id)
+    try:
+        yield job_id
+    finally:
+        _job_id.reset(token)
+
+
+class JobIdFilter(logging.Filter):
+    """ログを出したスレッドで、その時点のジョブIDをレコードに付ける"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "job_id"):
+            record.job_id = _job_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """1レコード1行のJSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created).astimezone().isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "job_id": getattr(record, "job_id", None),
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+            "func": record.funcName,
+            "thread": record.threadName,
+            "task": getattr(record, "taskName", None),
+        }
+        data.update({key: value for key, value in record.__dict__.items() if key not in _RESERVED})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        if record.stack_info:
+            data["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _LocalQueueHandler(QueueHandler):
+    """同じプロセス内のキューなので、レコードを整形・複製せずにそのまま渡す"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 書き出すまでに引数が変更されても、ログを出した時点の内容になるようにする
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info and not record.exc_text:
+            # 例外オブジェクトはトレースバック経由で呼び出し元のフレームを保持するため、先に文字列にしておく
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class LogPipeline:
+    """ロガーにはキューへ積むだけのハンドラーを付け、ファイル・標準出力への書き込みは専用スレッドで行う
+
+    ローテーションを含むファイルI/Oがイベントループや投稿処理のスレッドで行われることはない。
+    キューは上限なし（put_nowaitが失敗しない）なので、ログを出す側が待たされることもない。
+    """
+
+    def __init__(self, handlers: list[logging.Handler]):
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.handler = _LocalQueueHandler(self.queue)
+        self.handler.addFilter(JobIdFilter())
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        self._running = True
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """キューに残ったログを書き出してからスレッドを止める"""
+        if self._running:
+            self._running = False
+            self.listener.stop()
+
+
+def file_handler(config: LogConfig) -> logging.Handler:
+    handler = RotatingFileHandler(
+        config.path, maxBytes=config.max_bytes, backupCount=config.backup_count, encoding="utf-8"
+    )
+    handler.setFormatter(JsonFormatter() if config.format == "json" else logging.Formatter(TEXT_FORMAT))
+    handler.setLevel(logging.DEBUG)
+    return handler
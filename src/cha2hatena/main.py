@@ -1,233 +1,285 @@
+import argparse
 import asyncio
-import csv
 import logging
+import os
+import signal
 import sys
-from datetime import datetime
+import threading
+import time
+from collections.abc import Callable
 from pathlib import Path
 
-import gspread
-import httpx
-import yfinance as yf
-
+from . import PROCESS_STARTED_NS
 from . import json_loader as jl
-from . import line_message
-from .blog.blog_schema import (
-    AbstractBlogPoster,
-    BaseBlogResponse,
-    BlogClientSchema,
-    HatenaResponseSchema,
-    HatenaSecretKeys,
-)
-from .blog.devto_poster import DevToPoster
-from .blog.hatenablog_poster import HatenaBlogPoster
-from .blog.qiita_poster import QiitaPoster
-from .llm import deepseek_client, gemini_client
-from .llm.conversational_ai import ConversationalAi, LlmConfig
-from .setup import initialization
+from .api import ApiApp, ProgressHandler, ProgressHub
+from .blog.blog_schema import BlogClientSchema, HatenaSecretKeys
+from .blog.tag_index import TagIndex
+from .compaction import Compactor, estimate_tokens
+from .config_service import ConfigService, ConfigSnapshot
+from .ledger import EXIT_DEFERRED, check_budget, get_usdjpy_rate, print_spend_report, record_spend
+from .llm.comparison import compare_models, select_winner, write_report
+from .llm.conversational_ai import ConversationalAi
+from .llm.factory import create_ai_client, create_summarizer
+from .llm.llm_stats import TokenStats
+from .llm.multi_file import MultiFileSummarizer
+from .llm.output_repair import is_partial
+from .llm.router import LlmRouter
+from .log_pipeline import job_context
+from .media import attach_media, start_media
+from .metrics import JOBS, finish_metrics, start_metrics
+from .notification.dispatcher import SharedDispatcher
+from .notification.notifier_schema import Notification
+from .records import summary_key, to_spreadsheet, write_records
+from .retrieval import Retriever
+from .scheduler import Job, ScheduleConfig, defer_summary, print_queue, run_queue, schedule_post
+from .search_index import open_search_index, print_search_results
+from .setup import get_api_key, initialization
+from .tenants import DEFAULT_TENANT, collect_results, process_blogpost, tenant_schemas
+from .tracing import finish_tracing, span, tracer
 from .types import BlogServices, TypeBlogResult
 
 logger = logging.getLogger(__name__)
 parent_logger = logging.getLogger("cha2hatena")
 
+
+def load_config_service() -> ConfigService:
+    """ログの設定と初回の設定の読み込み。以降の設定はconfig_service.current()から取得する"""
+    _, secret_keys, _, config = initialization(parent_logger)
+    return ConfigService(snapshot=ConfigSnapshot.build(config, secret_keys))
+
+
 try:
-    DEBUG, secret_keys, llm_config, CONFIG = initialization(parent_logger)
+    config_service = load_config_service()
 except Exception as e:
     logger.critical(f"初期設定が正常に行われませんでした: {e}", exc_info=True)
     sys.exit(1)
 
-# -------
-
-
-def create_ai_client(config: LlmConfig):
-    if config.model.startswith("gemini"):
-        client = gemini_client.GeminiClient(config)
-    elif config.model.startswith("deepseek"):
-        client = deepseek_client.DeepseekClient(config)
-    else:
-        logger.error("モデル名が正しくありません。実行を中止します。")
-        logger.error(f"モデル名: {config.model}")
-    return client
+# キューには秘密情報を保存せず、公開時に設定から読み直す
+SECRET_FIELDS = {"hatena_secret_keys", "qiita_bearer_token", "devto_api_key"}
 
+DISCARDED_WAIT_SECONDS = 120  # ヘッジで採用しなかった応答を、終了前に待つ上限
 
-async def process_blogpost(schema: BlogClientSchema) -> TypeBlogResult:
-    """複数のブログへ投稿 投稿結果を辞書のリストで返却"""
-    BLOG_CLIENTS: list[tuple[BlogServices, AbstractBlogPoster]] = []
-    if schema.hatena_secret_keys:
-        BLOG_CLIENTS.append((BlogServices.HATENA, HatenaBlogPoster))
-    if schema.qiita_bearer_token:
-        BLOG_CLIENTS.append((BlogServices.QIITA, QiitaPoster))
-    if schema.devto_api_key:
-        BLOG_CLIENTS.append((BlogServices.DEVTO, DevToPoster))
+# 投稿完了の通知の配信（プロセスで1つを使い回す）
+dispatchers = SharedDispatcher()
 
-    clients = {name: client_class.model_validate(schema.model_dump()) for name, client_class in BLOG_CLIENTS}
-
-    async with httpx.AsyncClient() as httpx_client:
-        tasks = [client.blog_post(httpx_client) for client in clients.values()]
-        results: BaseBlogResponse | BaseException = await asyncio.gather(*tasks, return_exceptions=True)
-    return {
-        name: {"result": result, "success": not isinstance(result, BaseException)}
-        for name, result in zip(clients.keys(), results)
-    }
-
-
-def append_csv(path: Path, data: dict) -> None:
-    """pathがなければ作成し、CSVに1行追記"""
-    # ファイルを開く前に状態を確定させる（正しい）
-    is_new_file = not path.exists() or path.stat().st_size == 0
-
-    try:
-        with path.open("a", newline="", encoding="utf-8-sig") as f:
-            writer = csv.DictWriter(f, fieldnames=data.keys())
-            if is_new_file:
-                writer.writeheader()  # 新規または空の時のみ列名を追加
-            writer.writerow(data)
-
-        if is_new_file:
-            logger.warning(f"新しいCSVファイルを作成しました: {path}")
-        else:
-            logger.warning(f"CSVにデータを追記しました: {path.name}")
-    except Exception:
-        logger.exception("CSVファイルへの書き込み中にエラーが発生しました。")
+# -------
 
 
-def to_spreadsheet(new_data: dict, spreadsheet_name: str) -> None:
-    SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-    CREDENTIALS_DIRECTORY = Path.cwd() / "credentials" / "credentials.json"
-    if spreadsheet_name:
-        gc = gspread.service_account(scopes=SCOPES, filename=CREDENTIALS_DIRECTORY)
-        try:
-            # スプレッドシートを開く（存在チェック）
-            sh = gc.open(spreadsheet_name)
-            worksheet = sh.sheet1
-
-            existing_data = worksheet.get_all_values()
-            if not existing_data:
-                worksheet.update([list(new_data.keys())] + [list(new_data.values())])
-                logger.warning(f"新規作成: スプレッドシートにヘッダーとデータを追加しました: {spreadsheet_name}")
-            else:
-                worksheet.append_row(list(new_data.values()))
-                logger.warning("追記: スプレッドシートに新しい行を追加しました")
-
-        except gspread.exceptions.SpreadsheetNotFound:
-            # スプレッドシートが存在しない場合、新規作成
-            sh = gc.create("record")
-            worksheet = sh.sheet1
-            worksheet.update([list(new_data.keys())] + [list(new_data.values())])
-            logger.warning(f"新規スプレッドシートを作成し、データを追加しました: {spreadsheet_name}")
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="cha2hatena", description="AIとの会話ログを要約してブログへ投稿")
+    parser.add_argument("inputs", nargs="*", help="会話ログ（.json / .txt / .md）")
+    parser.add_argument("--profile", action="store_true", help="段階ごとの所要時間を最後に表示")
+    parser.add_argument("--spend", action="store_true", help="利用額の台帳（今日・今月の累計）を表示して終了")
+    parser.add_argument("--compare", action="store_true", help="comparison.modelsの各モデルで同時に要約して比較")
+    parser.add_argument("--daemon", action="store_true", help="予約した記事を公開枠の時刻に投稿し続ける")
+    parser.add_argument("--once", action="store_true", help="公開時刻を過ぎた予約だけ投稿して終了")
+    parser.add_argument("--queue", action="store_true", help="予約の一覧を表示して終了")
+    parser.add_argument("--search", metavar="QUERY", help="過去の記事を検索して終了")
+    parser.add_argument("--no-schedule", action="store_true", help="schedule.enableでも予約せずすぐに投稿")
+    parser.add_argument("--serve", action="store_true", help="会話ログを受け付けるHTTP APIを起動（要uvicorn）")
+    return parser.parse_args(argv)
 
 
 def main():
+    args = parse_args(sys.argv[1:])
+    snapshot = config_service.current()
+    start_metrics(snapshot.metrics)
+    resident = args.daemon or args.once or args.serve
+    job_result = "failure"
+    try:
+        with job_context() as job_id, span("pipeline", job_id=job_id):
+            tracer.record("import_and_setup", PROCESS_STARTED_NS, time.time_ns())
+            exit_code = run(args, snapshot)
+        job_result = "success"
+        return exit_code
+    finally:
+        if not resident:  # 常駐時はrun_daemonがジョブごとに数える
+            JOBS.inc(result=job_result)
+        dispatchers.close()
+        finish_tracing(snapshot.tracing, args.profile, append=resident)
+        finish_metrics(snapshot.metrics)
+
+
+def run(args: argparse.Namespace, snapshot: ConfigSnapshot):
+    """1回分の処理。設定はsnapshotからだけ読む（常駐時に設定を読み込み直しても、実行中のジョブには影響しない）"""
+    retriever: Retriever | None = None
     try:
         logger.debug("================================================")
-        logger.debug(f"アプリケーションが起動しました。デバッグモード：{DEBUG}")
-
-        if len(sys.argv) > 1:
-            INPUT_PATHS_RAW = sys.argv[1:]
+        logger.debug(f"アプリケーションが起動しました。デバッグモード：{snapshot.debug}")
+
+        output_dir = snapshot.paths.output_dir
+        base_url = snapshot.ai.local.base_url
+        budget_config = snapshot.budget
+        if args.spend:
+            print_spend_report(budget_config)
+            return 0
+
+        search_config = snapshot.search
+        if args.search:
+            print_search_results(search_config, output_dir, base_url, args.search)
+            return 0
+
+        schedule_config = snapshot.schedule
+        if args.queue:
+            print_queue(schedule_config)
+            return 0
+        if args.serve:
+            return run_server(args)
+        if args.daemon or args.once:
+            return run_daemon(args)
+
+        if args.inputs:
+            INPUT_PATHS_RAW = args.inputs
             logger.warning(f"処理を開始します: {', '.join(INPUT_PATHS_RAW)}")
         else:
             logger.error("エラー: 引数を入力する必要があります。実行を終了します")
             sys.exit(1)
 
         input_paths = list(map(Path, INPUT_PATHS_RAW))
+        scheduling = schedule_config.enable and not args.no_schedule
+        # 予算によるモデルの切り替えはこの実行の中だけにする
+        llm_config = snapshot.llm_config.model_copy()
 
         # JSONファイルから会話履歴を読み込み、テキストに整形
-        llm_config.conversation = jl.json_loader(input_paths)
-
-        # AIオブジェクト作成
-        ai_instance: ConversationalAi = create_ai_client(llm_config)
+        with span("load_conversation", files=len(input_paths)):
+            compaction_config = snapshot.compaction
+            compactor = Compactor(compaction_config) if compaction_config.enable else None
+            conversations = jl.load_conversations(input_paths, compactor)
+            llm_config.conversation = "\n\n\n".join(conversations)
+
+        # 過去の関連記事の要点を会話ログの前に加える（予算の試算にも含める）
+        # インデックスは1回だけ開き、関連記事の検索にも使う
+        retriever = Retriever(search_config, snapshot.context, output_dir, base_url)
+        retrieved_context = retriever.context(llm_config.conversation)
+        llm_config.conversation = retrieved_context + llm_config.conversation
+
+        def on_discarded(stats: TokenStats) -> None:
+            """ヘッジで採用しなかった応答の料金も、届いた時点で記録する"""
+            record_spend([stats], get_usdjpy_rate(snapshot.other.usdjpy_rate), budget_config)
+
+        ai_config = snapshot.ai
+        multi_file_config = ai_config.multi_file
+        multi_file = None
+        if not args.compare and multi_file_config.enable and len(conversations) > 1:
+            # ファイルごとに同時に要約してから統合
+            multi_file = MultiFileSummarizer(
+                llm_config,
+                conversations,
+                lambda config: create_summarizer(config, ai_config, on_discarded),
+                merge_model=multi_file_config.merge_model,
+                max_workers=multi_file_config.max_workers,
+                context=retrieved_context,
+            )
 
-        # AIで要約取得
-        llm_outputs, llm_stats = ai_instance.get_summary()
+        # 予算の確認（超える見込みならモデルの切り替え・見送り・中止）
+        if budget_config.enable:
+            # 複数のリクエストを行う場合は合計で判定する（--compareの各モデル、ファイルごとの要約＋統合、ヘッジ）
+            requests = None
+            if args.compare:
+                prompt_tokens = estimate_tokens(llm_config.prompt + llm_config.conversation)
+                requests = [(model, prompt_tokens) for model in snapshot.comparison.models]
+            elif multi_file:
+                requests = multi_file.planned_requests(budget_config.expected_output_tokens)
+            hedging = not args.compare and ai_config.hedge_after is not None
+            try:
+                check_budget(budget_config, llm_config, requests, ai_config.fallback_model if hedging else None)
+            except SystemExit as e:
+                if e.code == EXIT_DEFERRED and scheduling:
+                    # 次の公開枠でやり直す
+                    defer_summary(schedule_config, input_paths, args.compare)
+                raise
+
+        # 画像のアップロード（要約と並行して行う。比較時は採用するモデルが決まってから）
+        # 予約投稿では公開時にアップロードする（公開されない記事の画像を先に上げない）
+        media_future = None
+        if not (args.compare or scheduling):
+            media_future = start_media(input_paths, snapshot.media, snapshot.secret_keys, snapshot.debug)
+
+        if args.compare:
+            # 複数モデルで同時に要約して比較
+            comparison_config = snapshot.comparison
+            with span("compare", models=",".join(comparison_config.models)):
+                results = compare_models(llm_config, comparison_config.models, create_ai_client)
+            winner = select_winner(results, comparison_config) if comparison_config.auto_select else None
+            write_report(results, Path(comparison_config.report_dir), winner)
+            all_stats = [result.stats for result in results if result.stats]
+        else:
+            # AIオブジェクト作成（予算による切り替えの後）
+            ai_instance: ConversationalAi | LlmRouter | MultiFileSummarizer
+            ai_instance = multi_file or create_summarizer(llm_config, ai_config, on_discarded)
+
+            # AIで要約取得
+            with span("summarize", model=llm_config.model) as s:
+                llm_outputs, llm_stats = ai_instance.get_summary()
+                s.set_attribute("input_tokens", llm_stats.input_tokens or 0)
+                s.set_attribute("output_tokens", llm_stats.output_tokens or 0)
+            # ファイルごとの要約と統合は、それぞれのモデルの料金として記録する
+            all_stats = multi_file.call_stats if multi_file else [llm_stats]
+
+        # 為替レートを取得し、台帳に記録（投稿に失敗してもLLMの料金は発生しているため先に記録）
+        with span("exchange_rate"):
+            dy_rate = get_usdjpy_rate(snapshot.other.usdjpy_rate)
+        record_spend(all_stats, dy_rate, budget_config)
+
+        if args.compare:
+            if winner is None:
+                if comparison_config.auto_select:
+                    logger.warning("採用条件を満たすモデルがないため投稿しません。")
+                return 0
+            logger.warning(f"{winner.model}の要約を採用します。")
+            llm_outputs, llm_stats = winner.output.model_dump(), winner.stats
+            if not scheduling:
+                media_future = start_media(input_paths, snapshot.media, snapshot.secret_keys, snapshot.debug)
+        total_JPY = llm_stats.total_fee * dy_rate if dy_rate is not None else None
+
+        llm_outputs["content"] = attach_media(llm_outputs["content"], media_future)
+
+        # カテゴリーを過去の記事で使ったものに揃える
+        tag_index_config = snapshot.category_index
+        if tag_index_config.enable:
+            with span("category_index"):
+                tag_index = TagIndex.from_csv(output_dir / "record.csv", tag_index_config)
+                categories = tag_index.snap(llm_outputs["categories"])
+            if categories != llm_outputs["categories"]:
+                logger.warning(f"カテゴリーを既存のものに揃えました: {', '.join(categories)}")
+            llm_outputs["categories"] = categories
+
+        # 過去の記事から関連記事を探して末尾に載せる
+        # 同じ日に同じタイトルで投稿し直した場合、前回の記事自身を関連記事にしない
+        llm_outputs["content"] = retriever.add_related_links(
+            llm_outputs["title"], llm_outputs["content"], exclude={summary_key(llm_outputs["title"])}
+        )
 
+        if is_partial(llm_outputs["content"]):
+            logger.warning(
+                "AIの出力が途中で切れていたため、下書きとして投稿します。内容を確認してから公開してください。"
+            )
         #
+        secret_keys = snapshot.secret_keys
         blog_post_kwargs = BlogClientSchema(
             **llm_outputs,
-            preset_categories=(CONFIG.get("blog") or {}).get("preset_category", []),
+            preset_categories=snapshot.blog.preset_category,
             hatena_secret_keys=HatenaSecretKeys.model_validate(secret_keys),
             qiita_bearer_token=secret_keys.get("qiita_bearer_token"),
             devto_api_key=secret_keys.get("devto_api_key"),
             author=None,  # str | None   Noneの場合自分のはてなID
-            updated=None,  # datetime | None  公開時刻設定。Noneの場合5分後に公開
-            is_draft=DEBUG,  # デバッグ時は下書き
+            updated=None,  # datetime | None  公開時刻設定。Noneの場合5分後に公開（予約時は公開枠の時刻）
+            # デバッグ時と、途中で切れた出力を補完した場合は下書き
+            is_draft=snapshot.debug or is_partial(llm_outputs["content"]),
         )
-        blogpost_results: TypeBlogResult = asyncio.run(process_blogpost(blog_post_kwargs))
-
-        # 結果の整理
-        urls = {}
-        hatena_error = False
-        for service, report in blogpost_results.items():
-            _result: BaseBlogResponse | BaseException = report["result"]
-            if isinstance(_result, BaseBlogResponse):
-                urls[service] = _result.url
-
-                if service is BlogServices.HATENA:
-                    hatena_result: HatenaResponseSchema = _result
-            else:
-                logger.error(f"{service.value}の処理でエラー。投稿されませんでした。エラー内容:\n{_result}")
-                hatena_error = service is BlogServices.HATENA
-
-        if hatena_error:
-            logger.error("はてな投稿エラーのため実行を中止します。")
-            logger.error(
-                f"Qiita URL:{urls.get(BlogServices.QIITA, '')}\nDev.to URL: {urls.get(BlogServices.DEVTO, '')})"
-            )
-
-        print("-" * 50)
-        print(f"投稿タイトル：{hatena_result.title}")
-        print(f"\n{'-' * 20}投稿本文{'-' * 20}")
-        print(f"{hatena_result.content[:100]}")
-        print("-" * 50)
-
-        # LINE通知テキスト整形
-
-        line_access_token = secret_keys.get("line_channel_access_token")
-        if line_access_token:
-            line_text = "投稿完了です。今日もお疲れさまでした！\n"
-            line_text += f"タイトル：{hatena_result.title}\n"
-            for name, url in urls.items():
-                line_text += f"{name}: {url}\n" if url else ""
-                
-            line_text += f"はてな編集: {hatena_result.url_edit}\n"
-            line_text += f"下書きモード: {hatena_result.is_draft}"
-
-            try:
-                line_message.line_messenger(line_text, line_access_token)
-            except Exception as e:
-                logger.error("エラー：LINE通知は行われませんでした。")
-                logger.info(f"詳細: {e}")
-        else:
-            line_text = "要約の保存完了。ブログ投稿は行われませんでした。今日も長い時間お疲れ様でした。\n"
-            line_text += f"本文: \n{hatena_result.content[:200]} ..."
-
-
-        # 為替レートを取得
-        ticker = "USDJPY=X"
-        try:
-            dy_rate = yf.Ticker(ticker).history(period="1d").Close.iloc[0]
-            total_JPY = llm_stats.total_fee * dy_rate
-        except Exception as e:
-            logger.error("ヤフーファイナンスから為替レートを取得できませんでした。詳細はapp.logを確認してください")
-            logger.info(f"詳細: {e}", exc_info=True)
-            total_JPY = None
 
+        # 記録用の項目（予約投稿の場合もキューに保存して公開時に書き出す）
         ai_names = jl.ai_names_from_paths(input_paths)
-        conversation_titles = " ".join(jl.get_conversation_titles(input_paths, ai_names))
-
-        csv_data = {
-            "timestamp": datetime.now().isoformat(),
-            "conversation_title": conversation_titles,
+        record = {
+            "conversation_title": " ".join(jl.get_conversation_titles(input_paths, ai_names)),
             "AI_name": " ".join(ai_names),
-            "entry_URL": hatena_result.url,
-            "is_draft": hatena_result.is_draft,
-            "entry_title": hatena_result.title,
-            "entry_content": hatena_result.content[:30],
-            "categories": ",".join(hatena_result.categories),
             "prompt": llm_config.prompt[:20],
-            "model": llm_config.model,
+            "model": llm_stats.model_name,  # フェイルオーバー時は実際に応答したモデル
             "temperature": llm_config.temperature,
             "input_letter_count": llm_stats.input_letter_count,
             "output_letter_count": llm_stats.output_letter_count,
             "input_tokens": llm_stats.input_tokens,
+            "cached_tokens": llm_stats.cached_tokens,
             "input_fee": llm_stats.input_fee,
             "thoughts_tokens": llm_stats.thoughts_tokens,
             "thoughts_fee": llm_stats.thoughts_fee,
@@ -235,37 +287,242 @@ def main():
             "output_fee": llm_stats.output_fee,
             "total_fee (USD)": llm_stats.total_fee,
             "total_fee (JPY)": total_JPY,
-            "api_key": "..." + llm_config.api_key[-5:],
-            "Qiita_URL": urls.get(BlogServices.QIITA, ""),
-            "Dev.to_URL": urls.get(BlogServices.DEVTO, ""),
+            "api_key": "..." + (get_api_key(llm_stats.model_name) or "")[-5:],  # 実際に応答したモデルのキー
         }
 
-        summary_file_name = datetime.now().strftime("%y%m%d") + "-" + hatena_result.title
-
-        csv_dir = Path(CONFIG["paths"]["output_dir"].strip())
-        csv_dir.mkdir(exist_ok=True)
-        csv_path = csv_dir / "record.csv"
-        summary_dir = csv_dir / "summary"
-        summary_dir.mkdir(exist_ok=True)
-        summary_path = summary_dir / (f"{summary_file_name.replace('/', ', ')}.txt")
-        # ファイル出力
-        append_csv(csv_path, csv_data)
-        summary_path.write_text(hatena_result.content, encoding="utf-8")
-
-        # Googleスプレッドシートへ出力
-        if not DEBUG and (CONFIG.get("google_sheets") or {}).get("enable"):
-            SPREADSHEET_NAME = (CONFIG.get("google_sheets") or {}).get("spreadsheet_name", "record")
-            try:
-                to_spreadsheet(csv_data, SPREADSHEET_NAME)
-            except Exception as e:
-                logger.warning("Googleスプレッドシートへの書き込みは行われませんでした")
-                logger.debug(f"詳細: {e}")
+        if scheduling:
+            # 公開枠に予約（公開は--daemonが行う）
+            payload = {"post": blog_post_kwargs.model_dump(mode="json", exclude=SECRET_FIELDS), "record": record}
+            if snapshot.media.enable:
+                payload["media_inputs"] = [str(path.resolve()) for path in input_paths]
+            schedule_post(schedule_config, payload)
+            exit_code = 0
+        else:
+            exit_code = publish(blog_post_kwargs, record, snapshot, on_posted=getattr(args, "on_posted", None))
 
-        logger.info("処理が正常に終了しました。")
-        return 0
+        if not args.compare and isinstance(ai_instance, LlmRouter):
+            # 採用しなかった応答の料金を記録し終えるまで待つ（終了すると記録できないため）
+            ai_instance.wait_discarded(timeout=DISCARDED_WAIT_SECONDS)
+        return exit_code
 
     except Exception:
         logger.error("アプリケーションの実行を中止します。")
         logger.info("詳細: ", exc_info=True)
         sys.exit(1)
-        sys.exit(1)
+    finally:
+        if retriever is not None:
+            retriever.close()
+
+
+def publish(
+    schema: BlogClientSchema,
+    record: dict,
+    snapshot: ConfigSnapshot,
+    on_posted: Callable[[], None] | None = None,
+) -> int:
+    """各ブログへ投稿し、通知・CSV・要約ファイル・スプレッドシートへ書き出す
+
+    on_postedは投稿が済んだ時点（記録の書き出しより前）に呼ぶ。予約投稿のジョブを完了にし、
+    後の書き出しで失敗しても投稿をやり直さないようにするため。
+    """
+    tenants_config = snapshot.tenants
+    schemas = tenant_schemas(schema, tenants_config)
+    with span("blog_post", tenants=len(schemas)):
+        tenant_results = asyncio.run(process_blogpost(schemas, tenants_config))
+    blogpost_results: TypeBlogResult = tenant_results.pop(DEFAULT_TENANT)
+
+    # 結果の整理
+    urls, hatena_result = collect_results(DEFAULT_TENANT, blogpost_results)
+    if hatena_result is None:
+        logger.error("はてな投稿エラーのため実行を中止します。")
+        logger.error(f"Qiita URL:{urls.get(BlogServices.QIITA, '')}\nDev.to URL: {urls.get(BlogServices.DEVTO, '')})")
+        raise RuntimeError("はてなへの投稿に失敗しました")
+    if on_posted is not None:
+        on_posted()
+
+    print("-" * 50)
+    print(f"投稿タイトル：{hatena_result.title}")
+    print(f"\n{'-' * 20}投稿本文{'-' * 20}")
+    print(f"{hatena_result.content[:100]}")
+    print("-" * 50)
+
+    # 他のアカウントの投稿結果（失敗しても既定のアカウントの投稿は済んでいるため中止しない）
+    tenant_posts = {tenant: collect_results(tenant, results) for tenant, results in tenant_results.items()}
+    tenant_posts = {tenant: post for tenant, post in tenant_posts.items() if post[1] is not None}
+
+    # 投稿完了の通知（バックグラウンドで各通知先へ送り、記録の書き出しと並行させる）
+    dispatcher = dispatchers.get(snapshot.notification, snapshot.secret_keys.get("line_channel_access_token", ""))
+    if dispatcher.names:
+        text = "投稿完了です。今日もお疲れさまでした！\n"
+        text += f"タイトル：{hatena_result.title}\n"
+        for name, url in urls.items():
+            text += f"{name}: {url}\n" if url else ""
+
+        text += f"はてな編集: {hatena_result.url_edit}\n"
+        text += f"下書きモード: {hatena_result.is_draft}"
+        for tenant, (tenant_urls, _) in tenant_posts.items():
+            text += f"\n{tenant}: " + " ".join(tenant_urls.values())
+        dispatcher.publish(Notification(title=hatena_result.title, text=text, url=hatena_result.url))
+
+    # ファイル出力
+    output_dir = snapshot.paths.output_dir
+    with span("write_records"):
+        csv_data, summary_path = write_records(output_dir, record, hatena_result, urls, tenant_posts)
+
+    # 検索インデックスへ追加（次回以降の関連記事・--searchの対象にする）
+    # 投稿は済んでいるため、ここで未登録の過去の要約ファイルもまとめて取り込む
+    search_config = snapshot.search
+    if search_config.enable:
+        try:
+            with (
+                span("search_index"),
+                open_search_index(search_config, output_dir, snapshot.ai.local.base_url, backfill=True) as index,
+            ):
+                index.add(summary_path.name, hatena_result.title, hatena_result.content, hatena_result.url)
+        except Exception as e:
+            logger.warning("検索インデックスに追加できませんでした。")
+            logger.info(f"詳細: {e!r}")
+
+    # Googleスプレッドシートへ出力
+    sheets_config = snapshot.google_sheets
+    if not snapshot.debug and sheets_config.enable:
+        try:
+            with span("google_sheets"):
+                to_spreadsheet(csv_data, sheets_config.spreadsheet_name)
+        except Exception as e:
+            logger.warning("Googleスプレッドシートへの書き込みは行われませんでした")
+            logger.debug(f"詳細: {e}")
+
+    logger.info("処理が正常に終了しました。")
+    return 0
+
+
+def release_job(
+    job: Job, args: argparse.Namespace, snapshot: ConfigSnapshot, on_posted: Callable[[], None] | None = None
+) -> None:
+    """公開時刻になったジョブを実行。失敗した場合は例外。on_postedは投稿が済んだ時点で呼ぶ（publishを参照）"""
+    if job.kind == "post":
+        post = dict(job.payload["post"])
+        secret_keys = snapshot.secret_keys
+        if job.payload.get("media_inputs"):
+            # 画像は公開する時点でアップロードする
+            media_paths = [Path(path) for path in job.payload["media_inputs"]]
+            media_future = start_media(media_paths, snapshot.media, secret_keys, snapshot.debug)
+            post["content"] = attach_media(post["content"], media_future)
+        schema = BlogClientSchema.model_validate(
+            {
+                **post,
+                "hatena_secret_keys": HatenaSecretKeys.model_validate(secret_keys),
+                "qiita_bearer_token": secret_keys.get("qiita_bearer_token"),
+                "devto_api_key": secret_keys.get("devto_api_key"),
+                "updated": job.slot,
+            }
+        )
+        publish(schema, job.payload["record"], snapshot, on_posted=on_posted)
+        return
+
+    # 予算超過で見送った要約をやり直す（まだ超える見込みなら次の枠へ再度予約される）
+    job_args = argparse.Namespace(
+        **{
+            **vars(args),
+            "inputs": job.payload["inputs"],
+            "compare": job.payload.get("compare", False),
+            "on_posted": on_posted,
+        },
+    )
+    job_args.daemon = job_args.once = False
+    try:
+        run(job_args, snapshot)
+    except SystemExit as e:
+        if e.code not in (0, None, EXIT_DEFERRED):
+            raise RuntimeError(f"要約が終了コード{e.code}で終了しました") from e
+
+
+def run_daemon(
+    args: argparse.Namespace,
+    stop: threading.Event | None = None,
+    wake: threading.Event | None = None,
+    on_finished: Callable[[int], None] | None = None,
+) -> int:
+    """予約されたジョブを公開枠の時刻に実行する。--onceなら公開時刻を過ぎたものだけ実行して終了
+
+    config.yaml・.envが変更されていれば、ジョブを始める前に読み込み直す（実行中のジョブは読み込んだ時点の設定のまま）。
+    キューのファイルだけは起動時のものを使い続ける。wake・on_finishedはrun_queueを参照。
+    """
+    stop = stop or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    def refresh() -> ScheduleConfig:
+        config_service.reload_if_changed()
+        return config_service.current().schedule
+
+    def execute(job: Job, on_posted: Callable[[], None]) -> None:
+        # 設定はジョブの直前のrefreshで読み込んだもの（ジョブの途中では読み込み直さない）
+        snapshot = config_service.current()
+        job_result = "failure"
+        try:
+            # ジョブごとに別のトレースとし、終わったら出力して手放す（常駐中に区間を溜め続けない）
+            with job_context(f"queue-{job.id}-{job.attempts}") as job_id, tracer.new_trace():
+                attributes = {"attempt": job.attempts, "config_version": snapshot.version, "job_id": job_id}
+                with span("scheduled_job", kind=job.kind, **attributes):
+                    release_job(job, args, snapshot, on_posted=on_posted)
+            job_result = "success"
+        finally:
+            JOBS.inc(result=job_result)
+            finish_tracing(snapshot.tracing, args.profile, append=True)
+            finish_metrics(snapshot.metrics)
+
+    queue_path = Path(config_service.current().schedule.queue_path)
+    try:
+        run_queue(queue_path, refresh, execute, stop, wake, once=args.once, on_finished=on_finished)
+    except KeyboardInterrupt:
+        pass
+    logger.warning("予約投稿の処理を終了します。")
+    return 0
+
+
+def run_server(args: argparse.Namespace) -> int:
+    """HTTP APIを起動し、受け付けたジョブ（と予約投稿）を同じプロセスのデーモンで実行する"""
+    try:
+        import uvicorn
+    except ImportError:
+        logger.error("APIサーバーにはuvicornが必要です: pip install -e .[api]")
+        return 1
+
+    snapshot = config_service.current()
+    api_config = snapshot.api
+    token = os.getenv("CHA2HATENA_API_TOKEN") or None
+    if token is None and api_config.host not in ("127.0.0.1", "localhost", "::1"):
+        logger.error(
+            f"api.host（{api_config.host}）が自分のPC以外から接続できるため、"
+            ".envにCHA2HATENA_API_TOKENを設定してください。設定しない場合はapi.hostを127.0.0.1にしてください。"
+        )
+        return 1
+    hub = ProgressHub()
+    progress_handler = ProgressHandler(hub)
+    parent_logger.addHandler(progress_handler)
+    stop, wake = threading.Event(), threading.Event()
+    daemon_args = argparse.Namespace(**{**vars(args), "serve": False, "daemon": True, "once": False})
+    worker = threading.Thread(target=run_daemon, args=(daemon_args, stop, wake, hub.finish), name="jobs")
+    worker.start()
+
+    app = ApiApp(
+        api_config,
+        queue_path=Path(snapshot.schedule.queue_path),
+        output_dir=snapshot.paths.output_dir,
+        ledger_path=Path(snapshot.budget.ledger_path) if snapshot.budget.enable else None,
+        hub=hub,
+        wake=wake,
+        token=token,
+    )
+    logger.warning(f"APIを起動します: http://{api_config.host}:{api_config.port}")
+    try:
+        uvicorn.run(app, host=api_config.host, port=api_config.port, log_level="warning")
+    finally:
+        stop.set()
+        wake.set()
+        worker.join()
+        app.close()
+        parent_logger.removeHandler(progress_handler)
+    return 0
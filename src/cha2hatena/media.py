@@ -0,0 +1,342 @@
+import asyncio
+import base64
+import binascii
+import contextvars
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import re
+import xml.etree.ElementTree as ET
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import unquote
+
+import httpx
+from authlib.integrations.httpx_client import OAuth1Auth
+from pydantic import BaseModel, Field
+
+from .blog.blog_schema import HatenaSecretKeys
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+FOTOLIFE_POST_URL = os.getenv("FOTOLIFE_POST_URL", "https://f.hatena.ne.jp/atom/post")
+HATENA_NS = "http://www.hatena.ne.jp/info/xmlns#"
+
+MARKDOWN_IMAGE = re.compile(r'!\[([^\]]*)\]\(\s*<?([^)\s>]+)>?(?:\s+"[^"]*")?\s*\)')
+DATA_URI = re.compile(r"^data:(image/[\w.+-]+);base64,(.+)$", re.DOTALL)
+ATTACHMENT_KEYS = ("attachments", "files", "images")
+SIGNATURES = {
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"\xff\xd8\xff": "image/jpeg",
+    b"GIF87a": "image/gif",
+    b"GIF89a": "image/gif",
+}
+
+
+class MediaConfig(BaseModel):
+    enable: bool = False
+    max_side: int = Field(default=1600, description="長辺がこれを超える画像は縮小する（px）")
+    jpeg_quality: int = Field(default=85, ge=1, le=95)
+    max_workers: int | None = Field(default=None, description="画像変換のスレッド数（Noneなら既定の数）")
+    upload_concurrency: int = 4
+    folder: str = Field(default="cha2hatena", description="はてなフォトライフのフォルダ")
+    cache_path: str = "outputs/media_cache.json"
+
+
+class ImageRef(BaseModel):
+    source: str = Field(description="会話ログ内での参照（パスまたはdata URI）")
+    alt: str = ""
+    data: bytes = Field(repr=False)
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.data).hexdigest()
+
+
+def sniff_mime(data: bytes) -> str:
+    for signature, mime in SIGNATURES.items():
+        if data.startswith(signature):
+            return mime
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def _load_image(source: str, base_dir: Path, alt: str) -> ImageRef | None:
+    """参照先の画像を読む。URLの画像はすでに公開されているので対象外"""
+    match = DATA_URI.match(source)
+    if match:
+        try:
+            return ImageRef(source=source, alt=alt, data=base64.b64decode(match.group(2)))
+        except binascii.Error:
+            logger.debug(f"data URIの画像を読み込めませんでした: {source[:50]}...")
+            return None
+    if re.match(r"^[a-z][a-z0-9+.-]*://", source, re.IGNORECASE):
+        return None
+    path = Path(unquote(source.removeprefix("file://")))
+    path = path if path.is_absolute() else base_dir / path
+    if not path.is_file():
+        logger.debug(f"画像ファイルが見つかりません: {path}")
+        return None
+    data = path.read_bytes()
+    if sniff_mime(data) == "application/octet-stream":
+        return None
+    return ImageRef(source=source, alt=alt or path.stem, data=data)
+
+
+def _attachment_sources(message: dict) -> list[tuple[str, str]]:
+    sources = []
+    for key in ATTACHMENT_KEYS:
+        for item in message.get(key) or []:
+            if isinstance(item, str):
+                sources.append((item, ""))
+            elif isinstance(item, dict):
+                source = item.get("path") or item.get("url") or item.get("data") or item.get("file_name")
+                if source:
+                    sources.append((source, item.get("file_name") or item.get("name") or ""))
+    return sources
+
+
+def extract_images(paths: list[Path]) -> list[ImageRef]:
+    """会話ログ（json/txt/md）から参照されている画像を出現順に集める"""
+    images = []
+    for path in paths:
+        text_sources: list[tuple[str, str]] = []
+        if path.suffix == ".json":
+            data = json.loads(path.read_text(encoding="utf-8"))
+            for message in data.get("messages", []):
+                text = message.get("say") or message.get("content") or ""
+                if isinstance(text, str):
+                    text_sources += [(m.group(2), m.group(1)) for m in MARKDOWN_IMAGE.finditer(text)]
+                text_sources += _attachment_sources(message)
+        else:
+            text = path.read_text(encoding="utf-8")
+            text_sources += [(m.group(2), m.group(1)) for m in MARKDOWN_IMAGE.finditer(text)]
+
+        for source, alt in text_sources:
+            image = _load_image(source, path.parent, alt)
+            if image is not None:
+                images.append(image)
+    return images
+
+
+def optimize_image(data: bytes, max_side: int, quality: int) -> tuple[bytes, str]:
+    """縮小・再圧縮した画像とMIMEタイプ（スレッドプールで実行）
+
+    Pillowがない場合・読めない画像・アニメーションGIFは元の画像をそのまま返す。小さくならなかった場合も元の画像を使う。
+    """
+    mime = sniff_mime(data)
+    try:
+        from PIL import Image
+    except ImportError:
+        return data, mime
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if getattr(image, "is_animated", False):
+                return data, mime
+            resized = max(image.size) > max_side
+            image.thumbnail((max_side, max_side))
+            out = io.BytesIO()
+            if image.mode in ("RGBA", "LA", "P") or image.format == "PNG":
+                image.save(out, format="PNG", optimize=True)
+                new_mime = "image/png"
+            else:
+                image.convert("RGB").save(out, format="JPEG", quality=quality, optimize=True, progressive=True)
+                new_mime = "image/jpeg"
+    except (OSError, ValueError):
+        return data, mime  # 読めない画像は変換せずにそのまま使う
+    if not resized and out.tell() >= len(data):
+        return data, mime
+    return out.getvalue(), new_mime
+
+
+class MediaCache:
+    """画像のハッシュ→アップロード先URLの対応をJSONファイルに保存し、実行をまたいで再利用する"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        try:
+            self.urls: dict[str, str] = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            self.urls = {}
+        except json.JSONDecodeError:
+            logger.warning(f"画像URLのキャッシュを読み込めなかったため作り直します: {path}")
+            self.urls = {}
+
+    def get(self, digest: str) -> str | None:
+        return self.urls.get(digest)
+
+    def save(self, new_urls: dict[str, str]) -> None:
+        if not new_urls:
+            return
+        # 同時に実行された別プロセスの追記を消さないよう、書き込み直前に読み直す
+        latest = MediaCache(self.path).urls
+        self.urls = {**latest, **self.urls, **new_urls}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f"{self.path.suffix}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(self.urls, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+
+class FotolifeUploader:
+    """はてなフォトライフAtomAPIへの画像アップロード"""
+
+    def __init__(self, hatena_secret_keys: HatenaSecretKeys, folder: str = "cha2hatena", url: str | None = None):
+        self.hatena_secret_keys = hatena_secret_keys
+        self.folder = folder
+        self.url = url or FOTOLIFE_POST_URL
+
+    def xml_unparser(self, data: bytes, mime: str, title: str) -> str:
+        ROOT = ET.Element("entry", attrib={"xmlns": "http://purl.org/atom/ns#"})
+        ET.SubElement(ROOT, "title").text = title
+        ET.SubElement(ROOT, "content", attrib={"mode": "base64", "type": mime}).text = base64.b64encode(data).decode()
+        ET.SubElement(ROOT, "dc:subject", attrib={"xmlns:dc": "http://purl.org/dc/elements/1.1/"}).text = self.folder
+        ET.SubElement(ROOT, "generator").text = "cha2hatena"
+        return ET.tostring(ROOT, encoding="unicode")
+
+    async def upload(self, httpx_client: httpx.AsyncClient, data: bytes, mime: str, title: str) -> str:
+        """アップロードして画像URLを返す"""
+        auth = OAuth1Auth(**self.hatena_secret_keys.get_auth_params(), force_include_body=True)
+        with span("http.post", service="fotolife", bytes=len(data)) as s:
+            response = await httpx_client.post(
+                self.url,
+                auth=auth,
+                content=self.xml_unparser(data, mime, title),
+                headers={"Content-Type": "application/xml; charset=utf-8"},
+                timeout=60,
+            )
+            s.set_attribute("status_code", response.status_code)
+        response.raise_for_status()
+        image_url = ET.fromstring(response.text).findtext(f"{{{HATENA_NS}}}imageurl")
+        if not image_url:
+            raise ValueError("フォトライフの応答に画像URLがありません")
+        return image_url
+
+
+class MediaPipeline:
+    """会話ログ中の画像を集め、重複を除いて縮小し、同時にアップロードする
+
+    画像はハッシュで重複を除き、アップロード済みのものはキャッシュのURLを使う。
+    縮小はCPUを使うためプロセスプールで、アップロードはupload_concurrency件ずつ同時に行う。
+    """
+
+    def __init__(self, config: MediaConfig, uploader: FotolifeUploader):
+        self.config = config
+        self.uploader = uploader
+        self.cache = MediaCache(Path(config.cache_path))
+
+    async def run(self, paths: list[Path]) -> list[tuple[ImageRef, str]]:
+        """(画像, URL)のリスト。アップロードに失敗した画像は含めない"""
+        with span("media.extract"):
+            images = extract_images(paths)
+        unique: dict[str, ImageRef] = {}
+        for image in images:
+            unique.setdefault(image.digest, image)  # 同じ画像は最初の参照を使う
+        pending = {digest: image for digest, image in unique.items() if self.cache.get(digest) is None}
+        if not unique:
+            return []
+        logger.warning(f"{len(images)}件の画像参照を検出（重複を除き{len(unique)}件、アップロード{len(pending)}件）")
+
+        new_urls: dict[str, str] = {}
+        if pending:
+            with span("media.optimize", images=len(pending)):
+                optimized = await self._optimize(list(pending.values()))
+            semaphore = asyncio.Semaphore(self.config.upload_concurrency)
+
+            async def _upload(httpx_client: httpx.AsyncClient, digest: str, data: bytes, mime: str) -> None:
+                async with semaphore:
+                    try:
+                        new_urls[digest] = await self.uploader.upload(httpx_client, data, mime, pending[digest].alt)
+                    except (httpx.HTTPError, ValueError, ET.ParseError) as e:
+                        logger.warning(f"画像をアップロードできませんでした: {pending[digest].alt or digest[:12]}")
+                        logger.info(f"詳細: {e!r}")
+
+            with span("media.upload", images=len(pending)):
+                async with httpx.AsyncClient() as httpx_client:
+                    await asyncio.gather(
+                        *(
+                            _upload(httpx_client, digest, data, mime)
+                            for digest, (data, mime) in zip(pending.keys(), optimized)
+                        )
+                    )
+            self.cache.save(new_urls)
+
+        urls = {digest: self.cache.get(digest) or new_urls.get(digest) for digest in unique}
+        return [(image, urls[image.digest]) for image in images if urls[image.digest]]
+
+    async def _optimize(self, images: list[ImageRef]) -> list[tuple[bytes, str]]:
+        if importlib.util.find_spec("PIL") is None:
+            logger.info("Pillowがインストールされていないため、画像は縮小せずにアップロードします。")
+            return [(image.data, sniff_mime(image.data)) for image in images]
+        loop = asyncio.get_running_loop()
+        # Pillowはデコード・縮小・エンコードの間GILを解放するため、スレッドでも並列に変換できる
+        # （プロセスプールではワーカーがmainを読み込み直し、設定の読み込みやログの設定をやり直してしまう）
+        with ThreadPoolExecutor(max_workers=self.config.max_workers, thread_name_prefix="media") as pool:
+            return await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        pool, optimize_image, image.data, self.config.max_side, self.config.jpeg_quality
+                    )
+                    for image in images
+                )
+            )
+
+
+def attach_images(content: str, uploaded: list[tuple[ImageRef, str]]) -> str:
+    """本文中の画像参照をアップロード先URLに置き換え、本文にない画像は末尾にまとめて載せる"""
+    urls_by_source = {image.source: url for image, url in uploaded}
+    content = MARKDOWN_IMAGE.sub(
+        lambda m: f"![{m.group(1)}]({urls_by_source[m.group(2)]})" if m.group(2) in urls_by_source else m.group(0),
+        content,
+    )
+    seen = set(re.findall(r"\]\(([^)\s]+)", content))
+    gallery = []
+    for image, url in uploaded:
+        if url not in seen:
+            seen.add(url)
+            gallery.append(f"![{image.alt}]({url})")
+    if gallery:
+        content = content.rstrip() + "\n\n## 画像\n\n" + "\n\n".join(gallery) + "\n"
+    return content
+
+
+def start_media(input_paths: list[Path], config: MediaConfig, secret_keys: dict, debug: bool) -> Future | None:
+    """media.enableなら会話ログ中の画像のアップロードをバックグラウンドで始める
+
+    デバッグ時（下書き投稿）はアップロードしない。はてなの認証情報がない場合は画像なしで続行する。
+    """
+    if not config.enable:
+        return None
+    if debug:
+        logger.warning("デバッグモードのため、画像はアップロードしません。")
+        return None
+    try:
+        uploader = FotolifeUploader(HatenaSecretKeys.model_validate(secret_keys), config.folder)
+    except ValueError as e:
+        logger.warning("はてなの認証情報が不足しているため、画像なしで投稿します。")
+        logger.info(f"詳細: {e}")
+        return None
+    pipeline = MediaPipeline(config, uploader)
+    media_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="media")
+    media_future = media_executor.submit(contextvars.copy_context().run, asyncio.run, pipeline.run(input_paths))
+    media_executor.shutdown(wait=False)
+    return media_future
+
+
+def attach_media(content: str, media_future: Future | None) -> str:
+    """画像のアップロードを待って本文に載せる。失敗した場合は画像なしの本文を返す"""
+    if media_future is None:
+        return content
+    try:
+        with span("media"):
+            uploaded = media_future.result()
+        return attach_images(content, uploaded)
+    except Exception as e:
+        logger.warning("画像をアップロードできなかったため、画像なしで投稿します。")
+        logger.info(f"詳細: {e!r}")
+        return content
@@ -0,0 +1,305 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from pydantic import BaseModel, Field
+
+if TYPE_CHECKING:
+    from .llm.llm_stats import TokenStats
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# LLMの応答は数秒〜数分、ブログ投稿は1秒前後のため両方を拾える範囲にする
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class MetricsConfig(BaseModel):
+    enable: bool = False
+    host: str = "127.0.0.1"
+    port: int | None = Field(default=None, ge=0, le=65535, description="指定すると実行中は/metricsを配信")
+    textfile_path: str | None = Field(default=None, description="終了時に書き出すtextfile collector用のファイル")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}のラベルが一致しません: {sorted(labels)} != {sorted(self.labelnames)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple[str, ...], **extra) -> str:
+        return _format_labels({**dict(zip(self.labelnames, key)), **extra})
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    """単調増加するカウンター"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if amount < 0:
+            raise ValueError("カウンターは減らせません")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{self._labels(key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """増減する現在値（キューの長さなど）"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    @contextmanager
+    def track(self, **labels):
+        """ブロックの実行中だけ値を1増やす"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{self._labels(key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """値の分布（レイテンシなど）。バケットは上限値の昇順"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとに [各バケットの件数..., 合計値, 件数]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            if idx < len(self.buckets):
+                state[idx] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """ブロックの所要時間（秒）を記録。例外時も記録する"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return int(state[-1]) if state else 0
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        lines = self.header()
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(key, le=_format_value(bound))} {int(cumulative)}")
+            lines.append(f"{self.name}_bucket{self._labels(key, le='+Inf')} {int(state[-1])}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {int(state[-1])}")
+        return lines
+
+
+class Registry:
+    """メトリクスの登録先。Prometheusのテキスト形式で出力する"""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._server: ThreadingHTTPServer | None = None
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"メトリクス名が重複しています: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path) -> None:
+        """node_exporterのtextfile collector用。読み取り途中のファイルを見せないよう置き換えで書き込む"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(self.render(), encoding="utf-8")
+        os.replace(tmp_path, path)
+        logger.debug(f"メトリクスを書き出しました: {path}")
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """/metricsをデーモンスレッドで配信。port=0なら空きポートを使う"""
+        registry = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f"metrics: {format % args}")
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        logger.warning(f"メトリクスを配信しています: http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+    def shutdown(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+registry = Registry()
+
+LLM_REQUEST_SECONDS = registry.histogram(
+    "cha2hatena_llm_request_seconds", "LLM APIへの1リクエストの所要時間", ("model",)
+)
+LLM_RETRIES = registry.counter("cha2hatena_llm_retries_total", "LLM APIのリトライ回数", ("model",))
+LLM_TOKENS = registry.counter("cha2hatena_llm_tokens_total", "LLMのトークン数", ("model", "type"))
+LLM_FEE = registry.counter("cha2hatena_llm_fee_usd_total", "LLMの料金（USD）", ("model",))
+BLOG_POST_SECONDS = registry.histogram(
+    "cha2hatena_blog_post_seconds", "ブログ投稿の所要時間", ("service",), buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+BLOG_POSTS = registry.counter("cha2hatena_blog_posts_total", "ブログ投稿の件数", ("service", "result"))
+NOTIFICATIONS = registry.counter(
+    "cha2hatena_notifications_total", "通知の件数（sent/failed/dropped/coalesced）", ("sink", "result")
+)
+QUEUE_DEPTH = registry.gauge("cha2hatena_queue_depth", "処理待ちの件数", ("queue",))
+JOBS = registry.counter("cha2hatena_jobs_total", "パイプラインの実行回数", ("result",))
+
+
+def start_metrics(config: MetricsConfig) -> None:
+    """metrics.portが設定されていれば/metricsを配信"""
+    if config.enable and config.port is not None:
+        try:
+            registry.serve(config.port, config.host)
+        except OSError as e:
+            logger.warning("メトリクスの配信を開始できませんでした。")
+            logger.info(f"詳細: {e}")
+
+
+def finish_metrics(config: MetricsConfig) -> None:
+    """metrics.textfile_pathが設定されていればtextfile collector用のファイルを書き出す"""
+    if config.enable and config.textfile_path:
+        try:
+            registry.write_textfile(Path(config.textfile_path))
+        except OSError as e:
+            logger.warning("メトリクスを書き出せませんでした。")
+            logger.info(f"詳細: {e}")
+
+
+def record_token_stats(stats: "TokenStats") -> None:
+    """1回の要約のトークン数と料金を加算"""
+    model = stats.model_name
+    for token_type, tokens in (
+        ("input", stats.input_tokens),
+        ("cached", stats.cached_tokens),
+        ("thoughts", stats.thoughts_tokens),
+        ("output", stats.output_tokens),
+    ):
+        LLM_TOKENS.inc(tokens or 0, model=model, type=token_type)
+    LLM_FEE.inc(stats.total_fee or 0, model=model)
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+
+import httpx
+
+from ..background import BackgroundLoop
+from ..line_message import LineNotifier
+from ..metrics import NOTIFICATIONS, QUEUE_DEPTH
+from ..tracing import span
+from .email_notifier import EmailNotifier
+from .line_notifier import LineSink
+from .notifier_schema import AbstractNotifier, Notification, NotificationConfig
+from .webhook_notifier import DiscordNotifier, SlackNotifier, WebhookNotifier
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_URL_ENV = {"webhook": "NOTIFY_WEBHOOK_URL", "slack": "SLACK_WEBHOOK_URL", "discord": "DISCORD_WEBHOOK_URL"}
+
+
+def create_notifiers(
+    config: NotificationConfig, client: httpx.AsyncClient, line_access_token: str = ""
+) -> list[AbstractNotifier]:
+    """設定で有効になっている通知先を作る。URL・認証情報が見つからないものは警告して除く"""
+    notifiers: list[AbstractNotifier] = []
+    if config.line and line_access_token:
+        notifiers.append(
+            LineSink(LineNotifier(line_access_token, client, timeout=config.timeout, max_retries=config.max_retries))
+        )
+
+    for name, notifier_class in (("webhook", WebhookNotifier), ("slack", SlackNotifier), ("discord", DiscordNotifier)):
+        webhook_config = getattr(config, name)
+        if not webhook_config.enable:
+            continue
+        url = webhook_config.url or os.getenv(WEBHOOK_URL_ENV[name], "")
+        if not url:
+            logger.warning(f"{name}の通知先URLが設定されていません（{WEBHOOK_URL_ENV[name]}）。{name}へは通知しません。")
+            continue
+        notifiers.append(notifier_class(url, client, timeout=config.timeout, max_retries=config.max_retries))
+
+    if config.email.enable:
+        if config.email.recipients:
+            notifiers.append(EmailNotifier(config.email, os.getenv("SMTP_PASSWORD", ""), timeout=config.timeout))
+        else:
+            logger.warning("メールの宛先(email.recipients)が設定されていません。メールでは通知しません。")
+    return notifiers
+
+
+class _Sink:
+    """通知先ごとの未送信キューと送信ワーカー"""
+
+    def __init__(self, notifier: AbstractNotifier):
+        self.notifier = notifier
+        self.queue: deque[Notification] = deque()
+        self.wakeup = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.worker: asyncio.Task | None = None
+
+
+class NotificationDispatcher:
+    """通知を複数の通知先へ同時に配る
+
+    publishはどのスレッドからでも呼べ、すぐに戻る。送信はBackgroundLoop上の通知先ごとのワーカーが行うため、
+    遅い通知先があっても他の通知先や呼び出し元を待たせない。キューが上限に達したらoverflowに従い
+    古いものを捨てる（drop_oldest）・新しいものを捨てる（drop_newest）・最後の通知にまとめる（coalesce）。
+    """
+
+    def __init__(
+        self,
+        background: BackgroundLoop,
+        notifiers: list[AbstractNotifier],
+        queue_size: int = 100,
+        overflow: str = "coalesce",
+        batch_window: float = 0.0,
+    ):
+        self.background = background
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.batch_window = batch_window
+        self._sinks: list[_Sink] | None = None
+        self._notifiers = notifiers
+
+    @property
+    def names(self) -> list[str]:
+        return [notifier.name for notifier in self._notifiers]
+
+    def publish(self, notification: Notification) -> None:
+        self.background.loop.call_soon_threadsafe(self._enqueue, notification)
+
+    def _enqueue(self, notification: Notification) -> None:
+        if self._sinks is None:
+            # asyncio.Eventはループ内で作る
+            self._sinks = [_Sink(notifier) for notifier in self._notifiers]
+        for sink in self._sinks:
+            labels = {"sink": sink.notifier.name}
+            if len(sink.queue) < self.queue_size:
+                sink.queue.append(notification)
+            elif self.overflow == "coalesce":
+                sink.queue[-1] = sink.queue[-1].merge(notification)
+                NOTIFICATIONS.inc(**labels, result="coalesced")
+            elif self.overflow == "drop_oldest":
+                sink.queue.popleft()
+                sink.queue.append(notification)
+                NOTIFICATIONS.inc(**labels, result="dropped")
+            else:
+                NOTIFICATIONS.inc(**labels, result="dropped")
+            QUEUE_DEPTH.set(len(sink.queue), queue=f"notify:{sink.notifier.name}")
+            sink.idle.clear()
+            sink.wakeup.set()
+            if sink.worker is None:
+                sink.worker = asyncio.create_task(self._run(sink))
+
+    async def _run(self, sink: _Sink) -> None:
+        name = sink.notifier.name
+        while True:
+            await sink.wakeup.wait()
+            if self.batch_window:
+                await asyncio.sleep(self.batch_window)
+            sink.wakeup.clear()
+            batch = list(sink.queue)
+            sink.queue.clear()
+            QUEUE_DEPTH.set(0, queue=f"notify:{name}")
+            if batch:
+                with span("notify", sink=name, notifications=len(batch)):
+                    try:
+                        succeeded = await sink.notifier.send(batch)
+                    except Exception as e:
+                        logger.error(f"{name}への通知でエラーが発生しました: {e!r}")
+                        succeeded = False
+                NOTIFICATIONS.inc(len(batch), sink=name, result="sent" if succeeded else "failed")
+            if not sink.queue:
+                sink.idle.set()
+
+    async def drain(self) -> None:
+        """すべての通知先のキューが空になるまで待つ"""
+        await asyncio.gather(*(sink.idle.wait() for sink in self._sinks or []))
+
+    def close(self, timeout: float | None = None) -> bool:
+        """未送信の通知をtimeout秒まで待ってから止める。すべて送り終えていればTrue"""
+        self.background.submit(self.drain())
+        return self.background.shutdown(timeout=timeout)
+
+
+class SharedDispatcher:
+    """プロセス（常駐時はデーモン）で1つのNotificationDispatcherを使い回す。通知の設定が変わったときだけ作り直す"""
+
+    def __init__(self):
+        self._current: tuple[tuple[NotificationConfig, str], NotificationDispatcher] | None = None
+        self._lock = threading.Lock()
+
+    def get(self, config: NotificationConfig, line_access_token: str = "") -> NotificationDispatcher:
+        key = (config, line_access_token)
+        with self._lock:
+            if self._current is not None and self._current[0] == key:
+                return self._current[1]
+            self._close()
+            background = BackgroundLoop("notification")
+            dispatcher = NotificationDispatcher(
+                background,
+                create_notifiers(config, background.client, line_access_token),
+                queue_size=config.queue_size,
+                overflow=config.overflow,
+                batch_window=config.batch_window,
+            )
+            self._current = (key, dispatcher)
+            return dispatcher
+
+    def _close(self) -> None:
+        if self._current is not None:
+            (config, _), dispatcher = self._current
+            self._current = None
+            dispatcher.close(timeout=config.shutdown_timeout)
+
+    def close(self) -> None:
+        """未送信の通知を待ってから止める（送れなくても投稿は済んでいるため終了コードには影響させない）"""
+        with self._lock:
+            self._close()
@@ -0,0 +1,46 @@
+import asyncio
+import logging
+import smtplib
+from email.message import EmailMessage
+
+from .notifier_schema import AbstractNotifier, EmailConfig, Notification, join_text
+
+logger = logging.getLogger(__name__)
+
+
+class EmailNotifier(AbstractNotifier):
+    """SMTPでメール通知（smtplibは同期APIのため別スレッドで送る）"""
+
+    name = "email"
+
+    def __init__(self, config: EmailConfig, password: str = "", timeout: float = 10.0):
+        self.config = config
+        self.password = password
+        self.timeout = timeout
+
+    def build_message(self, notifications: list[Notification]) -> EmailMessage:
+        message = EmailMessage()
+        title = notifications[0].title if len(notifications) == 1 else f"{len(notifications)}件の投稿通知"
+        message["Subject"] = f"[cha2hatena] {title}"
+        message["From"] = self.config.sender or self.config.username
+        message["To"] = ", ".join(self.config.recipients)
+        message.set_content(join_text(notifications))
+        return message
+
+    def _send(self, message: EmailMessage) -> None:
+        with smtplib.SMTP(self.config.host, self.config.port, timeout=self.timeout) as smtp:
+            if self.config.starttls:
+                smtp.starttls()
+            if self.config.username:
+                smtp.login(self.config.username, self.password)
+            smtp.send_message(message)
+
+    async def send(self, notifications: list[Notification]) -> bool:
+        try:
+            await asyncio.to_thread(self._send, self.build_message(notifications))
+        except (OSError, smtplib.SMTPException) as e:
+            logger.error("メール通知出来ませんでした。詳細は`app.log`を確認してください")
+            logger.info(f"詳細: {e!r}")
+            return False
+        logger.warning("✓ メール通知に成功しました。")
+        return True
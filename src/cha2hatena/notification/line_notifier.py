@@ -0,0 +1,14 @@
+from ..line_message import LineNotifier
+from .notifier_schema import AbstractNotifier, Notification
+
+
+class LineSink(AbstractNotifier):
+    """LineNotifierを通知先として使うためのアダプター（1通知＝1メッセージで最大5件ずつ送る）"""
+
+    name = "line"
+
+    def __init__(self, notifier: LineNotifier):
+        self.notifier = notifier
+
+    async def send(self, notifications: list[Notification]) -> bool:
+        return await self.notifier.broadcast([notification.text for notification in notifications])
@@ -0,0 +1,71 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+
+class Notification(BaseModel):
+    title: str
+    text: str
+    url: str | None = Field(default=None, description="はてなブログの記事URL")
+    count: int = Field(default=1, description="まとめられた通知の件数")
+    created_at: datetime = Field(default_factory=datetime.now)
+
+    def merge(self, other: "Notification") -> "Notification":
+        """キューがあふれたときに、後から来た通知を1件にまとめる"""
+        return Notification(
+            title=self.title if self.count > 1 or other.title == self.title else f"{self.title} ほか",
+            text=f"{self.text}\n\n{other.text}",
+            url=self.url or other.url,
+            count=self.count + other.count,
+            created_at=self.created_at,
+        )
+
+
+class AbstractNotifier(ABC):
+    """通知先（LINE・Slackなど）の共通インターフェース"""
+
+    name: str
+
+    @abstractmethod
+    async def send(self, notifications: list[Notification]) -> bool:
+        """まとめて送信し、成功すればTrueを返す"""
+        ...
+
+
+def join_text(notifications: list[Notification], limit: int | None = None) -> str:
+    """1通のメッセージにまとめたテキスト（limit文字を超える分は切り詰める）"""
+    text = "\n\n".join(notification.text for notification in notifications)
+    if limit is not None and len(text) > limit:
+        text = text[: limit - 3] + "..."
+    return text
+
+
+class WebhookConfig(BaseModel):
+    enable: bool = False
+    url: str = Field(default="", description="空なら環境変数から取得")
+
+
+class EmailConfig(BaseModel):
+    enable: bool = False
+    host: str = "localhost"
+    port: int = 587
+    starttls: bool = True
+    username: str = ""  # パスワードは環境変数SMTP_PASSWORD
+    sender: str = ""
+    recipients: list[str] = Field(default_factory=list)
+
+
+class NotificationConfig(BaseModel):
+    line: bool = True
+    timeout: float = 10.0
+    max_retries: int = 3
+    batch_window: float = Field(default=0.0, description="この秒数の間に来た通知を1回の送信にまとめる")
+    shutdown_timeout: float = 30.0
+    queue_size: int = Field(default=100, ge=1, description="通知先ごとの未送信キューの上限")
+    overflow: Literal["drop_oldest", "drop_newest", "coalesce"] = "coalesce"
+    webhook: WebhookConfig = Field(default_factory=WebhookConfig)
+    slack: WebhookConfig = Field(default_factory=WebhookConfig)
+    discord: WebhookConfig = Field(default_factory=WebhookConfig)
+    email: EmailConfig = Field(default_factory=EmailConfig)
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import random
+
+import httpx
+
+from .notifier_schema import AbstractNotifier, Notification, join_text
+
+logger = logging.getLogger(__name__)
+
+
+async def post_with_retry(
+    client: httpx.AsyncClient,
+    url: str,
+    payload: dict,
+    name: str,
+    timeout: float = 10.0,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+) -> bool:
+    """JSONをPOSTし、429・5xx・通信エラーは指数バックオフ（Retry-Afterがあればそれに従う）でリトライ"""
+    for attempt in range(max_retries + 1):
+        try:
+            res = await client.post(url, json=payload, timeout=timeout)
+        except httpx.TransportError as e:
+            if attempt == max_retries:
+                logger.error(f"{name}通知出来ませんでした。詳細は`app.log`を確認してください")
+                logger.info(f"詳細: {e!r}")
+                return False
+            await asyncio.sleep(backoff * 2**attempt * random.uniform(0.5, 1.5))
+            continue
+
+        if res.is_success:
+            logger.warning(f"✓ {name}通知に成功しました。")
+            return True
+        if (res.status_code == 429 or res.status_code >= 500) and attempt < max_retries:
+            try:
+                wait = max(float(res.headers.get("Retry-After", "")), 0.0)
+            except ValueError:
+                wait = backoff * 2**attempt * random.uniform(0.5, 1.5)
+            await asyncio.sleep(wait)
+            continue
+
+        logger.error(f"{name}通知出来ませんでした。ステータスコード：{res.status_code}")
+        logger.info(f"詳細: {res.text[:500]}")
+        return False
+    return False
+
+
+class WebhookNotifier(AbstractNotifier):
+    """任意のURLへ通知内容をJSONでPOSTする"""
+
+    name = "webhook"
+
+    def __init__(self, url: str, client: httpx.AsyncClient, timeout: float = 10.0, max_retries: int = 3):
+        self.url = url
+        self.client = client
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+    def payload(self, notifications: list[Notification]) -> dict:
+        return {"notifications": [notification.model_dump(mode="json") for notification in notifications]}
+
+    async def send(self, notifications: list[Notification]) -> bool:
+        return await post_with_retry(
+            self.client,
+            self.url,
+            self.payload(notifications),
+            self.name,
+            timeout=self.timeout,
+            max_retries=self.max_retries,
+        )
+
+
+class SlackNotifier(WebhookNotifier):
+    """SlackのIncoming Webhook"""
+
+    name = "slack"
+
+    def payload(self, notifications: list[Notification]) -> dict:
+        return {"text": join_text(notifications, limit=40_000)}
+
+
+class DiscordNotifier(WebhookNotifier):
+    """DiscordのWebhook（contentは2000文字まで）"""
+
+    name = "discord"
+
+    def payload(self, notifications: list[Notification]) -> dict:
+        return {"content": join_text(notifications, limit=2000), "allowed_mentions": {"parse": []}}
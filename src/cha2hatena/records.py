@@ -0,0 +1,132 @@
+import csv
+import logging
+from datetime import datetime
+from pathlib import Path
+
+import gspread
+from pydantic import BaseModel
+
+from .blog.blog_schema import HatenaResponseSchema
+from .types import BlogServices
+
+logger = logging.getLogger(__name__)
+
+
+class GoogleSheetsConfig(BaseModel):
+    enable: bool = False
+    spreadsheet_name: str = "record"
+
+
+def summary_key(title: str) -> str:
+    """要約ファイルの名前（検索インデックスのキー）"""
+    return f"{datetime.now().strftime('%y%m%d')}-{title}".replace("/", ", ") + ".txt"
+
+
+def add_csv_columns(path: Path, fieldnames: list[str]) -> list[str]:
+    """既存のCSVにない列があれば末尾に追加して書き直す。書き込みに使う列名の並びを返す"""
+    with path.open(encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        header = list(reader.fieldnames or [])
+        missing = [name for name in fieldnames if name not in header]
+        if not missing:
+            return header
+        rows = list(reader)
+    header += missing
+    with path.open("w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=header, restval="")
+        writer.writeheader()
+        writer.writerows(rows)
+    logger.warning(f"CSVに列を追加しました: {', '.join(missing)}")
+    return header
+
+
+def append_csv(path: Path, data: dict) -> None:
+    """pathがなければ作成し、CSVに1行追記"""
+    # ファイルを開く前に状態を確定させる（正しい）
+    is_new_file = not path.exists() or path.stat().st_size == 0
+
+    try:
+        fieldnames = list(data.keys()) if is_new_file else add_csv_columns(path, list(data.keys()))
+        with path.open("a", newline="", encoding="utf-8-sig") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, restval="")
+            if is_new_file:
+                writer.writeheader()  # 新規または空の時のみ列名を追加
+            writer.writerow(data)
+
+        if is_new_file:
+            logger.warning(f"新しいCSVファイルを作成しました: {path}")
+        else:
+            logger.warning(f"CSVにデータを追記しました: {path.name}")
+    except Exception:
+        logger.exception("CSVファイルへの書き込み中にエラーが発生しました。")
+
+
+def csv_row(record: dict, hatena_result: HatenaResponseSchema, urls: dict[BlogServices, str]) -> dict:
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "conversation_title": record["conversation_title"],
+        "AI_name": record["AI_name"],
+        "entry_URL": hatena_result.url,
+        "is_draft": hatena_result.is_draft,
+        "entry_title": hatena_result.title,
+        "entry_content": hatena_result.content[:30],
+        "categories": ",".join(hatena_result.categories),
+        **{
+            key: value for key, value in record.items() if key not in ("conversation_title", "AI_name", "cached_tokens")
+        },
+        "Qiita_URL": urls.get(BlogServices.QIITA, ""),
+        "Dev.to_URL": urls.get(BlogServices.DEVTO, ""),
+        # 後から追加した列は既存のCSV・スプレッドシートと並びが変わらないよう末尾に置く
+        "cached_tokens": record.get("cached_tokens", ""),  # input_tokensのうちキャッシュヒットした分
+    }
+
+
+def write_records(
+    output_dir: Path,
+    record: dict,
+    hatena_result: HatenaResponseSchema,
+    urls: dict[BlogServices, str],
+    tenant_posts: dict[str, tuple[dict[BlogServices, str], HatenaResponseSchema]],
+) -> tuple[dict, Path]:
+    """record.csvへ1行追記し、本文を要約ファイルに保存する。書き出した行と要約ファイルのパスを返す
+
+    他のアカウントの記録はアカウントごとのCSVへ（LLMの料金は既定のアカウントの行と同じ値）。
+    """
+    csv_data = csv_row(record, hatena_result, urls)
+    output_dir.mkdir(exist_ok=True)
+    summary_dir = output_dir / "summary"
+    summary_dir.mkdir(exist_ok=True)
+    summary_path = summary_dir / summary_key(hatena_result.title)
+    append_csv(output_dir / "record.csv", csv_data)
+    summary_path.write_text(hatena_result.content, encoding="utf-8")
+    for tenant, (tenant_urls, tenant_result) in tenant_posts.items():
+        tenant_dir = output_dir / "tenants" / tenant
+        tenant_dir.mkdir(parents=True, exist_ok=True)
+        append_csv(tenant_dir / "record.csv", csv_row(record, tenant_result, tenant_urls))
+    return csv_data, summary_path
+
+
+def to_spreadsheet(new_data: dict, spreadsheet_name: str) -> None:
+    SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+    CREDENTIALS_DIRECTORY = Path.cwd() / "credentials" / "credentials.json"
+    if spreadsheet_name:
+        gc = gspread.service_account(scopes=SCOPES, filename=CREDENTIALS_DIRECTORY)
+        try:
+            # スプレッドシートを開く（存在チェック）
+            sh = gc.open(spreadsheet_name)
+            worksheet = sh.sheet1
+
+            existing_data = worksheet.get_all_values()
+            if not existing_data:
+                worksheet.update([list(new_data.keys())] + [list(new_data.values())])
+                logger.warning(f"新規作成: スプレッドシートにヘッダーとデータを追加しました: {spreadsheet_name}")
+            else:
+                worksheet.append_row(list(new_data.values()))
+                logger.warning("追記: スプレッドシートに新しい行を追加しました")
+
+        except gspread.exceptions.SpreadsheetNotFound:
+            # スプレッドシートが存在しない場合、新規作成
+            sh = gc.create("record")
+            worksheet = sh.sheet1
+            worksheet.update([list(new_data.keys())] + [list(new_data.values())])
+            logger.warning(f"新規スプレッドシートを作成し、データを追加しました: {spreadsheet_name}")
@@ -0,0 +1,138 @@
+import logging
+import re
+from pathlib import Path
+
+from pydantic import BaseModel, Field
+
+from .compaction import estimate_tokens
+from .search_index import SearchConfig, SearchIndex, open_search_index, related_links
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+_HEADING = re.compile(r"^#{1,6}\s+(.+)$")
+_NOISE = re.compile(r"^(```|\||>|---|\[\^|!\[|https?://)")
+_INLINE = re.compile(r"[*_`]|\[([^\]]*)\]\([^)]*\)")
+_APPENDIX = ("関連記事", "画像")
+
+CONTEXT_HEADER = (
+    "【参考：過去に書いた関連記事の要点（会話ログではありません）。内容の重複を避け、必要なら関連として触れてください】"
+)
+CONTEXT_FOOTER = "【ここから今回の会話ログ】"
+
+
+class ContextConfig(BaseModel):
+    enable: bool = False
+    top_k: int = Field(default=3, ge=1, description="参考にする過去の記事の数")
+    max_tokens: int = Field(default=600, ge=50, description="過去の記事の要点全体のトークン数の上限")
+    digest_chars: int = Field(default=300, ge=50, description="1記事あたりの要点の最大文字数")
+    query_chars: int = Field(default=4000, ge=100, description="検索に使う会話ログの先頭の文字数")
+
+
+def make_digest(text: str, max_chars: int) -> str:
+    """見出しと各段落の1文目だけを残した要点"""
+    parts: list[str] = []
+    in_code = False
+    paragraph_started = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("```"):
+            in_code = not in_code
+            continue
+        if in_code or not line:
+            paragraph_started = False
+            continue
+        if heading := _HEADING.match(line):
+            if heading.group(1).strip() in _APPENDIX:
+                break  # 自動で付け足した節は要点に含めない
+            parts.append(f"[{heading.group(1).strip()}]")
+            paragraph_started = False
+            continue
+        if paragraph_started or _NOISE.match(line):
+            continue
+        line = _INLINE.sub(lambda m: m.group(1) or "", line.lstrip("-*+0123456789. "))
+        parts.append(re.split(r"(?<=[。．!?！？])", line, maxsplit=1)[0])
+        paragraph_started = True
+
+    digest = " ".join(part for part in parts if part)
+    return digest if len(digest) <= max_chars else digest[: max_chars - 1] + "…"
+
+
+def build_context(index: SearchIndex, summary_dir: Path, conversation: str, config: ContextConfig) -> str:
+    """会話ログに近い過去の記事の要点をトークン数の上限内で並べる。該当がなければ空文字"""
+    hits = index.search(conversation[: config.query_chars], limit=config.top_k)
+    blocks: list[str] = []
+    budget = config.max_tokens - estimate_tokens(CONTEXT_HEADER + CONTEXT_FOOTER)
+    for hit in hits:
+        path = summary_dir / hit.key
+        if not path.is_file():
+            continue
+        block = f"- {hit.title}" + (f"（{hit.url}）" if hit.url else "")
+        block += f"\n  {make_digest(path.read_text(encoding='utf-8'), config.digest_chars)}"
+        cost = estimate_tokens(block)
+        if cost > budget:
+            break
+        blocks.append(block)
+        budget -= cost
+    if not blocks:
+        return ""
+    logger.warning(f"過去の関連記事{len(blocks)}件の要点をプロンプトに加えます。")
+    return "\n".join([CONTEXT_HEADER, *blocks, CONTEXT_FOOTER]) + "\n\n"
+
+
+class Retriever:
+    """1回の実行で使う検索インデックス。要約の前に過去の関連記事の要点を、要約の後に関連記事のリンクを探す
+
+    インデックスは1回だけ開いて両方に使う。開けない・検索できない場合は警告だけ出して、それぞれなしで続ける。
+    """
+
+    def __init__(
+        self, search_config: SearchConfig, context_config: ContextConfig, output_dir: Path, base_url: str | None
+    ):
+        self.search_config = search_config
+        self.context_config = context_config
+        self.summary_dir = output_dir / "summary"
+        self.index: SearchIndex | None = None
+        if search_config.enable and (context_config.enable or search_config.related_links):
+            try:
+                self.index = open_search_index(search_config, output_dir, base_url)
+            except Exception as e:
+                logger.warning("検索インデックスを開けませんでした。過去の関連記事は使いません。")
+                logger.info(f"詳細: {e!r}")
+
+    def context(self, conversation: str) -> str:
+        """会話ログの前に加える過去の関連記事の要点（search.context.enableのとき）"""
+        if self.index is None or not self.context_config.enable:
+            return ""
+        try:
+            with span("retrieve_context"):
+                return build_context(self.index, self.summary_dir, conversation, self.context_config)
+        except Exception as e:
+            logger.warning("過去の関連記事を検索できませんでした。")
+            logger.info(f"詳細: {e!r}")
+            return ""
+
+    def add_related_links(self, title: str, content: str, exclude: set[str]) -> str:
+        """本文の末尾に関連記事を載せる（search.related_linksのとき）。excludeは除く要約ファイル名"""
+        if self.index is None or not self.search_config.related_links:
+            return content
+        try:
+            with span("related_links"):
+                hits = self.index.search(f"{title}\n{content}", limit=self.search_config.related_links, exclude=exclude)
+        except Exception as e:
+            logger.warning("関連記事を検索できませんでした。")
+            logger.info(f"詳細: {e!r}")
+            return content
+        if links := related_links(hits):
+            return content.rstrip("\n") + "\n" + links
+        return content
+
+    def close(self) -> None:
+        if self.index is not None:
+            self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,356 @@
+import json
+import logging
+import sqlite3
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from datetime import UTC, date, datetime, time, timedelta
+from functools import partial
+from pathlib import Path
+from typing import Literal
+from zoneinfo import ZoneInfo
+
+from pydantic import BaseModel, Field, field_validator
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    slot TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, slot);
+"""
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+class ScheduleConfig(BaseModel):
+    enable: bool = False
+    queue_path: str = "outputs/schedule.sqlite3"
+    timezone: str = "Asia/Tokyo"
+    slots: list[time] = Field(default_factory=lambda: [time(21, 0)], description="公開する時刻（1枠1記事）")
+    weekdays: list[str] = Field(default_factory=lambda: list(WEEKDAYS), description="公開する曜日")
+    min_lead_minutes: int = Field(default=10, ge=0, description="キューに入れてから公開までの最短時間")
+    poll_interval: float = Field(default=60.0, gt=0, description="デーモンがキューを確認する間隔（秒）")
+    max_attempts: int = Field(default=3, ge=1)
+    retry_minutes: int = Field(default=30, ge=1, description="投稿に失敗した場合の再試行までの時間")
+    lease_minutes: int = Field(
+        default=10, ge=1, description="実行中のジョブがこの時間（分）更新されなければ、止まったものとして公開待ちに戻す"
+    )
+
+    @field_validator("weekdays")
+    @classmethod
+    def check_weekdays(cls, value: list[str]) -> list[str]:
+        value = [day.lower()[:3] for day in value]
+        unknown = set(value) - set(WEEKDAYS)
+        if unknown or not value:
+            raise ValueError(f"weekdaysは{', '.join(WEEKDAYS)}から指定してください: {sorted(unknown)}")
+        return value
+
+    @field_validator("slots")
+    @classmethod
+    def check_slots(cls, value: list[time]) -> list[time]:
+        if not value:
+            raise ValueError("slotsを1つ以上指定してください")
+        return sorted(set(value))
+
+    @property
+    def tz(self) -> ZoneInfo:
+        return ZoneInfo(self.timezone)
+
+
+class Job(BaseModel):
+    id: int
+    kind: Literal["post", "summarize"]
+    slot: datetime
+    status: Literal["pending", "running", "done", "failed"]
+    payload: dict
+    attempts: int = 0
+    last_error: str | None = None
+
+
+def _iso(value: datetime) -> str:
+    """文字列のまま大小比較できるよう、UTCで保存する"""
+    return value.astimezone(UTC).isoformat()
+
+
+def next_slot(config: ScheduleConfig, now: datetime, taken: set[datetime]) -> datetime:
+    """now + min_lead_minutes以降で、まだ使われていない最初の枠"""
+    tz = config.tz
+    earliest = now.astimezone(tz) + timedelta(minutes=config.min_lead_minutes)
+    weekdays = {WEEKDAYS.index(day) for day in config.weekdays}
+    day: date = earliest.date()
+    for _ in range(366 * 2):
+        if day.weekday() in weekdays:
+            for slot_time in config.slots:
+                candidate = datetime.combine(day, slot_time, tzinfo=tz)
+                if candidate >= earliest and candidate not in taken:
+                    return candidate
+        day += timedelta(days=1)
+    raise RuntimeError("2年以内に空いている公開枠がありません")
+
+
+class PublishQueue:
+    """公開待ちの記事（と、予算超過で見送った要約）を保存するSQLiteのキュー
+
+    枠の割り当てはBEGIN IMMEDIATEで直列化するため、複数のプロセスが同時に追加しても同じ枠にはならない。
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _to_job(row: tuple) -> Job:
+        job_id, kind, slot, status, payload, attempts, last_error = row
+        return Job(
+            id=job_id,
+            kind=kind,
+            slot=datetime.fromisoformat(slot),
+            status=status,
+            payload=json.loads(payload),
+            attempts=attempts,
+            last_error=last_error,
+        )
+
+    _COLUMNS = "id, kind, slot, status, payload, attempts, last_error"
+
+    def enqueue(
+        self, kind: Literal["post", "summarize"], payload: dict, config: ScheduleConfig, now: datetime | None = None
+    ) -> Job:
+        """次の空き枠を割り当てて追加"""
+        now = now or datetime.now(config.tz)
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            rows = self.conn.execute(
+                "SELECT slot FROM jobs WHERE kind = 'post' AND status != 'failed' AND slot >= ?",
+                (_iso(now),),
+            ).fetchall()
+            taken = {datetime.fromisoformat(slot) for (slot,) in rows}
+            slot = next_slot(config, now, taken)
+            cursor = self.conn.execute(
+                "INSERT INTO jobs (kind, slot, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, _iso(slot), json.dumps(payload, ensure_ascii=False), _iso(now), _iso(now)),
+            )
+        return Job(id=cursor.lastrowid, kind=kind, slot=slot, status="pending", payload=payload)
+
+    def submit(self, kind: Literal["post", "summarize"], payload: dict, now: datetime) -> Job:
+        """公開枠を待たずにすぐ実行するジョブとして追加"""
+        cursor = self.conn.execute(
+            "INSERT INTO jobs (kind, slot, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (kind, _iso(now), json.dumps(payload, ensure_ascii=False), _iso(now), _iso(now)),
+        )
+        return Job(id=cursor.lastrowid, kind=kind, slot=now, status="pending", payload=payload)
+
+    def get(self, job_id: int) -> Job | None:
+        row = self.conn.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def claim_due(self, now: datetime) -> Job | None:
+        """公開時刻を過ぎた最も古いジョブを実行中にして返す"""
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE status = 'pending' AND slot <= ? ORDER BY slot, id LIMIT 1",
+                (_iso(now),),
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (_iso(now), row[0]),
+            )
+        job = self._to_job(row)
+        return job.model_copy(update={"status": "running", "attempts": job.attempts + 1})
+
+    def complete(self, job_id: int, now: datetime | None = None) -> None:
+        self.conn.execute(
+            "UPDATE jobs SET status = 'done', last_error = NULL, updated_at = ? WHERE id = ?",
+            (_iso(now or datetime.now(UTC)), job_id),
+        )
+
+    def fail(self, job: Job, error: str, config: ScheduleConfig, now: datetime) -> bool:
+        """失敗を記録。再試行する場合はTrue（retry_minutes後に再度公開待ちにする）"""
+        retry = job.attempts < config.max_attempts
+        retry_at = now + timedelta(minutes=config.retry_minutes)
+        self.conn.execute(
+            "UPDATE jobs SET status = ?, slot = ?, last_error = ?, updated_at = ? WHERE id = ?",
+            (
+                "pending" if retry else "failed",
+                _iso(retry_at if retry else job.slot),
+                error[:1000],
+                _iso(now),
+                job.id,
+            ),
+        )
+        return retry
+
+    def heartbeat(self, job_id: int, now: datetime) -> None:
+        """実行中のジョブがまだ動いていることを記録（recoverで戻されないようにする）"""
+        self.conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running'", (_iso(now), job_id))
+
+    def recover(self, now: datetime, lease: timedelta) -> int:
+        """lease以上更新されていない実行中のジョブ（デーモンが実行中に止まったもの）を公開待ちに戻す
+
+        他のプロセスのデーモンが実行中のジョブはheartbeatで更新され続けるため戻さない。
+        """
+        cursor = self.conn.execute(
+            "UPDATE jobs SET status = 'pending', updated_at = ? WHERE status = 'running' AND updated_at < ?",
+            (_iso(now), _iso(now - lease)),
+        )
+        return cursor.rowcount
+
+    def next_due(self) -> datetime | None:
+        row = self.conn.execute("SELECT MIN(slot) FROM jobs WHERE status = 'pending'").fetchone()
+        return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+    def jobs(self, statuses: tuple[str, ...] = ("pending", "running", "failed")) -> list[Job]:
+        placeholders = ",".join("?" for _ in statuses)
+        rows = self.conn.execute(
+            f"SELECT {self._COLUMNS} FROM jobs WHERE status IN ({placeholders}) ORDER BY slot, id", statuses
+        ).fetchall()
+        return [self._to_job(row) for row in rows]
+
+
+@contextmanager
+def keep_alive(path: Path, job_id: int, interval: float) -> Iterator[None]:
+    """この中にいる間、別スレッドからinterval秒ごとにジョブのheartbeatを記録する
+
+    SQLiteの接続はスレッドをまたいで使えないため、スレッド側で別に開く。
+    """
+    stop = threading.Event()
+
+    def _beat() -> None:
+        with PublishQueue(path) as queue:
+            while not stop.wait(interval):
+                try:
+                    queue.heartbeat(job_id, datetime.now(UTC))
+                except sqlite3.Error as e:
+                    logger.warning(f"ジョブ{job_id}の実行中の記録に失敗しました: {e}")
+
+    thread = threading.Thread(target=_beat, name=f"heartbeat-{job_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def print_queue(config: ScheduleConfig) -> None:
+    """公開待ち・失敗したジョブを表示"""
+    with PublishQueue(Path(config.queue_path)) as queue:
+        jobs = queue.jobs()
+    if not jobs:
+        print("公開待ちのジョブはありません。")
+    for job in jobs:
+        if job.kind == "post":
+            label = job.payload["post"]["title"]
+        else:
+            label = "要約: " + ", ".join(Path(path).name for path in job.payload["inputs"])
+        slot = job.slot.astimezone(config.tz)
+        print(f"{job.id:>5}  {slot:%Y-%m-%d %H:%M}  {job.status:<8}{job.attempts}回  {label}")
+        if job.last_error:
+            print(f"       {job.last_error.splitlines()[0]}")
+
+
+def schedule_post(config: ScheduleConfig, payload: dict) -> Job:
+    """記事を次の公開枠に予約（公開は--daemonが行う）"""
+    with PublishQueue(Path(config.queue_path)) as queue:
+        job = queue.enqueue("post", payload, config)
+    logger.warning(f"{job.slot:%Y-%m-%d %H:%M}の公開枠に予約しました（ジョブ{job.id}）。")
+    return job
+
+
+def defer_summary(config: ScheduleConfig, inputs: list[Path], compare: bool) -> Job:
+    """予算超過で見送った要約を、次の公開枠でやり直すよう予約"""
+    with PublishQueue(Path(config.queue_path)) as queue:
+        job = queue.enqueue(
+            "summarize", {"inputs": [str(path.resolve()) for path in inputs], "compare": compare}, config
+        )
+    logger.warning(f"{job.slot:%Y-%m-%d %H:%M}に要約をやり直します（ジョブ{job.id}）。")
+    return job
+
+
+def run_queue(
+    queue_path: Path,
+    refresh: Callable[[], ScheduleConfig],
+    execute: Callable[[Job, Callable[[], None]], None],
+    stop: threading.Event,
+    wake: threading.Event | None = None,
+    once: bool = False,
+    on_finished: Callable[[int], None] | None = None,
+) -> None:
+    """予約されたジョブを公開枠の時刻にexecuteで実行する。onceなら公開時刻を過ぎたものだけ実行して終わる
+
+    refreshはジョブを始める前とキューを確認するたびに呼び、その時点の設定を返す（設定の再読み込み用）。
+    executeには投稿が済んだ時点で呼ぶon_postedを渡す。失敗した場合は例外を送出する。
+    wakeがセットされると、poll_intervalを待たずにキューを確認する（APIからジョブが追加された場合など）。
+    on_finishedは、ジョブが終わった（完了した・再試行しない）ときにジョブIDを渡して呼ぶ。
+    """
+    wake = wake or stop
+
+    def recover(config: ScheduleConfig) -> None:
+        # heartbeatが途絶えたジョブだけを戻す（他のプロセスが実行中のジョブは戻さない）
+        recovered = queue.recover(datetime.now(config.tz), timedelta(minutes=config.lease_minutes))
+        if recovered:
+            logger.warning(f"実行中に止まったジョブを{recovered}件、公開待ちに戻しました。")
+
+    with PublishQueue(queue_path) as queue:
+        config = refresh()
+        recover(config)
+        logger.warning(f"予約投稿のキューを確認します: {queue_path}")
+        while not stop.is_set():
+            while not stop.is_set() and (job := queue.claim_due(datetime.now(config.tz))):
+                logger.warning(f"ジョブ{job.id}（{job.kind}）を実行します。")
+                config = refresh()
+                finished = True
+                # 投稿が済んだらすぐ完了にし、その後の記録の書き出しで失敗しても投稿をやり直さない
+                on_posted = partial(queue.complete, job.id)
+                try:
+                    with keep_alive(queue_path, job.id, config.lease_minutes * 60 / 3):
+                        execute(job, on_posted)
+                except Exception as e:
+                    if (current := queue.get(job.id)) is not None and current.status == "done":
+                        logger.error(f"ジョブ{job.id}は投稿済みのため再試行しません。記録の書き出しに失敗しました: {e}")
+                    else:
+                        retry = queue.fail(job, repr(e), config, datetime.now(config.tz))
+                        finished = not retry
+                        logger.error(f"ジョブ{job.id}に失敗しました{'。後で再試行します' if retry else ''}: {e}")
+                    logger.info("詳細: ", exc_info=True)
+                else:
+                    queue.complete(job.id, datetime.now(config.tz))
+                finally:
+                    if finished and on_finished is not None:
+                        on_finished(job.id)
+            if once:
+                break
+            next_due = queue.next_due()
+            wait = config.poll_interval
+            if next_due is not None:
+                wait = min(wait, max((next_due - datetime.now(config.tz)).total_seconds(), 0))
+            wake.wait(wait)
+            if wake is not stop:
+                wake.clear()
+            config = refresh()
+            recover(config)
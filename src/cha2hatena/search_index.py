@@ -0,0 +1,308 @@
+import csv
+import logging
+import math
+import re
+import sqlite3
+import unicodedata
+from collections import Counter
+from collections.abc import Callable
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from .llm.openai_compatible_client import DEFAULT_BASE_URL
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    url TEXT,
+    created_at TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    vector_row INTEGER
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT PRIMARY KEY,
+    doc_ids BLOB NOT NULL,
+    tfs BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_WORD = re.compile(r"[a-z0-9_]+|[^\sa-z0-9_\W]+")
+_ASCII = re.compile(r"[a-z0-9_]+")
+
+Embedder = Callable[[list[str]], list[list[float]]]
+
+
+class EmbeddingConfig(BaseModel):
+    enable: bool = False
+    model: str = Field(default="nomic-embed-text", description="OpenAI互換サーバーの埋め込みモデル")
+    base_url: str | None = Field(default=None, description="空欄ならai.local.base_url")
+    max_chars: int = Field(default=4000, ge=1, description="埋め込みに使う本文の先頭の文字数")
+
+
+class SearchConfig(BaseModel):
+    enable: bool = False
+    index_dir: str = "outputs/search"
+    related_links: int = Field(default=3, ge=0, description="新しい記事の末尾に載せる関連記事の数（0で無効）")
+    k1: float = 1.2
+    b: float = 0.75
+    embedding: EmbeddingConfig = Field(default_factory=EmbeddingConfig)
+
+
+class SearchHit(BaseModel):
+    key: str
+    title: str
+    url: str | None
+    score: float
+
+
+def tokenize(text: str) -> list[str]:
+    """英数字は単語、日本語など分かち書きしない文字列は文字bigramに分ける"""
+    tokens: list[str] = []
+    for word in _WORD.findall(unicodedata.normalize("NFKC", text).casefold()):
+        if _ASCII.fullmatch(word) or len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i : i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def openai_embedder(config: EmbeddingConfig, base_url: str) -> Embedder:
+    """OpenAI互換サーバー（Ollama等）の/embeddingsを使う"""
+
+    def embed(texts: list[str]) -> list[list[float]]:
+        from openai import OpenAI
+
+        client = OpenAI(api_key="local", base_url=config.base_url or base_url)
+        response = client.embeddings.create(model=config.model, input=[text[: config.max_chars] for text in texts])
+        return [item.embedding for item in response.data]
+
+    return embed
+
+
+class SearchIndex:
+    """生成した記事の検索インデックス
+
+    BM25用の転置インデックス（SQLite）と、埋め込みを使う場合はfloat32のベクトルを追記していくファイル（vectors.f32）。
+    転置リストは語ごとに1行で、doc_idと出現回数をint32の配列としてBLOBに詰める。検索は語ごとに1行読んでNumPyで計算する。
+    ベクトルはnp.memmapで読むため、記事が増えても全件をメモリに載せずに済む。
+    BM25と埋め込みの両方がある場合は順位を融合（Reciprocal Rank Fusion）する。
+    """
+
+    RRF_K = 60
+
+    def __init__(self, index_dir: Path, config: SearchConfig | None = None, embedder: Embedder | None = None):
+        index_dir.mkdir(parents=True, exist_ok=True)
+        self.config = config or SearchConfig()
+        self.embedder = embedder
+        self.vector_path = index_dir / "vectors.f32"
+        self.conn = sqlite3.connect(index_dir / "index.sqlite3", timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        self._length_cache: tuple[int, np.ndarray] | None = None
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, key: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM docs WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    @property
+    def dim(self) -> int | None:
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        return int(row[0]) if row else None
+
+    def add(self, key: str, title: str, text: str, url: str | None = None, created_at: datetime | None = None) -> bool:
+        """1記事を追加。追加済みのkeyならFalse"""
+        if key in self:
+            return False
+        terms = Counter(tokenize(f"{title}\n{title}\n{text}"))  # タイトルの語は重めに
+        vector = self._embed(f"{title}\n{text}")
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            vector_row = self._append_vector(vector) if vector is not None else None
+            cursor = self.conn.execute(
+                "INSERT INTO docs (key, title, url, created_at, length, vector_row) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, title, url, (created_at or datetime.now()).isoformat(), sum(terms.values()), vector_row),
+            )
+            doc_id = np.array([cursor.lastrowid], dtype=np.int32).tobytes()
+            existing = self._postings(list(terms))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO postings (term, doc_ids, tfs) VALUES (?, ?, ?)",
+                [
+                    (
+                        term,
+                        existing.get(term, (b"", b""))[0] + doc_id,
+                        existing.get(term, (b"", b""))[1] + np.array([tf], dtype=np.int32).tobytes(),
+                    )
+                    for term, tf in terms.items()
+                ],
+            )
+        return True
+
+    def _postings(self, terms: list[str]) -> dict[str, tuple[bytes, bytes]]:
+        result: dict[str, tuple[bytes, bytes]] = {}
+        for start in range(0, len(terms), 500):
+            chunk = terms[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(f"SELECT term, doc_ids, tfs FROM postings WHERE term IN ({placeholders})", chunk)
+            result.update((term, (doc_ids, tfs)) for term, doc_ids, tfs in rows)
+        return result
+
+    def backfill(self, summary_dir: Path, csv_path: Path | None = None) -> int:
+        """outputs/summaryの要約ファイルのうち、未登録のものを追加。URLはrecord.csvからタイトルで引く"""
+        urls: dict[str, str] = {}
+        if csv_path is not None and csv_path.exists():
+            with csv_path.open(newline="", encoding="utf-8-sig") as f:
+                urls = {row["entry_title"]: row["entry_URL"] for row in csv.DictReader(f) if row.get("entry_title")}
+        added = 0
+        for path in sorted(summary_dir.glob("*.txt")):
+            if path.name in self:
+                continue
+            title = path.stem.split("-", 1)[-1]
+            created_at = datetime.fromtimestamp(path.stat().st_mtime)
+            text = path.read_text(encoding="utf-8")
+            added += self.add(path.name, title, text, urls.get(title), created_at)
+        return added
+
+    def _embed(self, text: str) -> np.ndarray | None:
+        if self.embedder is None:
+            return None
+        try:
+            vector = np.asarray(self.embedder([text])[0], dtype=np.float32)
+        except Exception as e:
+            logger.warning("埋め込みを取得できなかったため、BM25のみで検索します。")
+            logger.info(f"詳細: {e!r}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _append_vector(self, vector: np.ndarray) -> int | None:
+        dim = self.dim
+        if dim is None:
+            self.conn.execute("INSERT INTO meta (name, value) VALUES ('dim', ?)", (str(len(vector)),))
+            dim = len(vector)
+        elif dim != len(vector):
+            logger.warning(f"埋め込みの次元が異なるため保存しません（{dim}→{len(vector)}）。")
+            return None
+        with self.vector_path.open("ab") as f:
+            row = f.tell() // (dim * 4)
+            f.write(vector.tobytes())
+        return row
+
+    def _lengths(self) -> np.ndarray:
+        """doc_idごとの語数。記事が追加されていなければ前回の配列を使う"""
+        n_docs, max_id = self.conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM docs").fetchone()
+        if self._length_cache is None or self._length_cache[0] != n_docs:
+            lengths = np.zeros(max_id + 1, dtype=np.float64)
+            rows = np.array(self.conn.execute("SELECT id, length FROM docs").fetchall(), dtype=np.int64).reshape(-1, 2)
+            lengths[rows[:, 0]] = rows[:, 1]
+            self._length_cache = (n_docs, lengths)
+        return self._length_cache[1]
+
+    def _bm25(self, query: str) -> dict[int, float]:
+        lengths = self._lengths()
+        n_docs = self._length_cache[0]
+        if n_docs == 0:
+            return {}
+        k1, b = self.config.k1, self.config.b
+        length_norm = k1 * (1 - b + b * lengths / (lengths.sum() / n_docs))
+        scores = np.zeros(len(lengths), dtype=np.float64)
+        query_terms = Counter(tokenize(query))
+        for term, (doc_id_bytes, tf_bytes) in self._postings(list(query_terms)).items():
+            doc_ids = np.frombuffer(doc_id_bytes, dtype=np.int32)
+            tfs = np.frombuffer(tf_bytes, dtype=np.int32)
+            query_tf = query_terms[term]
+            idf = math.log(1 + (n_docs - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            scores[doc_ids] += query_tf * idf * tfs * (k1 + 1) / (tfs + length_norm[doc_ids])
+        matched = np.flatnonzero(scores)
+        return dict(zip(matched.tolist(), scores[matched].tolist()))
+
+    def _vector_scores(self, query: str) -> dict[int, float]:
+        dim = self.dim
+        if self.embedder is None or dim is None or not self.vector_path.exists():
+            return {}
+        vector = self._embed(query)
+        if vector is None or len(vector) != dim:
+            return {}
+        matrix = np.memmap(self.vector_path, dtype=np.float32, mode="r").reshape(-1, dim)
+        similarities = matrix @ vector
+        rows = self.conn.execute("SELECT id, vector_row FROM docs WHERE vector_row IS NOT NULL").fetchall()
+        return {doc_id: float(similarities[row]) for doc_id, row in rows if row < len(similarities)}
+
+    def search(self, query: str, limit: int = 5, exclude: set[str] | None = None) -> list[SearchHit]:
+        rankings = [scores for scores in (self._bm25(query), self._vector_scores(query)) if scores]
+        if not rankings:
+            return []
+        if len(rankings) == 1:
+            fused = rankings[0]
+        else:
+            fused = {}
+            for scores in rankings:
+                for rank, doc_id in enumerate(sorted(scores, key=scores.get, reverse=True)):
+                    fused[doc_id] = fused.get(doc_id, 0.0) + 1 / (self.RRF_K + rank + 1)
+
+        hits: list[SearchHit] = []
+        for doc_id in sorted(fused, key=fused.get, reverse=True):
+            key, title, url = self.conn.execute("SELECT key, title, url FROM docs WHERE id = ?", (doc_id,)).fetchone()
+            if exclude and key in exclude:
+                continue
+            hits.append(SearchHit(key=key, title=title, url=url, score=fused[doc_id]))
+            if len(hits) >= limit:
+                break
+        return hits
+
+
+def related_links(hits: list[SearchHit]) -> str:
+    """関連記事の節（URLのある記事のみ）"""
+    lines = [f"- [{hit.title}]({hit.url})" for hit in hits if hit.url]
+    if not lines:
+        return ""
+    return "\n\n## 関連記事\n\n" + "\n".join(lines) + "\n"
+
+
+def open_search_index(
+    config: SearchConfig, output_dir: Path, base_url: str | None = None, backfill: bool = False
+) -> SearchIndex:
+    """検索インデックスを開く。backfillなら未登録の要約ファイルを追加。base_urlはai.local.base_url
+
+    backfillはrecord.csvとすべての要約ファイルを読むため、要約の前（実行時間に直接効く箇所）では行わず、
+    --searchと投稿の後にだけ行う。
+    """
+    embedder = None
+    if config.embedding.enable:
+        embedder = openai_embedder(config.embedding, base_url or DEFAULT_BASE_URL)
+    index = SearchIndex(Path(config.index_dir), config, embedder)
+    if backfill and (output_dir / "summary").is_dir():
+        added = index.backfill(output_dir / "summary", output_dir / "record.csv")
+        if added:
+            logger.warning(f"検索インデックスに過去の記事を{added}件追加しました。")
+    return index
+
+
+def print_search_results(config: SearchConfig, output_dir: Path, base_url: str | None, query: str) -> None:
+    with open_search_index(config, output_dir, base_url, backfill=True) as index:
+        hits = index.search(query, limit=10)
+    if not hits:
+        print("該当する記事はありません。")
+    for hit in hits:
+        print(f"{hit.score:8.3f}  {hit.title}  {hit.url or hit.key}")
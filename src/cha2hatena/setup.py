@@ -1,19 +1,35 @@
 import logging
 import os
 import sys
-from functools import lru_cache
-from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
 import yaml
 from dotenv import load_dotenv
+from pydantic import BaseModel, Field, field_validator
 
 from .llm.conversational_ai import LlmConfig
+from .log_pipeline import LogConfig, LogPipeline, file_handler
 
 logger = logging.getLogger(__name__)
 load_dotenv(override=True)
 
 
+class PathsConfig(BaseModel):
+    input_dir: str = "sample"
+    output_dir: Path = Field(default=Path("outputs"), description="record.csvと要約ファイルの保存先")
+
+    @field_validator("output_dir", mode="before")
+    @classmethod
+    def strip_output_dir(cls, value):
+        return value.strip() if isinstance(value, str) else value
+
+
+class OtherConfig(BaseModel):
+    usdjpy_rate: float | None = Field(
+        default=None, gt=0, description="固定の為替レート。Noneならヤフーファイナンスから取得"
+    )
+
+
 def config_validation(config_dict: dict, secret_keys: dict) -> tuple[dict, dict]:
     """設定ファイルとAPIキーの妥当性を検証"""
 
@@ -43,9 +59,8 @@ def config_validation(config_dict: dict, secret_keys: dict) -> tuple[dict, dict]
     return config_dict, secret_keys
 
 
-@lru_cache
-def get_yaml_config():
-    config_path = Path("config.yaml")
+def get_yaml_config(config_path: Path = Path("config.yaml")) -> dict:
+    """config.yamlを読み込む（キャッシュしない。再読み込みはConfigServiceで行う）"""
     # 設定ファイルの読み込みとエラーハンドリング
     try:
         if not config_path.exists():
@@ -58,19 +73,29 @@ def get_yaml_config():
     return config
 
 
-def config_setup() -> tuple[dict, dict]:
-    """設定の初期化と検証"""
-    config = get_yaml_config()
+def get_api_key(model: str) -> str | None:
+    """モデル名に対応するAPIキーを環境変数から取得。未対応のモデル名ならNone"""
+    if model.startswith("deepseek"):
+        return os.getenv("DEEPSEEK_API_KEY", "")
+    elif model.startswith("gemini"):
+        return os.getenv("GEMINI_API_KEY", "")
+    elif model.startswith("local:"):
+        # ローカルサーバーは多くの場合キー不要だが、OpenAIクライアントは空文字を受け付けない
+        return os.getenv("LOCAL_LLM_API_KEY", "") or "no-key"
+    return None
+
+
+def config_setup(config: dict | None = None) -> tuple[dict, dict]:
+    """設定の初期化と検証。configを省略した場合はconfig.yamlを読み込む"""
+    if config is None:
+        config = get_yaml_config()
 
     try:
         model = config["ai"]["model"]
     except KeyError:
         raise ValueError("ai.modelが設定されていません。config.yamlで設定してください。")
-    if model.startswith("deepseek"):
-        api_key = os.getenv("DEEPSEEK_API_KEY", "")
-    elif model.startswith("gemini"):
-        api_key = os.getenv("GEMINI_API_KEY", "")
-    else:
+    api_key = get_api_key(model)
+    if api_key is None:
         logging.critical("モデル名が正しくありません。実行を中止します。")
         logging.critical(f"モデル名：{model}")
 
@@ -92,24 +117,23 @@ def config_setup() -> tuple[dict, dict]:
     return config, secret_keys
 
 
-def log_setup(logger: logging.Logger, initial_level: int, console_format: str) -> tuple:
-    """ハンドラー設定"""
+def log_setup(
+    logger: logging.Logger, initial_level: int, console_format: str, log_config: LogConfig | None = None
+) -> tuple[logging.Handler, LogPipeline]:
+    """ハンドラー設定（書き込みはLogPipelineのスレッドで行う）"""
 
+    log_config = log_config or LogConfig()
     stream_handler = logging.StreamHandler(sys.stdout)
     stream_handler.setFormatter(logging.Formatter(console_format))
     stream_handler.setLevel(initial_level)
-    file_handler = RotatingFileHandler("app.log", maxBytes=int(0.5 * 1024 * 1024), backupCount=1, encoding="utf-8")
-    file_handler.setFormatter(
-        logging.Formatter(
-            "%(levelname)s | %(asctime)s | %(module)s | %(lineno)s | %(funcName)s | %(taskName)s | %(name)s | %(message)s"
-        )
-    )
-    file_handler.setLevel(logging.DEBUG)
+    handlers: list[logging.Handler] = [stream_handler]
+    if log_config.path:
+        handlers.append(file_handler(log_config))
+    pipeline = LogPipeline(handlers)
     logger.setLevel(logging.DEBUG)
-    logger.addHandler(file_handler)
-    logger.addHandler(stream_handler)
+    logger.addHandler(pipeline.handler)
 
-    return stream_handler, file_handler
+    return stream_handler, pipeline
 
 
 def initialization(logger: logging.Logger) -> tuple:
@@ -125,23 +149,20 @@ def initialization(logger: logging.Logger) -> tuple:
         console_format = "%(message)s"
         initial_level = logging.WARNING
 
-    # ハンドラー設定
-    stream_handler, file_handler = log_setup(logger, initial_level, console_format)
+    # ハンドラー設定（config.yamlが読めない場合は既定の設定で記録し、config_setupでエラーにする）
+    try:
+        config = get_yaml_config()
+    except Exception:
+        config = None
+    log_config = LogConfig.model_validate(((config or {}).get("logging")) or {})
+    stream_handler, _ = log_setup(logger, initial_level, console_format, log_config)
 
     # 設定読み込み
-    config, secret_keys = config_setup()
-
-    llm_config = LlmConfig(
-        prompt=config["ai"]["prompt"],
-        model=config["ai"]["model"],
-        temperature=config["ai"]["temperature"],
-        api_key=secret_keys.get("API_KEY"),
-        conversation="",
-    )
+    config, secret_keys = config_setup(config)
+    llm_config = build_llm_config(config, secret_keys)
 
     # DEBUGモード・ログレベル判定
-    DEBUG_CONFIG = (config.get("other") or {}).get("debug", "").lower() in ("true", "1", "t")
-    DEBUG = DEBUG_ENV if DEBUG_ENV else DEBUG_CONFIG
+    DEBUG = get_DEBUG(config)
     if DEBUG and not DEBUG_ENV:
         stream_handler.setLevel(logging.DEBUG)
         stream_handler.setFormatter(logging.Formatter("%(levelname)s - %(name)s - %(message)s"))
@@ -149,13 +170,26 @@ def initialization(logger: logging.Logger) -> tuple:
     return DEBUG, secret_keys, llm_config, config
 
 
+def build_llm_config(config: dict, secret_keys: dict) -> LlmConfig:
+    return LlmConfig(
+        prompt=config["ai"]["prompt"],
+        model=config["ai"]["model"],
+        temperature=config["ai"]["temperature"],
+        api_key=secret_keys.get("API_KEY"),
+        conversation="",
+        context_cache=config["ai"].get("context_cache", False),
+        base_url=(config["ai"].get("local") or {}).get("base_url"),
+        max_concurrency=(config["ai"].get("local") or {}).get("max_concurrency", 1),
+        repair_model=config["ai"].get("repair_model") or None,
+    )
+
+
 # ユーティリティ関数
-def get_DEBUG(config=get_yaml_config()):
-    """DEBUGモード取得用関数"""
-    debug = (config.get("other") or {}).get("debug", "").lower() in ("true", "1", "t")
+def get_DEBUG(config: dict | None = None) -> bool:
+    """DEBUGモード取得用関数。configを省略した場合はその時点のconfig.yamlを読み込む"""
+    if config is None:
+        config = get_yaml_config()
+    debug = str((config.get("other") or {}).get("debug", "")).lower() in ("true", "1", "t")
     debug_env = os.getenv("DEBUG", "False").lower() in ("true", "t", "1")
     debug = debug_env if debug_env else debug
     return debug
-
-
-DEBUG = get_DEBUG()
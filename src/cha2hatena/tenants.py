@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from collections.abc import Awaitable, Callable
+from functools import partial
+
+import httpx
+from pydantic import BaseModel, Field, field_validator
+
+from .blog.blog_schema import (
+    AbstractBlogPoster,
+    BaseBlogResponse,
+    BlogClientSchema,
+    HatenaResponseSchema,
+    HatenaSecretKeys,
+)
+from .blog.devto_poster import DevToPoster
+from .blog.hatenablog_poster import HatenaBlogPoster
+from .blog.markdown_renderer import DevToRenderer, HatenaRenderer, MarkdownRenderer, QiitaRenderer, parse_markdown
+from .blog.qiita_poster import QiitaPoster
+from .metrics import BLOG_POST_SECONDS, BLOG_POSTS, QUEUE_DEPTH
+from .tracing import span
+from .types import BlogServices, TypeBlogResult
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_TENANT = "default"  # .envのHATENA_*等で設定する既定のアカウント
+
+
+class RateLimits(BaseModel):
+    max_concurrency: int = Field(default=2, ge=1, description="このアカウントで同時に行う投稿数")
+    min_interval: float = Field(default=0.0, ge=0, description="このアカウントへの投稿を始める最短間隔（秒）")
+    timeout: float = Field(default=120.0, gt=0, description="1件の投稿のタイムアウト（秒）")
+
+
+class TenantConfig(RateLimits):
+    name: str
+    env_prefix: str = Field(description="秘密情報の環境変数の接頭辞。SUBならSUB_HATENA_CONSUMER_KEY等")
+    qiita: bool = False
+    devto: bool = False
+    preset_category: list[str] | None = Field(default=None, description="Noneならblog.preset_category")
+
+
+class TenantsConfig(BaseModel):
+    max_concurrency: int = Field(default=4, ge=1, description="全アカウント合計の同時投稿数")
+    default: RateLimits = Field(default_factory=RateLimits, description="既定のアカウントの制限")
+    accounts: list[TenantConfig] = Field(default_factory=list)
+
+    @field_validator("accounts")
+    @classmethod
+    def check_names(cls, value: list[TenantConfig]) -> list[TenantConfig]:
+        names = [tenant.name for tenant in value]
+        if DEFAULT_TENANT in names or len(set(names)) != len(names):
+            raise ValueError(f"accountsのnameは重複せず、{DEFAULT_TENANT}以外にしてください: {names}")
+        return value
+
+    def limits(self, name: str) -> RateLimits:
+        if name == DEFAULT_TENANT:
+            return self.default
+        return next(tenant for tenant in self.accounts if tenant.name == name)
+
+
+def tenant_secret_keys(tenant: TenantConfig) -> dict:
+    """アカウントごとの秘密情報（config_setupのsecret_keysと同じ形）"""
+    prefix = tenant.env_prefix.rstrip("_") + "_"
+
+    def env(name: str) -> str:
+        return os.getenv(prefix + name, "")
+
+    return {
+        "hatena_client_key": env("HATENA_CONSUMER_KEY"),
+        "hatena_client_secret": env("HATENA_CONSUMER_SECRET"),
+        "hatena_resource_owner_key": env("HATENA_ACCESS_TOKEN"),
+        "hatena_resource_owner_secret": env("HATENA_ACCESS_TOKEN_SECRET"),
+        "hatena_entry_url": env("HATENA_ENTRY_URL"),
+        "qiita_bearer_token": (env("QIITA_BEARER_TOKEN") or None) if tenant.qiita else None,
+        "devto_api_key": (env("DEVTO_API_KEY") or None) if tenant.devto else None,
+    }
+
+
+def tenant_schemas(schema: BlogClientSchema, config: TenantsConfig) -> dict[str, BlogClientSchema]:
+    """既定のアカウント向けの投稿内容を、各アカウントの秘密情報・プリセットカテゴリーに差し替えたもの"""
+    schemas = {DEFAULT_TENANT: schema}
+    for tenant in config.accounts:
+        secrets = tenant_secret_keys(tenant)
+        if not secrets["hatena_entry_url"]:
+            logger.warning(f"{tenant.env_prefix}_HATENA_ENTRY_URLが見つからないため、{tenant.name}には投稿しません。")
+            continue
+        schemas[tenant.name] = schema.model_copy(
+            update={
+                "hatena_secret_keys": HatenaSecretKeys.model_validate(secrets),
+                "qiita_bearer_token": secrets["qiita_bearer_token"],
+                "devto_api_key": secrets["devto_api_key"],
+                "preset_categories": (
+                    tenant.preset_category if tenant.preset_category is not None else schema.preset_categories
+                ),
+            }
+        )
+    return schemas
+
+
+class Pacer:
+    """投稿を始める間隔をmin_interval秒以上空ける"""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = asyncio.Lock()
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        if self.min_interval <= 0:
+            return
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next = loop.time() + self.min_interval
+
+
+async def fan_out[T](
+    jobs: dict[str, list[Callable[[], Awaitable[T]]]], config: TenantsConfig
+) -> dict[str, list[T | BaseException]]:
+    """アカウントごとのキューから、全体の同時実行数を公平に分け合って実行
+
+    各アカウントのワーカーは自分のmax_concurrency個だけで、全体の枠（FIFOのセマフォ）を1件ずつ取り合う。
+    遅いアカウントが使える枠は自分のmax_concurrency個までなので、他のアカウントの投稿が待たされ続けることはない。
+    失敗・タイムアウトは例外のまま結果に入れる。
+    """
+    slots = asyncio.Semaphore(config.max_concurrency)
+    completed: dict[str, dict[int, T | BaseException]] = {tenant: {} for tenant in jobs}
+
+    async def _worker(tenant: str, queue: deque, pacer: Pacer, limits: RateLimits) -> None:
+        while queue:
+            index, factory = queue.popleft()
+            await pacer.wait()
+            with QUEUE_DEPTH.track(queue="blog_post"):
+                await slots.acquire()
+            try:
+                completed[tenant][index] = await asyncio.wait_for(factory(), limits.timeout)
+            except Exception as e:
+                completed[tenant][index] = e
+            finally:
+                slots.release()
+
+    workers = []
+    for tenant, factories in jobs.items():
+        limits = config.limits(tenant)
+        queue = deque(enumerate(factories))
+        pacer = Pacer(limits.min_interval)
+        workers += [_worker(tenant, queue, pacer, limits) for _ in range(min(limits.max_concurrency, len(queue)))]
+    await asyncio.gather(*workers)
+    return {tenant: [completed[tenant][index] for index in range(len(factories))] for tenant, factories in jobs.items()}
+
+
+async def process_blogpost(
+    schemas: dict[str, BlogClientSchema], tenants_config: TenantsConfig
+) -> dict[str, TypeBlogResult]:
+    """各アカウントの複数のブログへ投稿 アカウントごとに投稿結果を辞書で返却"""
+    BLOG_CLIENTS: list[tuple[BlogServices, type[AbstractBlogPoster], MarkdownRenderer, str]] = [
+        (BlogServices.HATENA, HatenaBlogPoster, HatenaRenderer(), "hatena_secret_keys"),
+        (BlogServices.QIITA, QiitaPoster, QiitaRenderer(), "qiita_bearer_token"),
+        (BlogServices.DEVTO, DevToPoster, DevToRenderer(), "devto_api_key"),
+    ]
+
+    # 本文は1回だけ解析し、サービスごとの記法・タグの制限に合わせて書き出す（アカウント間で共有）
+    with span("render_markdown", tenants=len(schemas)):
+        document = parse_markdown(next(iter(schemas.values())).content)
+        rendered: dict[BlogServices, str] = {}
+        clients: dict[str, dict[BlogServices, AbstractBlogPoster]] = {}
+        for tenant, schema in schemas.items():
+            clients[tenant] = {}
+            for name, client_class, renderer, secret_field in BLOG_CLIENTS:
+                if not getattr(schema, secret_field):
+                    continue
+                if name not in rendered:
+                    rendered[name] = renderer.render(document)
+                clients[tenant][name] = client_class.model_validate(
+                    {
+                        **schema.model_dump(),
+                        "content": rendered[name],
+                        "categories": renderer.tags(schema.categories, schema.preset_categories),
+                        "preset_categories": [],
+                    }
+                )
+
+    async def _post(service: BlogServices, client: AbstractBlogPoster, httpx_client: httpx.AsyncClient):
+        labels = {"service": service.name.lower()}
+        with BLOG_POST_SECONDS.time(**labels):
+            try:
+                result = await client.blog_post(httpx_client)
+            except BaseException:
+                BLOG_POSTS.inc(**labels, result="error")
+                raise
+        BLOG_POSTS.inc(**labels, result="success")
+        return result
+
+    async with httpx.AsyncClient() as httpx_client:
+        jobs = {
+            tenant: [partial(_post, name, client, httpx_client) for name, client in services.items()]
+            for tenant, services in clients.items()
+        }
+        results = await fan_out(jobs, tenants_config)
+    return {
+        tenant: {
+            name: {"result": result, "success": not isinstance(result, BaseException)}
+            for name, result in zip(services.keys(), results[tenant])
+        }
+        for tenant, services in clients.items()
+    }
+
+
+def collect_results(
+    tenant: str, results: TypeBlogResult
+) -> tuple[dict[BlogServices, str], HatenaResponseSchema | None]:
+    """投稿結果からURLとはてなの結果を取り出す。失敗したものはログに出す"""
+    urls: dict[BlogServices, str] = {}
+    hatena_result = None
+    for service, report in results.items():
+        _result: BaseBlogResponse | BaseException = report["result"]
+        if isinstance(_result, BaseBlogResponse):
+            urls[service] = _result.url
+            if service is BlogServices.HATENA:
+                hatena_result = _result
+        else:
+            label = service.value if tenant == DEFAULT_TENANT else f"{tenant}の{service.value}"
+            logger.error(f"{label}の処理でエラー。投稿されませんでした。エラー内容:\n{_result!r}")
+    return urls, hatena_result
@@ -0,0 +1,210 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+_current_span: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("current_span", default=None)
+
+
+class TracingConfig(BaseModel):
+    enable: bool = Field(default=False, description="段階ごとの所要時間を記録（--profile指定時は常に記録）")
+    json_path: str | None = Field(default=None, description="OTLP/JSON形式のトレースファイル")
+    otlp_endpoint: str | None = Field(default=None, description="OTLP/HTTPコレクターのURL")
+
+
+class Span:
+    """1区間の計測結果。OTLPのspanと同じ項目を持つ"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.error: str | None = None
+
+    @property
+    def duration(self) -> float:
+        """秒"""
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Tracer:
+    """パイプラインの各段階の所要時間を記録する軽量トレーサー
+
+    親子関係はcontextvarsで引き継ぐため、asyncioのタスクやcontextvars.copy_contextで起動したスレッドでも正しくつながる。
+    出力はOTLP/JSON形式で、ファイル保存とOTLP/HTTPエンドポイントへの送信に対応。
+    """
+
+    def __init__(self, service_name: str = "cha2hatena"):
+        self.service_name = service_name
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        parent = _current_span.get()
+        trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        span = Span(name, trace_id, parent.span_id if parent else None, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            with self._lock:
+                self.spans.append(span)
+
+    @contextmanager
+    def new_trace(self):
+        """この中で開始する区間を、外側の区間の子ではなく新しいトレースのルートにする"""
+        token = _current_span.set(None)
+        try:
+            yield
+        finally:
+            _current_span.reset(token)
+
+    def record(self, name: str, start_ns: int, end_ns: int, **attributes) -> Span:
+        """計測済みの区間を後から登録（インポート時間など）"""
+        parent = _current_span.get()
+        span = Span(
+            name, parent.trace_id if parent else os.urandom(16).hex(), parent.span_id if parent else None, attributes
+        )
+        span.start_ns, span.end_ns = start_ns, end_ns
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def drain(self) -> list[Span]:
+        """記録済みの区間を取り出して消す。常駐時にジョブごとに出力し、メモリに溜め続けないため"""
+        with self._lock:
+            spans, self.spans = self.spans, []
+        return spans
+
+    def to_otlp(self, spans: list[Span] | None = None) -> dict:
+        if spans is None:
+            with self._lock:
+                spans = list(self.spans)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                    "scopeSpans": [
+                        {"scope": {"name": "cha2hatena.tracing"}, "spans": [span.to_otlp() for span in spans]}
+                    ],
+                }
+            ]
+        }
+
+    def export_json(self, path: Path, spans: list[Span] | None = None, append: bool = False) -> None:
+        """appendなら1回分を1行として追記する（JSON Lines。OpenTelemetry Collectorのfile exporterと同じ形式）"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if append:
+            with path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(self.to_otlp(spans), ensure_ascii=False) + "\n")
+            logger.debug(f"トレースを追記しました: {path}")
+            return
+        path.write_text(json.dumps(self.to_otlp(spans), ensure_ascii=False, indent=2), encoding="utf-8")
+        logger.warning(f"トレースを保存しました: {path}")
+
+    def export_otlp(self, endpoint: str, spans: list[Span] | None = None, timeout: float = 5.0) -> None:
+        """OTLP/HTTP(JSON)でコレクターへ送信"""
+        import httpx
+
+        url = endpoint.rstrip("/") + "/v1/traces"
+        try:
+            response = httpx.post(url, json=self.to_otlp(spans), timeout=timeout)
+            response.raise_for_status()
+            logger.debug(f"トレースを送信しました: {url}")
+        except httpx.HTTPError as e:
+            logger.warning(f"トレースを送信できませんでした: {url}")
+            logger.info(f"詳細: {e}")
+
+    def summary_table(self, spans: list[Span] | None = None) -> str:
+        """区間名ごとの回数・合計・平均・最大と、全体に占める割合の表"""
+        if spans is None:
+            with self._lock:
+                spans = list(self.spans)
+        if not spans:
+            return "計測結果がありません"
+
+        total = sum(span.duration for span in spans if span.parent_id is None)
+        rows: dict[str, list[float]] = {}
+        for span in spans:
+            rows.setdefault(span.name, []).append(span.duration)
+
+        lines = [f"{'区間':<28}{'回数':>6}{'合計(s)':>10}{'平均(s)':>10}{'最大(s)':>10}{'割合':>8}", "-" * 72]
+        for name, durations in sorted(rows.items(), key=lambda item: -sum(item[1])):
+            share = sum(durations) / total if total else 0.0
+            lines.append(
+                f"{name:<28}{len(durations):>6}{sum(durations):>10.3f}"
+                f"{sum(durations) / len(durations):>10.3f}{max(durations):>10.3f}{share:>8.1%}"
+            )
+        lines.append("-" * 72)
+        lines.append(f"{'合計（ルート区間）':<28}{'':>6}{total:>10.3f}")
+        return "\n".join(lines)
+
+
+tracer = Tracer()
+span = tracer.span
+
+
+def finish_tracing(config: TracingConfig, profile: bool, append: bool = False) -> None:
+    """記録済みのトレースを出力して消す。tracing.enableまたは--profile指定時のみ
+
+    常駐時（append）はジョブごとに呼ばれ、tracing.json_pathへ1ジョブ1行で追記する。
+    """
+    spans = tracer.drain()
+    if not spans or not (config.enable or profile):
+        return
+    try:
+        if config.json_path:
+            tracer.export_json(Path(config.json_path), spans, append=append)
+        if config.otlp_endpoint:
+            tracer.export_otlp(config.otlp_endpoint, spans)
+    except Exception as e:
+        logger.warning("トレースを出力できませんでした。")
+        logger.info(f"詳細: {e}")
+    if profile:
+        print(tracer.summary_table(spans))
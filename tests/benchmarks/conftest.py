@@ -0,0 +1,23 @@
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+BENCH_DIR = Path(__file__).parent
+
+# 1M件は生成・読み込みに時間がかかるため、CHA2HATENA_BENCH_SIZES=1000,100000,1000000 のように明示した場合のみ
+SIZES = [int(size) for size in os.getenv("CHA2HATENA_BENCH_SIZES", "1000,100000").split(",")]
+
+
+def pytest_ignore_collect(collection_path, config):
+    """通常のテスト実行では収集しない。`pytest tests/benchmarks`と明示した場合のみ実行"""
+    if importlib.util.find_spec("pytest_benchmark") is None:
+        return True
+    explicit = any(Path(arg.split("::")[0]).resolve().is_relative_to(BENCH_DIR) for arg in config.args)
+    return None if explicit else True
+
+
+@pytest.fixture(scope="session")
+def export_dir(tmp_path_factory) -> Path:
+    return tmp_path_factory.mktemp("exports")
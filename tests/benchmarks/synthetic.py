@@ -0,0 +1,55 @@
+"""ベンチマーク用の合成データ生成とメモリ計測のヘルパー"""
+
+import json
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+PROMPT_TEXT = "この関数の挙動について教えてください。\n\n```python\ndef add(a, b):\n    return a + b\n```\n"
+RESPONSE_TEXT = (
+    "この関数は2つの引数を足し合わせて返します。\n\n"
+    "- 数値なら加算\n- 文字列なら連結\n\n"
+    "Traceback (most recent call last):\n  File \"main.py\", line 1, in <module>\nTypeError: boom\n"
+)
+
+
+def chatgpt_export(n_messages: int) -> dict:
+    """sample/ChatGPT-sample.json形式（時刻なし）"""
+    messages = [
+        {"role": "Prompt", "say": f"{PROMPT_TEXT}{i}"} if i % 2 == 0 else {"role": "Response", "say": f"{RESPONSE_TEXT}{i}"}
+        for i in range(n_messages)
+    ]
+    return {"metadata": {"title": "合成データ", "powered_by": "ChatGPT Exporter"}, "messages": messages}
+
+
+def claude_export(n_messages: int) -> dict:
+    """sample/Claude-sample.json形式（同じ日付の時刻つき）"""
+    base = datetime(2025, 11, 20, 0, 0, 0)
+    step = 86000 / max(n_messages, 1)
+    messages = []
+    for i in range(n_messages):
+        message = {"role": "Prompt", "say": f"{PROMPT_TEXT}{i}"} if i % 2 == 0 else {"role": "Response", "say": f"{RESPONSE_TEXT}{i}"}
+        message["time"] = (base + timedelta(seconds=i * step)).strftime("%Y/%m/%d %H:%M:%S")
+        messages.append(message)
+    return {"metadata": {"title": "合成データ", "powered_by": "Claude Exporter"}, "messages": messages}
+
+
+EXPORTERS = {"ChatGPT": chatgpt_export, "Claude": claude_export}
+
+
+def write_export(directory: Path, ai_name: str, n_messages: int) -> Path:
+    path = directory / f"{ai_name}-synthetic-{n_messages}.json"
+    if not path.exists():
+        path.write_text(json.dumps(EXPORTERS[ai_name](n_messages), ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def peak_memory_mb(func, *args, **kwargs) -> float:
+    """関数を1回実行したときのPythonヒープの最大使用量(MB)"""
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024 / 1024
@@ -0,0 +1,94 @@
+import httpx
+import pytest
+from synthetic import peak_memory_mb
+
+from cha2hatena.blog.blog_schema import BlogClientSchema, HatenaSecretKeys
+from cha2hatena.blog.devto_poster import DevToPoster
+from cha2hatena.blog.hatenablog_poster import HatenaBlogPoster
+from cha2hatena.blog.markdown_renderer import DevToRenderer, HatenaRenderer, QiitaRenderer, parse_markdown
+from cha2hatena.blog.qiita_poster import QiitaPoster
+from cha2hatena.blog.tag_index import TagIndex
+
+CONTENT_SIZES = [2_000, 200_000]
+
+
+def _schema(content_chars: int) -> BlogClientSchema:
+    paragraph = "## 見出し\n\n学んだことを箇条書きでまとめる。\n- ポイント\n- `code`\n\n"
+    return BlogClientSchema(
+        title="ベンチマーク",
+        content=(paragraph * (content_chars // len(paragraph) + 1))[:content_chars],
+        categories=["Python", "ベンチマーク", "テスト"],
+        preset_categories=["自動投稿"],
+        hatena_secret_keys=HatenaSecretKeys(
+            hatena_entry_url="https://blog.hatena.ne.jp/id/blog/atom/entry",
+            client_id="key",
+            client_secret="secret",
+            token="token",
+            token_secret="token_secret",
+        ),
+        qiita_bearer_token="token",
+        devto_api_key="key",
+    )
+
+
+@pytest.mark.parametrize("content_chars", CONTENT_SIZES)
+def test_hatena_xml_unparser(benchmark, content_chars):
+    poster = HatenaBlogPoster.model_validate(_schema(content_chars).model_dump())
+    benchmark.extra_info["peak_memory_mb"] = peak_memory_mb(poster.xml_unparser)
+
+    xml = benchmark(poster.xml_unparser)
+    assert xml.startswith("<entry")
+
+
+@pytest.mark.parametrize("content_chars", CONTENT_SIZES)
+def test_hatena_parse_response(benchmark, content_chars):
+    poster = HatenaBlogPoster.model_validate(_schema(content_chars).model_dump())
+    entry = poster.xml_unparser().replace(
+        "<author>",
+        '<link rel="edit" href="https://blog.hatena.ne.jp/id/blog/atom/entry/1"/>'
+        '<link rel="alternate" href="https://id.hatenablog.com/entry/1"/><author>',
+    )
+    response = httpx.Response(201, text=entry.replace("<name />", "<name>id</name>"))
+    benchmark.extra_info["peak_memory_mb"] = peak_memory_mb(HatenaBlogPoster.parse_response, response)
+
+    result = benchmark(HatenaBlogPoster.parse_response, response)
+    assert result.title == "ベンチマーク"
+
+
+@pytest.mark.parametrize("content_chars", CONTENT_SIZES)
+@pytest.mark.parametrize("poster_class", [HatenaBlogPoster, QiitaPoster, DevToPoster])
+def test_poster_validation(benchmark, poster_class, content_chars):
+    data = _schema(content_chars).model_dump()
+
+    def _run():
+        poster = poster_class.model_validate(data)
+        return poster.model_dump(exclude_none=True)
+
+    benchmark.extra_info["peak_memory_mb"] = peak_memory_mb(_run)
+    payload = benchmark(_run)
+    assert payload["title"] == "ベンチマーク"
+
+
+@pytest.mark.parametrize("content_chars", CONTENT_SIZES)
+def test_render_for_all_services(benchmark, content_chars):
+    content = _schema(content_chars).content
+    renderers = [HatenaRenderer(), QiitaRenderer(), DevToRenderer()]
+
+    def _run():
+        document = parse_markdown(content)  # 解析は1回だけ
+        return [renderer.render(document) for renderer in renderers]
+
+    benchmark.extra_info["peak_memory_mb"] = peak_memory_mb(_run)
+    rendered = benchmark(_run)
+    assert len(rendered) == 3
+
+
+@pytest.mark.parametrize("history_tags", [1_000, 100_000])
+def test_snap_categories(benchmark, history_tags):
+    index = TagIndex()
+    for i in range(history_tags // 4):
+        index.add([f"カテゴリー{i % 5000}", f"tag-{i % 3000}", "Python", "自動投稿"])
+    suggestions = ["python", "カテゴリ-42", "Tag 7", "新しいカテゴリー"]
+
+    snapped = benchmark(index.snap, suggestions)
+    assert snapped[0] == "Python"
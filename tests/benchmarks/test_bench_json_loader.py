@@ -0,0 +1,61 @@
+import json
+from pathlib import Path
+
+import pytest
+from conftest import SIZES
+from synthetic import EXPORTERS, peak_memory_mb, write_export
+
+from cha2hatena import json_loader as jl
+from cha2hatena.compaction import CompactionConfig, Compactor
+
+
+@pytest.mark.parametrize("n_messages", SIZES)
+@pytest.mark.parametrize("ai_name", list(EXPORTERS))
+def test_json_loader(benchmark, export_dir, ai_name, n_messages):
+    path = write_export(export_dir, ai_name, n_messages)
+    benchmark.extra_info["peak_memory_mb"] = peak_memory_mb(jl.json_loader, [path])
+
+    result = benchmark(jl.json_loader, [path])
+    assert result
+
+
+@pytest.mark.parametrize("n_messages", SIZES)
+@pytest.mark.parametrize("ai_name", list(EXPORTERS))
+def test_convert_to_str(benchmark, ai_name, n_messages):
+    messages = EXPORTERS[ai_name](n_messages)["messages"]
+    benchmark.extra_info["peak_memory_mb"] = peak_memory_mb(jl.convert_to_str, messages, ai_name)
+
+    logs, _ = benchmark(jl.convert_to_str, messages, ai_name)
+    assert len(logs) == n_messages
+
+
+@pytest.mark.parametrize("n_messages", SIZES)
+def test_convert_to_str_with_compaction(benchmark, n_messages):
+    messages = EXPORTERS["Claude"](n_messages)["messages"]
+
+    def _run():
+        return jl.convert_to_str(messages, "Claude", Compactor(CompactionConfig(enable=True)))
+
+    benchmark.extra_info["peak_memory_mb"] = peak_memory_mb(_run)
+    logs, _ = benchmark(_run)
+    assert len(logs) == n_messages
+
+
+@pytest.mark.parametrize("n_paths", [10, 1000])
+def test_ai_names_and_titles(benchmark, n_paths):
+    names = list(EXPORTERS) + ["Gemini", "Other"]
+    paths = [Path(f"{names[i % len(names)]}-会話タイトル{i}.json") for i in range(n_paths)]
+
+    def _run():
+        ai_names = jl.ai_names_from_paths(paths)
+        return jl.get_conversation_titles(paths, ai_names)
+
+    titles = benchmark(_run)
+    assert len(titles) == n_paths
+
+
+def test_synthetic_export_is_loadable(export_dir):
+    """合成データが実際のエクスポート形式と同じキー構成であることの確認"""
+    sample = json.loads(Path("sample/Claude-sample.json").read_text(encoding="utf-8"))
+    synthetic = json.loads(write_export(export_dir, "Claude", 10).read_text(encoding="utf-8"))
+    assert synthetic["messages"][0].keys() == sample["messages"][0].keys()
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from conftest import SIZES
+
+from cha2hatena.llm.pricing import get_price_table
+
+
+@pytest.fixture(params=SIZES, ids=lambda n: f"{n}records")
+def run_records(request):
+    rng = np.random.default_rng(0)
+    n = request.param
+    models = rng.choice(["gemini-2.5-flash", "gemini-2.5-pro", "gemini-3-flash-preview", "deepseek-chat"], n)
+    dates = np.datetime64("2025-06-01") + rng.integers(0, 365, n)
+    input_tokens = rng.integers(1_000, 400_000, n)
+    return models, input_tokens, rng.integers(100, 8_000, n), rng.integers(0, 4_000, n), dates
+
+
+def test_recost_vectorized(benchmark, run_records):
+    models, input_tokens, output_tokens, thoughts_tokens, dates = run_records
+    table = get_price_table()
+
+    fees = benchmark(table.recost, models, input_tokens, output_tokens, thoughts_tokens=thoughts_tokens, dates=dates)
+
+    assert fees.shape == (len(models),)
+    assert (fees > 0).all()
@@ -0,0 +1,23 @@
+import random
+
+import pytest
+
+from cha2hatena.search_index import SearchIndex
+
+WORDS = ["Python", "非同期処理", "SQLite", "Docker", "コンテナ", "型ヒント", "テスト", "API", "キャッシュ", "ログ"]
+
+
+@pytest.fixture(scope="module", params=[1_000, 10_000])
+def index(request, tmp_path_factory):
+    rng = random.Random(0)
+    index = SearchIndex(tmp_path_factory.mktemp("search"))
+    for i in range(request.param):
+        text = "。".join(rng.choice(WORDS) + "について学んだ" for _ in range(40))
+        index.add(f"{i}.txt", f"記事{i} {rng.choice(WORDS)}", text)
+    yield index
+    index.close()
+
+
+def test_bm25_search(benchmark, index):
+    hits = benchmark(index.search, "SQLiteのキャッシュとDockerコンテナ", 5)
+    assert len(hits) == 5
@@ -46,4 +46,5 @@ def mock_create_ai_client(monkeypatch):
         return client
 
     monkeypatch.setattr("cha2hatena.main.create_ai_client", _mock_create)
+    monkeypatch.setattr("cha2hatena.llm.factory.create_ai_client", _mock_create)
     return _mock_create
@@ -0,0 +1,126 @@
+"""モックサーバーに対してmainのパイプライン全体をN並列で実行する負荷試験ハーネス
+
+    python tests/load_test.py --jobs 40 --concurrency 8 --latency 0.3 --error-rate 0.05
+
+ジョブごとに`python -m cha2hatena`を別プロセスで起動し、スループット・レイテンシ分布と
+モックサーバーが返したステータスコードの内訳（リトライ回数の目安）を表示する。
+ネットワークには一切アクセスしない。
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+from mock_servers import SERVICES, build_servers
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_INPUTS = [ROOT / "sample" / "Claude-sample.json", ROOT / "sample" / "ChatGPT-sample.json"]
+
+
+def prepare_workdir(workdir: Path, model: str, fallback_model: str | None) -> None:
+    """負荷試験用のconfig.yamlを作業ディレクトリに作成"""
+    config = yaml.safe_load((ROOT / "config.yaml").read_text(encoding="utf-8"))
+    config["ai"]["model"] = model
+    config["ai"]["fallback_model"] = fallback_model
+    config["ai"]["context_cache"] = False
+    config["blog"]["qiita"] = True
+    config["blog"]["devto"] = True
+    config["paths"]["output_dir"] = str(workdir / "outputs")
+    config["google_sheets"]["enable"] = False
+    config["other"]["usdjpy_rate"] = 150
+    (workdir / "config.yaml").write_text(yaml.safe_dump(config, allow_unicode=True), encoding="utf-8")
+
+
+async def run_job(idx: int, inputs: list[Path], workdir: Path, env: dict, semaphore: asyncio.Semaphore) -> tuple:
+    async with semaphore:
+        job_dir = workdir / f"job{idx:04d}"
+        job_dir.mkdir()
+        shutil.copy(workdir / "config.yaml", job_dir / "config.yaml")
+
+        started = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "cha2hatena",
+            *map(str, inputs),
+            cwd=job_dir,
+            env=env,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await process.communicate()
+        return process.returncode, time.perf_counter() - started, stderr.decode("utf-8", errors="replace")
+
+
+async def run_load_test(args: argparse.Namespace) -> int:
+    servers = build_servers(args).start()
+    workdir = Path(tempfile.mkdtemp(prefix="cha2hatena-load-"))
+    try:
+        prepare_workdir(workdir, args.model, args.fallback_model)
+        env = {**os.environ, **servers.env(), "DEBUG": "false", "PYTHONPATH": str(ROOT / "src")}
+        inputs = [Path(p).resolve() for p in args.inputs] or DEFAULT_INPUTS
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        print(f"モックサーバー: {servers.base_url}  作業ディレクトリ: {workdir}")
+        print(f"{args.jobs}ジョブを並列数{args.concurrency}で実行します...")
+        started = time.perf_counter()
+        results = await asyncio.gather(*(run_job(i, inputs, workdir, env, semaphore) for i in range(args.jobs)))
+        elapsed = time.perf_counter() - started
+    finally:
+        servers.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = sorted(latency for _, latency, _ in results)
+    failures = [(code, err) for code, _, err in results if code != 0]
+
+    print("-" * 50)
+    print(f"成功: {len(results) - len(failures)}/{len(results)}  経過時間: {elapsed:.2f}s")
+    print(f"スループット: {len(results) / elapsed:.2f} jobs/s")
+    print(
+        f"レイテンシ: p50={statistics.median(latencies):.2f}s "
+        f"p95={latencies[int(0.95 * (len(latencies) - 1))]:.2f}s max={latencies[-1]:.2f}s"
+    )
+    print("モックサーバーの応答内訳:")
+    for (service, status), count in sorted(servers.stats.items()):
+        print(f"  {service:<9}{status}: {count}")
+    if failures:
+        code, err = failures[0]
+        print(f"失敗例 (exit {code}):\n{err[-1500:]}")
+    return 0 if not failures else 1
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", help="入力ファイル（省略時はsample/のJSON）")
+    parser.add_argument("--jobs", type=int, default=20, help="実行するジョブ数")
+    parser.add_argument("--concurrency", type=int, default=4, help="同時実行数")
+    parser.add_argument("--model", default="gemini-2.5-flash")
+    parser.add_argument("--fallback-model", default="deepseek-chat")
+    parser.add_argument("--keep", action="store_true", help="作業ディレクトリを削除しない")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--service",
+        action="append",
+        default=[],
+        metavar="NAME:LATENCY:ERROR_RATE:RATE_LIMIT_RATE",
+        help=f"サービスごとの上書き。NAMEは {', '.join(SERVICES)}",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run_load_test(parse_args())))
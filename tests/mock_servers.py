@@ -0,0 +1,382 @@
+"""Gemini / DeepSeek / はてなAtomPub / はてなフォトライフ / Qiita / Dev.to / LINE / 通知用Webhook のローカル代替サーバー
+
+ネットワークなしでパイプライン全体を動かすためのモック。サービスごとに遅延・エラー率・429の割合を設定できる。
+
+    python tests/mock_servers.py --port 8900 --latency 0.5 --error-rate 0.1
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from datetime import UTC, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape, quoteattr
+
+SERVICES = ("gemini", "deepseek", "hatena", "fotolife", "qiita", "devto", "line", "webhook")
+JST = timezone(timedelta(hours=9))
+
+
+class Behavior:
+    """サービスごとの振る舞い設定"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, rate_limit_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+
+
+def _ai_output(text: str) -> dict:
+    """リクエスト内容から決定的な要約を作る"""
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+    return {
+        "title": f"モック要約 {digest}",
+        "content": f"## まとめ\n\nこれはモックサーバーの要約です（入力{len(text)}文字）。\n",
+        "categories": ["モック", "テスト"],
+    }
+
+
+class MockServers:
+    """すべてのモックエンドポイントを1つのポートで提供するサーバー"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, seed: int | None = 0, **behaviors: Behavior):
+        self.default = behaviors.pop("default", Behavior())
+        self.behaviors = behaviors
+        self.stats: Counter[tuple[str, int]] = Counter()
+        self.line_broadcasts: list[list[str]] = []  # 受け付けたLINEブロードキャストのテキスト
+        self.line_retry_keys: set[str] = set()
+        self.fotolife_uploads: list[tuple[str, int]] = []  # (MIMEタイプ, バイト数)
+        self.webhook_payloads: list[tuple[str, dict]] = []  # (webhook|slack|discord, 受け取ったJSON)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> dict[str, str]:
+        """アプリケーションをこのサーバーへ向けるための環境変数"""
+        return {
+            "GEMINI_BASE_URL": self.base_url,
+            "GEMINI_API_KEY": "mock-gemini-key",
+            "DEEPSEEK_BASE_URL": f"{self.base_url}/deepseek",
+            "DEEPSEEK_API_KEY": "mock-deepseek-key",
+            "HATENA_ENTRY_URL": f"{self.base_url}/mock/blog/atom/entry",
+            "HATENA_CONSUMER_KEY": "mock",
+            "HATENA_CONSUMER_SECRET": "mock",
+            "HATENA_ACCESS_TOKEN": "mock",
+            "HATENA_ACCESS_TOKEN_SECRET": "mock",
+            "FOTOLIFE_POST_URL": f"{self.base_url}/atom/post",
+            "QIITA_ENTRY_URL": f"{self.base_url}/api/v2/items",
+            "QIITA_BEARER_TOKEN": "mock",
+            "DEVTO_ENTRY_URL": f"{self.base_url}/api/articles",
+            "DEVTO_API_KEY": "mock",
+            "LINE_BROADCAST_URL": f"{self.base_url}/v2/bot/message/broadcast",
+            "LINE_CHANNEL_ACCESS_TOKEN": "mock",
+            "NOTIFY_WEBHOOK_URL": f"{self.base_url}/hooks/webhook",
+            "SLACK_WEBHOOK_URL": f"{self.base_url}/hooks/slack",
+            "DISCORD_WEBHOOK_URL": f"{self.base_url}/hooks/discord",
+        }
+
+    def start(self) -> "MockServers":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockServers":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _decide(self, service: str) -> tuple[float, int | None]:
+        """遅延秒数と、失敗させる場合のステータスコードを決める"""
+        behavior = self.behaviors.get(service, self.default)
+        with self._lock:
+            delay = max(0.0, behavior.latency + self._random.uniform(-behavior.jitter, behavior.jitter))
+            roll = self._random.random()
+        if roll < behavior.rate_limit_rate:
+            return delay, 429
+        if roll < behavior.rate_limit_rate + behavior.error_rate:
+            return delay, 503
+        return delay, None
+
+    def _make_handler(self):
+        servers = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            routes = [
+                ("POST", re.compile(r"^/v1beta/models/(?P<model>[^/:]+):generateContent"), "gemini"),
+                ("GET", re.compile(r"^/v1beta/cachedContents"), "gemini"),
+                ("POST", re.compile(r"^/v1beta/cachedContents"), "gemini"),
+                ("POST", re.compile(r"^/deepseek/chat/completions"), "deepseek"),
+                ("POST", re.compile(r"^/mock/blog/atom/entry"), "hatena"),
+                ("POST", re.compile(r"^/atom/post$"), "fotolife"),
+                ("POST", re.compile(r"^/api/v2/items"), "qiita"),
+                ("POST", re.compile(r"^/api/articles"), "devto"),
+                ("POST", re.compile(r"^/v2/bot/message/broadcast"), "line"),
+                ("POST", re.compile(r"^/hooks/(?P<kind>webhook|slack|discord)$"), "webhook"),
+            ]
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                for route_method, pattern, service in self.routes:
+                    match = pattern.match(self.path)
+                    if route_method == method and match:
+                        break
+                else:
+                    return self._send(404, {"error": "not found"}, service="unknown")
+
+                delay, failure = servers._decide(service)
+                time.sleep(delay)
+                if failure is not None:
+                    return self._send(failure, _error_body(service, failure), service=service)
+
+                handler = getattr(self, f"_{service}")
+                handler(method, match, body)
+
+            def _send(self, status: int, payload: dict | str, service: str, content_type: str = "application/json"):
+                data = payload.encode("utf-8") if isinstance(payload, str) else json.dumps(payload).encode("utf-8")
+                with servers._lock:
+                    servers.stats[(service, status)] += 1
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _gemini(self, method: str, match: re.Match, body: bytes):
+                if "cachedContents" in self.path:
+                    # 明示的キャッシュは未対応（プロンプトが短すぎる場合と同じ扱い）
+                    if method == "GET":
+                        return self._send(200, {"cachedContents": []}, service="gemini")
+                    return self._send(400, _error_body("gemini", 400), service="gemini")
+
+                request = json.loads(body or b"{}")
+                text = json.dumps(request.get("contents", ""), ensure_ascii=False)
+                output = json.dumps(_ai_output(text), ensure_ascii=False)
+                payload = {
+                    "candidates": [
+                        {"content": {"role": "model", "parts": [{"text": output}]}, "finishReason": "STOP", "index": 0}
+                    ],
+                    "usageMetadata": {
+                        "promptTokenCount": len(text),
+                        "candidatesTokenCount": len(output),
+                        "thoughtsTokenCount": 0,
+                        "totalTokenCount": len(text) + len(output),
+                    },
+                    "modelVersion": match.group("model"),
+                }
+                self._send(200, payload, service="gemini")
+
+            def _deepseek(self, method: str, match: re.Match, body: bytes):
+                request = json.loads(body or b"{}")
+                text = json.dumps(request.get("messages", []), ensure_ascii=False)
+                output = json.dumps(_ai_output(text), ensure_ascii=False)
+                payload = {
+                    "id": "mock",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "deepseek-chat"),
+                    "choices": [
+                        {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": output}}
+                    ],
+                    "usage": {
+                        "prompt_tokens": len(text),
+                        "completion_tokens": len(output),
+                        "total_tokens": len(text) + len(output),
+                        "prompt_cache_hit_tokens": 0,
+                        "prompt_cache_miss_tokens": len(text),
+                    },
+                }
+                self._send(200, payload, service="deepseek")
+
+            def _hatena(self, method: str, match: re.Match, body: bytes):
+                if "Authorization" not in self.headers:
+                    return self._send(401, "Unauthorized", service="hatena", content_type="text/plain")
+                request = ET.fromstring(body.decode("utf-8"))
+                entry_id = hashlib.sha1(body).hexdigest()[:10]
+                self._send(
+                    201, _hatena_entry(request, entry_id, servers.base_url), service="hatena", content_type="application/xml"
+                )
+
+            def _qiita(self, method: str, match: re.Match, body: bytes):
+                request = json.loads(body or b"{}")
+                item_id = hashlib.sha1(body).hexdigest()[:20]
+                now = datetime.now(JST).isoformat()
+                payload = {
+                    "id": item_id,
+                    "title": request.get("title", ""),
+                    "body": request.get("body", ""),
+                    "tags": request.get("tags", []),
+                    "private": bool(request.get("private")),
+                    "coediting": False,
+                    "comments_count": 0,
+                    "created_at": now,
+                    "updated_at": now,
+                    "url": f"{servers.base_url}/qiita/items/{item_id}",
+                }
+                self._send(201, payload, service="qiita")
+
+            def _devto(self, method: str, match: re.Match, body: bytes):
+                article = json.loads(body or b"{}").get("article", {})
+                article_id = int(hashlib.sha1(body).hexdigest()[:6], 16)
+                now = datetime.now(UTC).isoformat()
+                payload = {
+                    "id": article_id,
+                    "title": article.get("title", ""),
+                    "body_markdown": article.get("body_markdown", ""),
+                    "tags": article.get("tags", []),
+                    "published_at": now if article.get("published") else None,
+                    "created_at": now,
+                    "comments_count": 0,
+                    "positive_reactions_count": 0,
+                    "url": f"{servers.base_url}/devto/{article_id}",
+                }
+                self._send(201, payload, service="devto")
+
+            def _line(self, method: str, match: re.Match, body: bytes):
+                authorization = self.headers.get("Authorization", "")
+                if not authorization.startswith("Bearer ") or authorization.startswith("Bearer <"):
+                    return self._send(401, {"message": "Authentication failed"}, service="line")
+                messages = json.loads(body or b"{}").get("messages", [])
+                if not 1 <= len(messages) <= 5:
+                    details = [{"message": "Size must be between 1 and 5", "property": "messages"}]
+                    return self._send(400, {"message": "The request body has 1 error(s)", "details": details}, service="line")
+                retry_key = self.headers.get("X-Line-Retry-Key")
+                with servers._lock:
+                    duplicated = retry_key in servers.line_retry_keys
+                    if not duplicated:
+                        if retry_key:
+                            servers.line_retry_keys.add(retry_key)
+                        servers.line_broadcasts.append([message["text"] for message in messages])
+                if duplicated:
+                    return self._send(409, {"message": "The retry key is already accepted"}, service="line")
+                self._send(200, {}, service="line")
+
+            def _fotolife(self, method: str, match: re.Match, body: bytes):
+                content = ET.fromstring(body).find("{http://purl.org/atom/ns#}content")
+                if content is None or content.get("mode") != "base64":
+                    return self._send(400, "invalid entry", service="fotolife", content_type="text/plain")
+                data = base64.b64decode(content.text or "")
+                with servers._lock:
+                    servers.fotolife_uploads.append((content.get("type", ""), len(data)))
+                    image_id = f"{datetime.now(JST):%Y%m%d%H%M%S}{len(servers.fotolife_uploads):02d}"
+                image_url = f"{servers.base_url}/images/mock/{image_id}.png"
+                payload = (
+                    '<entry xmlns="http://purl.org/atom/ns#" xmlns:hatena="http://www.hatena.ne.jp/info/xmlns#">'
+                    f"<hatena:imageurl>{image_url}</hatena:imageurl>"
+                    f"<hatena:syntax>f:id:mock:{image_id}p:image</hatena:syntax></entry>"
+                )
+                self._send(201, payload, service="fotolife", content_type="application/x.atom+xml")
+
+            def _webhook(self, method: str, match: re.Match, body: bytes):
+                with servers._lock:
+                    servers.webhook_payloads.append((match.group("kind"), json.loads(body or b"{}")))
+                # Slackは本文"ok"、Discordは204を返す
+                if match.group("kind") == "discord":
+                    return self._send(204, "", service="webhook")
+                self._send(200, "ok", service="webhook", content_type="text/plain")
+
+        return Handler
+
+
+def _error_body(service: str, status: int) -> dict:
+    if service == "gemini":
+        statuses = {400: "INVALID_ARGUMENT", 429: "RESOURCE_EXHAUSTED", 503: "UNAVAILABLE"}
+        return {"error": {"code": status, "message": "mock error", "status": statuses.get(status, "UNKNOWN")}}
+    return {"error": {"code": status, "message": "mock error"}, "message": "mock error"}
+
+
+def _hatena_entry(request: ET.Element, entry_id: str, base_url: str) -> str:
+    """投稿内容をそのまま返すAtomエントリーを作る"""
+    ns = {"atom": "http://www.w3.org/2005/Atom", "app": "http://www.w3.org/2007/app"}
+
+    def _text(path: str) -> str:
+        elem = request.find(path, ns)
+        return (elem.text or "") if elem is not None else ""
+
+    categories = "".join(
+        f"<category term={quoteattr(c.get('term', ''))} />" for c in request.findall("atom:category", ns)
+    )
+    return (
+        '<entry xmlns="http://www.w3.org/2005/Atom" xmlns:app="http://www.w3.org/2007/app">'
+        f'<link rel="edit" href="{base_url}/mock/blog/atom/entry/{entry_id}"/>'
+        f'<link rel="alternate" type="text/html" href="{base_url}/entry/{entry_id}"/>'
+        f"<author><name>{escape(_text('atom:author/atom:name') or 'mock')}</name></author>"
+        f"<title>{escape(_text('atom:title'))}</title>"
+        f"<updated>{escape(_text('atom:updated') or datetime.now(JST).isoformat())}</updated>"
+        f'<content type="text/x-markdown">{escape(_text("atom:content"))}</content>'
+        f"{categories}"
+        f"<app:control><app:draft>{escape(_text('app:control/app:draft') or 'no')}</app:draft></app:control>"
+        "</entry>"
+    )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.0, help="全サービス共通の遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延の揺れ幅（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="503を返す割合")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="429を返す割合")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--service",
+        action="append",
+        default=[],
+        metavar="NAME:LATENCY:ERROR_RATE:RATE_LIMIT_RATE",
+        help=f"サービスごとの上書き。NAMEは {', '.join(SERVICES)}",
+    )
+    return parser.parse_args(argv)
+
+
+def build_servers(args: argparse.Namespace) -> MockServers:
+    behaviors = {"default": Behavior(args.latency, args.jitter, args.error_rate, args.rate_limit_rate)}
+    for spec in args.service:
+        name, latency, error_rate, rate_limit_rate = spec.split(":")
+        if name not in SERVICES:
+            raise ValueError(f"未対応のサービス名です: {name}")
+        behaviors[name] = Behavior(float(latency), args.jitter, float(error_rate), float(rate_limit_rate))
+    return MockServers(args.host, args.port, seed=args.seed, **behaviors)
+
+
+if __name__ == "__main__":
+    servers = build_servers(parse_args())
+    print(f"モックサーバー起動: {servers.base_url}")
+    for key, value in servers.env().items():
+        print(f"{key}={value}")
+    try:
+        servers.start()
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servers.stop()
+        print(dict(servers.stats))
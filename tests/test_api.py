@@ -0,0 +1,172 @@
+import asyncio
+import csv
+import json
+import logging
+import threading
+from datetime import datetime
+
+import httpx
+import pytest
+
+from cha2hatena.api import ApiApp, ApiConfig, ProgressHandler, ProgressHub
+from cha2hatena.log_pipeline import job_context
+from cha2hatena.scheduler import PublishQueue
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = ApiApp(
+        ApiConfig(max_upload_mb=0.001),
+        queue_path=tmp_path / "schedule.sqlite3",
+        output_dir=tmp_path / "outputs",
+        wake=threading.Event(),
+        poll_interval=0.05,
+    )
+    yield app
+    app.close()
+
+
+def _request(app: ApiApp, method: str, url: str, **kwargs) -> httpx.Response:
+    async def _send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, url, **kwargs)
+
+    return asyncio.run(_send())
+
+
+def test_submit_queues_summarize_job(app):
+    assert _request(app, "GET", "/jobs").json() == []
+    response = _request(app, "POST", "/jobs?name=Claude-log.json&compare=1", content=b'{"messages": []}')
+
+    assert response.status_code == 202
+    job = response.json()
+    assert (job["kind"], job["status"], job["label"]) == ("summarize", "pending", "Claude-log.json")
+    assert app.wake.is_set()
+    with PublishQueue(app.queue_path) as queue:
+        # すぐ実行するジョブなので、公開枠を待たずに取り出せる
+        claimed = queue.claim_due(datetime.now().astimezone())
+    assert claimed.id == job["id"]
+    assert claimed.payload["compare"] is True
+    assert json.loads(open(claimed.payload["inputs"][0], encoding="utf-8").read()) == {"messages": []}
+
+    assert [job["id"] for job in _request(app, "GET", "/jobs").json()] == [claimed.id]
+
+
+@pytest.mark.parametrize(
+    ("url", "body", "status"),
+    [
+        ("/jobs?name=log.exe", b"{}", 400),
+        ("/jobs?name=log.json", b"{broken", 400),
+        ("/jobs?name=log.json", b"x" * 2000, 413),
+    ],
+)
+def test_submit_rejects_invalid_uploads(app, url, body, status):
+    assert _request(app, "POST", url, content=body).status_code == status
+
+
+def _raw_request(app: ApiApp, method: str, path: str, headers: list[tuple[bytes, bytes]]) -> list[dict]:
+    """httpxでは送れない不正なヘッダーを付けてASGIアプリを直接呼び、送られたメッセージを返す"""
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"name=a.json", "headers": headers}
+    sent: list[dict] = []
+
+    async def _receive():
+        return {"type": "http.request", "body": b"{}", "more_body": False}
+
+    async def _send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, _receive, _send))
+    return sent
+
+
+def test_malformed_headers_are_rejected_with_400(app):
+    sent = _raw_request(app, "POST", "/jobs", [(b"content-length", b"abc")])
+    assert [message["status"] for message in sent if message["type"] == "http.response.start"] == [400]
+
+    job_id = _request(app, "POST", "/jobs?name=a.json", content=b"{}").json()["id"]
+    sent = _raw_request(app, "GET", f"/jobs/{job_id}/events", [(b"last-event-id", b"abc")])
+    # 応答を始める前に判定するため、レスポンスの開始は1回だけ
+    assert [message["status"] for message in sent if message["type"] == "http.response.start"] == [400]
+
+
+def test_events_stream_until_job_finishes(app):
+    hub_handler = ProgressHandler(app.hub)
+    logger = logging.getLogger("test_api.progress")
+    logger.addHandler(hub_handler)
+    job_id = _request(app, "POST", "/jobs?name=a.json", content=b"{}").json()["id"]
+
+    with job_context(f"queue-{job_id}-1"):
+        logger.warning("要約しています")
+    logger.warning("ジョブ外のログ")
+    with PublishQueue(app.queue_path) as queue:
+        queue.complete(job_id, datetime.now().astimezone())
+
+    body = _request(app, "GET", f"/jobs/{job_id}/events").text
+    events = [block.splitlines() for block in body.strip().split("\n\n")]
+    assert events[0][:2] == ["event: log", "id: 0"]
+    assert json.loads(events[0][2].removeprefix("data: "))["message"] == "要約しています"
+    assert events[1][0] == "event: status"
+    assert json.loads(events[1][1].removeprefix("data: "))["status"] == "done"
+    assert len(events) == 2
+
+    # 途中から再接続した場合は、受け取っていない進捗だけ送る
+    resumed = _request(app, "GET", f"/jobs/{job_id}/events", headers={"Last-Event-ID": "0"}).text
+    assert resumed.startswith("event: status")
+    logger.removeHandler(hub_handler)
+
+
+def test_history_spend_and_auth(app, tmp_path):
+    (tmp_path / "outputs").mkdir()
+    with (tmp_path / "outputs" / "record.csv").open("w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=["entry_title", "entry_URL", "prompt", "api_key"])
+        writer.writeheader()
+        writer.writerows(
+            [
+                {
+                    "entry_title": f"記事{i}",
+                    "entry_URL": f"https://blog.example/{i}",
+                    "prompt": "要約",
+                    "api_key": "...abcde",
+                }
+                for i in range(3)
+            ]
+        )
+
+    history = _request(app, "GET", "/history?limit=2").json()
+    assert [row["entry_title"] for row in history] == ["記事2", "記事1"]
+    assert "api_key" not in history[0] and "prompt" not in history[0]
+    assert _request(app, "GET", "/spend").status_code == 404  # 台帳が無効
+    assert _request(app, "GET", "/jobs/999").status_code == 404
+
+    app.token = "secret"
+    assert _request(app, "GET", "/history").status_code == 401
+    assert _request(app, "GET", "/history", headers={"Authorization": "Bearer secret"}).status_code == 200
+
+
+def test_progress_hub_wakes_subscribers_from_other_threads():
+    hub = ProgressHub()
+
+    async def _wait():
+        wake = hub.subscribe(1)
+        threading.Thread(target=hub.publish, args=(1, {"message": "進捗"})).start()
+        await asyncio.wait_for(wake.wait(), 1)
+        hub.unsubscribe(1, wake)
+        return hub.events(1)
+
+    assert asyncio.run(_wait()) == [{"message": "進捗"}]
+
+
+def test_progress_hub_drops_events_of_finished_jobs(monkeypatch):
+    hub = ProgressHub(retain_seconds=60)
+    clock = iter([0.0, 30.0, 61.0])
+    monkeypatch.setattr("cha2hatena.api.time.monotonic", lambda: next(clock))
+    for job_id in (1, 2, 3):
+        hub.publish(job_id, {"message": f"ジョブ{job_id}"})
+
+    hub.finish(1)
+    hub.finish(2)
+    # 終わった直後は、接続中のSSEが最後まで送れるよう残す
+    assert hub.events(1) and hub.events(2)
+    hub.finish(3)
+    assert (hub.events(1), len(hub.events(2)), len(hub.events(3))) == ([], 1, 1)
@@ -0,0 +1,78 @@
+from cha2hatena.compaction import (
+    CompactionConfig,
+    Compactor,
+    estimate_tokens,
+    truncate_code_blocks,
+    truncate_tracebacks,
+)
+
+
+def test_truncate_code_blocks():
+    code = "```python\n" + "\n".join(f"x = {i}" for i in range(100)) + "\n```"
+    result = truncate_code_blocks(code, max_lines=10)
+
+    assert result.startswith("```python\n")
+    assert result.endswith("\n```")
+    assert "x = 0" in result
+    assert "x = 99" in result
+    assert "x = 50" not in result
+    assert "90行省略" in result
+
+
+def test_truncate_tracebacks():
+    frames = [f'  File "mod{i}.py", line {i}, in f{i}\n    call{i}()' for i in range(20)]
+    text = "実行したらエラー\nTraceback (most recent call last):\n" + "\n".join(frames) + "\nValueError: boom\n続き"
+    result = truncate_tracebacks(text, max_lines=5)
+
+    assert "Traceback (most recent call last):" in result
+    assert "ValueError: boom" in result
+    assert "mod0.py" not in result
+    assert result.endswith("続き")
+
+
+def test_compactor_dedupe_and_report():
+    compactor = Compactor(CompactionConfig(enable=True, min_duplicate_chars=20))
+    pasted = "def foo():\n" + "    print('duplicated paste')\n" * 10
+    originals = [f"これを見て\n\n{pasted}", f"もう一度\n\n{pasted}"]
+
+    first, second = (compactor.compact(text) for text in originals)
+    compactor.record("".join(originals), first + second)
+
+    assert "duplicated paste" in first
+    assert "duplicated paste" not in second
+    assert 0 < compactor.reduction_rate < 1
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("abcd" * 10) == 10
+    assert estimate_tokens("会話ログ") == 4
+
+
+def test_compact_document_keeps_whole_plain_text_conversation():
+    compactor = Compactor(CompactionConfig(enable=True, max_message_chars=200))
+    messages = [
+        f"agent: {'You' if i % 2 else 'Claude'}\n[message]\n{'発言' * (300 if i == 3 else 30)}{i}\n\n" for i in range(6)
+    ]
+    text = "前置き\n\n" + "".join(messages)
+
+    result = compactor.compact_document(text)
+
+    # 長い発言だけが切り詰められ、前後の発言は残る
+    assert result.startswith("前置き")
+    assert result.count("agent: ") == 6
+    assert all(f"{'発言' * 30}{i}" in result for i in (0, 1, 2, 4, 5))
+    assert result.count("文字省略") == 1
+
+    # 発言の区切りがないテキストは、長くても中間を省略しない
+    plain = "段落です。\n\n" * 100
+    assert "文字省略" not in compactor.compact_document(plain)
+
+
+def test_sample_conversation_is_not_truncated_in_the_middle():
+    from pathlib import Path
+
+    text = (Path(__file__).parents[1] / "sample" / "conversation.txt").read_text(encoding="utf-8")
+    result = Compactor(CompactionConfig(enable=True)).compact_document(text)
+
+    assert "文字省略" not in result
+    assert result.count("agent: ") == text.count("agent: ")
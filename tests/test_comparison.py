@@ -0,0 +1,70 @@
+import sys
+import time
+
+import pytest
+
+from cha2hatena.llm.comparison import ComparisonConfig, compare_models, select_winner, write_report
+from cha2hatena.llm.conversational_ai import ConversationalAi, LlmConfig
+from cha2hatena.llm.llm_stats import TokenStats
+
+BEHAVIOR = {
+    "gemini-3-flash-preview": (0.3, 20_000),
+    "gemini-2.5-pro": (0.1, 20_000),
+    "deepseek-reasoner": (0.2, 20_000),
+}
+
+
+class _FakeClient(ConversationalAi):
+    def get_summary(self) -> tuple[dict, TokenStats]:
+        if self.model == "gemini-2.5-flash":
+            sys.exit(1)  # 致命的なエラーで終了するクライアント
+        if self.model == "gemini-2.5-flash-lite":
+            raise KeyboardInterrupt
+        delay, input_tokens = BEHAVIOR[self.model]
+        time.sleep(delay)
+        content = f"# {self.model}\n\n- ポイント1\n- ポイント2\n"
+        data = {"title": self.model, "content": content, "categories": ["Python"]}
+        return data, TokenStats(input_tokens, 0, 1_000, len(self.conversation), len(content), self.model)
+
+
+def _config() -> LlmConfig:
+    return LlmConfig(prompt="要約して", model="gemini-2.5-flash", api_key="k", conversation="会話ログ")
+
+
+def test_compare_models_runs_concurrently_and_keeps_order(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "g")
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "d")
+    models = ["gemini-3-flash-preview", "gemini-2.5-pro", "deepseek-reasoner", "gemini-2.5-flash"]
+
+    started = time.perf_counter()
+    results = compare_models(_config(), models, _FakeClient)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.55  # 直列なら0.6秒以上
+    assert [result.model for result in results] == models
+    assert [result.succeeded for result in results] == [True, True, True, False]
+    assert "SystemExit" in results[-1].error
+    assert results[0].quality_indicators()["bullets"] == 2
+
+
+def test_keyboard_interrupt_stops_the_comparison(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "g")
+    with pytest.raises(KeyboardInterrupt):
+        compare_models(_config(), ["gemini-2.5-flash-lite", "gemini-2.5-pro"], _FakeClient)
+
+
+def test_select_winner_and_report(monkeypatch, tmp_path):
+    monkeypatch.setenv("GEMINI_API_KEY", "g")
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "d")
+    results = compare_models(_config(), list(BEHAVIOR), _FakeClient)
+
+    assert select_winner(results, ComparisonConfig(prefer="cost")).model == "deepseek-reasoner"
+    assert select_winner(results, ComparisonConfig(prefer="latency")).model == "gemini-2.5-pro"
+    assert select_winner(results, ComparisonConfig(max_latency=0.15, max_cost_usd=0.001)) is None
+
+    winner = select_winner(results, ComparisonConfig())
+    report = write_report(results, tmp_path, winner)
+    text = report.read_text(encoding="utf-8")
+    assert "| deepseek-reasoner |" in text
+    assert "採用" in text
+    assert report.with_suffix(".json").exists()
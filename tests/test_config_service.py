@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from cha2hatena.config_service import ConfigService
+from cha2hatena.setup import get_DEBUG
+
+CONFIG = """
+ai:
+  model: gemini-2.5-flash
+  prompt: 要約してください
+  temperature: 1.0
+schedule:
+  poll_interval: {poll_interval}
+other:
+  debug: "{debug}"
+"""
+
+
+def _write(path, poll_interval=60, debug="false"):
+    path.write_text(CONFIG.format(poll_interval=poll_interval, debug=debug), encoding="utf-8")
+    # 同じ秒の中での書き換えも検知されるよう、更新時刻を進める
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "key")
+    monkeypatch.delenv("DEBUG", raising=False)
+    config_path = tmp_path / "config.yaml"
+    _write(config_path)
+    return ConfigService(config_path, tmp_path / ".env")
+
+
+def test_reload_swaps_snapshot(service):
+    first = service.current()
+    assert (first.version, first.schedule.poll_interval, first.debug) == (1, 60, False)
+    assert service.reload_if_changed() is False
+
+    _write(service.config_path, poll_interval=5, debug="true")
+    assert service.reload_if_changed() is True
+
+    second = service.current()
+    assert (second.version, second.schedule.poll_interval, second.debug) == (2, 5, True)
+    # 先に取得した設定は変わらない
+    assert (first.schedule.poll_interval, first.debug) == (60, False)
+
+
+def test_invalid_edit_keeps_previous_snapshot(service):
+    _write(service.config_path, poll_interval=-1)
+    assert service.reload_if_changed() is False
+    assert service.current().version == 1
+
+    service.config_path.write_text("ai: [", encoding="utf-8")
+    assert service.reload_if_changed() is False
+    assert service.current().schedule.poll_interval == 60
+
+
+def test_env_change_reloads_secrets(service, monkeypatch):
+    monkeypatch.setenv("HATENA_ENTRY_URL", "")
+    service.env_path.write_text("HATENA_ENTRY_URL=https://blog.example/atom/entry\n", encoding="utf-8")
+
+    assert service.reload_if_changed() is True
+    assert service.current().secret_keys["hatena_entry_url"] == "https://blog.example/atom/entry"
+
+
+def test_get_DEBUG(monkeypatch):
+    monkeypatch.delenv("DEBUG", raising=False)
+    assert get_DEBUG({"other": {"debug": "True"}}) is True
+    assert get_DEBUG({"other": None}) is False
+    monkeypatch.setenv("DEBUG", "1")
+    assert get_DEBUG({"other": {"debug": "false"}}) is True
+
+
+def test_typed_sections(service):
+    snapshot = service.current()
+    assert (snapshot.ai.fallback_model, snapshot.ai.multi_file.max_workers) == (None, 4)
+    assert snapshot.paths.output_dir.name == "outputs"
+    assert (snapshot.metrics.enable, snapshot.google_sheets.enable, snapshot.other.usdjpy_rate) == (False, False, None)
+
+    text = service.config_path.read_text(encoding="utf-8")
+    service.config_path.write_text(text + "metrics:\n  port: not-a-port\n", encoding="utf-8")
+    stat = service.config_path.stat()
+    os.utime(service.config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    # 以前は使う時点まで検証されなかった節も、再読み込みの時点で不正な値を拒否する
+    assert service.reload_if_changed() is False
+    assert service.current() is snapshot
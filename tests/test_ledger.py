@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import pytest
+
+from cha2hatena.compaction import estimate_tokens
+from cha2hatena.ledger import BudgetConfig, SpendBudget, SpendLedger, check_budget, estimate_cost, key_fingerprint
+from cha2hatena.llm.conversational_ai import LlmConfig
+
+NOW = datetime(2026, 1, 15, 12, 0)
+
+
+def test_ledger_accumulates_per_day_month_model_and_key(tmp_path):
+    with SpendLedger(tmp_path / "ledger.sqlite3") as ledger:
+        ledger.record("gemini-2.5-flash", "key-a", 0.10, 15.0, now=NOW)
+        ledger.record("deepseek-chat", "key-b", 0.02, 3.0, now=NOW)
+        ledger.record("gemini-2.5-flash", "key-a", 0.05, None, now=datetime(2026, 1, 16))
+
+        spent = ledger.spent(["all", "model:gemini-2.5-flash", "model:gemini-2.5-pro"], now=NOW)
+        assert spent[("day", "all")] == pytest.approx(0.12)
+        assert spent[("month", "all")] == pytest.approx(0.17)
+        assert spent[("day", "model:gemini-2.5-flash")] == 0.10
+        assert spent[("month", "model:gemini-2.5-flash")] == pytest.approx(0.15)
+        assert spent[("day", "model:gemini-2.5-pro")] == 0.0
+
+        report = {row["scope"]: row for row in ledger.report("month", now=NOW)}
+        assert report[f"key:{key_fingerprint('key-a')}"]["runs"] == 2
+        assert report["all"]["jpy"] == 18.0
+        assert "key-a" not in str(report)
+
+
+def test_budget_decisions(tmp_path):
+    prompt = "会話ログ" * 1000
+    with SpendLedger(tmp_path / "ledger.sqlite3") as ledger:
+        ledger.record("gemini-2.5-pro", "key", 0.49, now=NOW)
+
+        config = BudgetConfig(
+            enable=True,
+            daily_usd=1.0,
+            models={"gemini-2.5-pro": {"daily_usd": 0.5}},
+            downgrade_model="deepseek-chat",
+        )
+        decision = SpendBudget(config, ledger).check("gemini-2.5-pro", prompt, now=NOW)
+        assert decision.action == "downgrade"
+        assert decision.model == "deepseek-chat"
+        assert "gemini-2.5-pro" in decision.reason
+
+        assert SpendBudget(config, ledger).check("gemini-2.5-flash", prompt, now=NOW).action == "allow"
+
+        deferring = config.model_copy(update={"action": "defer"})
+        assert SpendBudget(deferring, ledger).check("gemini-2.5-pro", prompt, now=NOW).action == "defer"
+
+        # 切り替え先でも全体の予算を超える場合は中止
+        ledger.record("deepseek-chat", "key", 0.51, now=NOW)
+        assert SpendBudget(config, ledger).check("gemini-2.5-pro", prompt, now=NOW).action == "refuse"
+
+
+def test_budget_for_compared_models_uses_the_sum(tmp_path):
+    prompt = "会話ログ" * 1000
+    with SpendLedger(tmp_path / "ledger.sqlite3") as ledger:
+        budget = SpendBudget(BudgetConfig(enable=True, daily_usd=1.0), ledger)
+        single = budget.check("gemini-2.5-pro", prompt, now=NOW).estimated_usd
+        ledger.record("deepseek-chat", "key", 1.0 - single * 1.5, now=NOW)
+
+        # 1モデルなら収まるが、比較する全モデルの合計では超える
+        assert budget.check("gemini-2.5-pro", prompt, now=NOW).action == "allow"
+        decision = budget.check_all([("gemini-2.5-pro", estimate_tokens(prompt))] * 2, now=NOW)
+        assert decision.action == "refuse"  # 比較では切り替えない
+        assert decision.estimated_usd == pytest.approx(single * 2)
+        assert "全体" in decision.reason
+
+
+def test_check_budget_counts_the_hedge_model(tmp_path):
+    config = LlmConfig(prompt="要約", model="gemini-2.5-flash", api_key="key", conversation="会話ログ" * 1000)
+    single = estimate_cost("gemini-2.5-flash", config.prompt + config.conversation, 4000)
+    budget_config = BudgetConfig(enable=True, ledger_path=str(tmp_path / "ledger.sqlite3"), daily_usd=single * 1.5)
+
+    check_budget(budget_config, config)
+    # ヘッジでは切り替え先にも同時にリクエストすることがあるため、両方の合計で超える
+    with pytest.raises(SystemExit) as e:
+        check_budget(budget_config, config, hedge_model="gemini-2.5-flash")
+    assert e.value.code == 1
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from mock_servers import Behavior, MockServers
+
+from cha2hatena import line_message
+from cha2hatena.background import BackgroundLoop
+from cha2hatena.line_message import LineNotifier
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    with MockServers(line=Behavior(rate_limit_rate=0.5)) as servers:
+        monkeypatch.setattr(line_message, "BROADCAST_URL", servers.env()["LINE_BROADCAST_URL"])
+        yield servers
+
+
+def test_retries_rate_limit_and_sends_once(servers):
+    async def _run():
+        async with httpx.AsyncClient() as client:
+            notifier = LineNotifier("token", client, max_retries=10, backoff=0.01)
+            return await asyncio.gather(*(notifier.broadcast([f"通知{i}"]) for i in range(5)))
+
+    assert all(asyncio.run(_run()))
+    assert servers.stats[("line", 429)] > 0
+    assert servers.stats[("line", 200)] == 5
+    assert sorted(texts[0] for texts in servers.line_broadcasts) == [f"通知{i}" for i in range(5)]
+
+
+def test_authorization_header_has_no_brackets(servers):
+    servers.behaviors["line"] = Behavior()
+
+    async def _run(token: str):
+        async with httpx.AsyncClient() as client:
+            return await LineNotifier(token, client).broadcast(["通知"])
+
+    assert asyncio.run(_run("token"))
+    assert not asyncio.run(_run("<token>"))  # 山括弧付きは認証エラーでリトライしない
+    assert servers.stats[("line", 401)] == 1
+
+
+def test_broadcast_is_split_into_five_messages_per_request(servers):
+    servers.behaviors["line"] = Behavior()
+
+    async def _run():
+        async with httpx.AsyncClient() as client:
+            return await LineNotifier("token", client).broadcast([f"投稿{i}" for i in range(7)])
+
+    assert asyncio.run(_run())
+    assert sorted(len(texts) for texts in servers.line_broadcasts) == [2, 5]
+
+
+def test_background_loop_does_not_block_caller(servers):
+    servers.behaviors["line"] = Behavior(latency=0.3)
+    background = BackgroundLoop()
+    notifier = LineNotifier("token", background.client)
+
+    started = time.perf_counter()
+    future = background.submit(notifier.broadcast(["通知"]))
+    assert time.perf_counter() - started < 0.1
+
+    assert background.shutdown(timeout=5)
+    assert future.result() is True
+    assert servers.line_broadcasts == [["通知"]]
+
+
+def test_background_loop_cancels_on_timeout(servers):
+    servers.behaviors["line"] = Behavior(latency=1.0)
+    background = BackgroundLoop()
+    future = background.submit(LineNotifier("token", background.client).broadcast(["通知"]))
+
+    assert not background.shutdown(timeout=0.1)
+    assert future.cancelled()
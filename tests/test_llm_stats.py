@@ -0,0 +1,92 @@
+import csv
+from datetime import date
+
+import pytest
+
+from cha2hatena.llm.llm_stats import TokenStats
+from cha2hatena.llm.pricing import PriceTable, UnknownModelError, recost_csv
+
+PRICING = {
+    "unit_tokens": 1_000_000,
+    "fallback_model": "gemini-2.5-pro",
+    "models": {
+        "m": [
+            {"effective_from": "2025-02-01", "tiers": [
+                {"up_to": 1000, "input": 0.5, "input_cache_hit": 0.05, "output": 1.0},
+                {"input": 3.0, "input_cache_hit": 0.3, "output": 6.0},
+            ]},
+            {"effective_from": "2024-06-01", "tiers": [{"input": 1.0, "input_cache_hit": 0.1, "output": 2.0}]},
+        ],
+        "gemini-2.5-pro": [
+            {"effective_from": "2025-06-17", "tiers": [
+                {"up_to": 200000, "input": 1.25, "input_cache_hit": 0.125, "output": 10.0},
+                {"input": 2.5, "input_cache_hit": 0.25, "output": 15.0},
+            ]},
+        ],
+    },
+}
+
+
+def test_cache_hit_tokens_are_billed_at_cache_rate():
+    no_cache = TokenStats(1_000_000, 0, 0, 0, 0, "deepseek-chat")
+    half_cached = TokenStats(1_000_000, 0, 0, 0, 0, "deepseek-chat", cached_tokens=500_000)
+
+    assert no_cache.input_fee == pytest.approx(0.28)
+    assert half_cached.input_fee == pytest.approx(0.14 + 0.014)
+
+
+def test_gemini_pro_tier_uses_total_prompt_tokens():
+    stats = TokenStats(300_000, 0, 0, 0, 0, "gemini-2.5-pro", cached_tokens=200_000)
+
+    assert stats.input_fee == pytest.approx(2.5 * 0.1 + 0.25 * 0.2)
+
+
+def test_unknown_model_and_local_model():
+    with pytest.raises(UnknownModelError):
+        PriceTable({**PRICING, "fallback_model": None}).rates("gemini-9-ultra")
+    assert PriceTable(PRICING).rates("gemini-9-ultra") == PriceTable(PRICING).rates("gemini-2.5-pro")
+    assert TokenStats(1000, 0, 1000, 0, 0, "local:qwen2.5:14b").total_fee == 0
+
+
+def test_effective_dates_select_version():
+    table = PriceTable(PRICING)
+    assert table.rates("m", on=date(2024, 1, 1)) == pytest.approx((1e-6, 1e-7, 2e-6))  # 最初の版より前
+    assert table.rates("m", on=date(2025, 1, 31)) == pytest.approx((1e-6, 1e-7, 2e-6))
+    assert table.rates("m", on=date(2025, 2, 1)) == pytest.approx((0.5e-6, 0.05e-6, 1e-6))
+    assert table.rates("m", tier_tokens=1001, on=date(2025, 2, 1)) == pytest.approx((3e-6, 0.3e-6, 6e-6))
+
+
+def test_recost_matches_scalar_fee():
+    table = PriceTable(PRICING)
+    models = ["m", "m", "m", "local:x", "gemini-2.5-pro"]
+    inputs = [500, 2000, 500, 10, 300_000]
+    outputs = [100, 100, 100, 10, 1000]
+    cached = [100, 0, 0, 0, 200_000]
+    dates = ["2025-01-10", "2025-03-01", "2025-03-01", "2025-03-01", "2025-12-01"]
+
+    result = table.recost(models, inputs, outputs, thoughts_tokens=[5] * 5, cached_tokens=cached, dates=dates)
+
+    expected = [
+        table.fee(m, i, o, 5, c, on=date.fromisoformat(d))
+        for m, i, o, c, d in zip(models, inputs, outputs, cached, dates)
+    ]
+    assert list(result) == pytest.approx(expected)
+
+
+def test_recost_csv_uses_cached_tokens(tmp_path):
+    table = PriceTable(PRICING)
+    path = tmp_path / "record.csv"
+    fieldnames = ["timestamp", "model", "input_tokens", "thoughts_tokens", "output_tokens", "total_fee (USD)"]
+    with path.open("w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=[*fieldnames, "cached_tokens"], restval="")
+        writer.writeheader()
+        # 列を追加する前の記録（空欄）はキャッシュなしとして計算する
+        writer.writerow(dict(zip(fieldnames, ["2025-03-01T10:00:00", "m", 500, 0, 100, 0.00035])))
+        writer.writerow(dict(zip([*fieldnames, "cached_tokens"], ["2025-03-01T10:00:00", "m", 500, 0, 100, 0, 400])))
+
+    _, recalculated = recost_csv(path, table)
+
+    assert list(recalculated) == pytest.approx(
+        [table.fee("m", 500, 100, 0, 0, on=date(2025, 3, 1)), table.fee("m", 500, 100, 0, 400, on=date(2025, 3, 1))]
+    )
+    assert recalculated[1] < recalculated[0]
@@ -0,0 +1,61 @@
+import asyncio
+import json
+import logging
+
+from cha2hatena.log_pipeline import LogConfig, LogPipeline, current_job_id, file_handler, job_context
+
+
+def _pipeline(tmp_path, **config):
+    log_config = LogConfig(path=str(tmp_path / "app.log"), **config)
+    pipeline = LogPipeline([file_handler(log_config)])
+    logger = logging.getLogger(f"test_log_pipeline.{tmp_path.name}")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(pipeline.handler)
+    return pipeline, logger
+
+
+def _records(tmp_path) -> list[dict]:
+    return [json.loads(line) for line in (tmp_path / "app.log").read_text(encoding="utf-8").splitlines()]
+
+
+def test_json_records_carry_job_id(tmp_path):
+    pipeline, logger = _pipeline(tmp_path)
+
+    async def _task(name: str):
+        await asyncio.sleep(0)
+        logger.warning("投稿しました: %s", name, extra={"service": name})
+
+    async def _main():
+        with job_context("job-a"):
+            task_a = asyncio.create_task(_task("hatena"))
+        with job_context("job-b"):
+            task_b = asyncio.create_task(_task("qiita"))
+        await asyncio.gather(task_a, task_b)
+
+    asyncio.run(_main())
+    try:
+        raise ValueError("失敗")
+    except ValueError:
+        logger.exception("エラー")
+    pipeline.stop()
+
+    records = _records(tmp_path)
+    assert {(r["job_id"], r["message"], r["service"]) for r in records[:2]} == {
+        ("job-a", "投稿しました: hatena", "hatena"),
+        ("job-b", "投稿しました: qiita", "qiita"),
+    }
+    assert records[2]["job_id"] is None
+    assert "ValueError: 失敗" in records[2]["exc_info"]
+    assert current_job_id() is None
+
+
+def test_rotation_is_configurable(tmp_path):
+    pipeline, logger = _pipeline(tmp_path, format="text", max_bytes=200, backup_count=2)
+    with job_context() as job_id:
+        for i in range(20):
+            logger.info(f"ログ{i}")
+    pipeline.stop()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["app.log", "app.log.1", "app.log.2"]
+    assert f"| {job_id} |" in (tmp_path / "app.log").read_text(encoding="utf-8")
@@ -0,0 +1,110 @@
+import pytest
+
+from cha2hatena.blog.markdown_renderer import (
+    BlockQuote,
+    CodeBlock,
+    DevToRenderer,
+    HatenaRenderer,
+    LinkCard,
+    ListBlock,
+    MarkdownRenderer,
+    QiitaRenderer,
+    Table,
+    parse_markdown,
+)
+
+SAMPLE = """# 概要
+
+Pythonで要約します[^1]。`[^1]`はコードなので置き換えない。
+
+```py:main.py
+print("hello")
+```
+
+| 項目 | 値 |
+|:--|--:|
+| a | 1 \\| 2 |
+
+> 引用です
+
+- 項目1
+  - 入れ子
+- 項目2
+
+https://example.com/page
+
+[^1]: 脚注の本文
+"""
+
+
+def test_parse_blocks():
+    document = parse_markdown(SAMPLE)
+
+    kinds = [block.kind for block in document.blocks]
+    assert kinds == ["heading", "paragraph", "code", "table", "quote", "list", "link_card"]
+    code = document.blocks[2]
+    assert isinstance(code, CodeBlock) and (code.language, code.filename, code.code) == (
+        "py",
+        "main.py",
+        'print("hello")',
+    )
+    table = document.blocks[3]
+    assert isinstance(table, Table) and table.align == ["left", "right"] and table.rows == [["a", "1 \\| 2"]]
+    assert isinstance(document.blocks[4], BlockQuote)
+    assert isinstance(document.blocks[5], ListBlock) and len(document.blocks[5].lines) == 3
+    assert isinstance(document.blocks[6], LinkCard) and document.blocks[6].url == "https://example.com/page"
+    assert document.footnotes == {"1": "脚注の本文"}
+
+
+def test_unclosed_fence_runs_to_end():
+    document = parse_markdown("本文\n\n```python\nx = 1\n")
+    assert document.blocks[-1] == CodeBlock(language="python", code="x = 1\n")
+
+
+def test_plain_markdown_round_trips():
+    text = "## 見出し\n\n本文1行目\n本文2行目\n\n- a\n- b\n\n---\n\n```python\nx = 1\n```\n"
+    assert MarkdownRenderer().render(parse_markdown(text)) == text
+
+
+def test_hatena_renderer():
+    rendered = HatenaRenderer().render(parse_markdown(SAMPLE))
+
+    assert "要約します((脚注の本文))。`[^1]`はコード" in rendered
+    assert "[^1]: " not in rendered
+    assert "[https://example.com/page:embed:cite]" in rendered
+    assert "`main.py`\n```python\n" in rendered
+
+
+def test_qiita_renderer():
+    rendered = QiitaRenderer().render(parse_markdown(SAMPLE))
+
+    assert "```python:main.py\n" in rendered
+    assert "\nhttps://example.com/page\n" in rendered
+    assert rendered.endswith("[^1]: 脚注の本文\n")
+
+
+def test_devto_renderer():
+    rendered = DevToRenderer().render(parse_markdown(SAMPLE))
+
+    assert rendered.startswith("## 概要\n")  # h1はタイトルと重なるためh2から
+    assert "<sup>[1](#fn-1)</sup>" in rendered
+    assert '1. <a id="fn-1"></a>脚注の本文' in rendered
+    assert "{% embed https://example.com/page %}" in rendered
+
+
+@pytest.mark.parametrize(
+    ("renderer", "expected"),
+    [
+        (HatenaRenderer(), ["Python", "生成AI", "Web API", "LLM", "自動投稿"]),
+        (QiitaRenderer(), ["Python", "生成AI", "Web-API", "LLM", "自動投稿"]),
+        (DevToRenderer(), ["python", "ai", "webapi", "llm"]),
+    ],
+)
+def test_tags(renderer, expected):
+    categories = ["Python", "生成AI", "Web API", "python", "LLM"]
+    assert renderer.tags(categories, ["自動投稿"]) == expected
+
+
+def test_tag_limit_keeps_presets():
+    assert QiitaRenderer().tags(list("abcdef"), ["自動投稿"]) == ["a", "b", "c", "d", "自動投稿"]
+    assert DevToRenderer().tags(list("abcdef"), ["auto"]) == ["a", "b", "c", "auto"]
@@ -0,0 +1,97 @@
+import asyncio
+import base64
+import json
+
+import pytest
+from mock_servers import MockServers
+
+from cha2hatena.blog.blog_schema import HatenaSecretKeys
+from cha2hatena.media import (
+    FotolifeUploader,
+    ImageRef,
+    MediaConfig,
+    MediaPipeline,
+    attach_images,
+    extract_images,
+    optimize_image,
+)
+
+PNG_1PX = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+)
+JPEG_HEADER = b"\xff\xd8\xff\xe0" + b"\x00" * 32
+
+
+def _export(tmp_path):
+    (tmp_path / "shot.png").write_bytes(PNG_1PX)
+    (tmp_path / "chart.jpg").write_bytes(JPEG_HEADER)
+    data_uri = "data:image/png;base64," + base64.b64encode(PNG_1PX).decode()
+    messages = [
+        {"role": "Prompt", "say": "これを見て ![スクショ](shot.png)"},
+        {"role": "Response", "say": "外部の画像 ![外部](https://example.com/a.png) は対象外"},
+        {"role": "Prompt", "say": f"同じ画像 ![再掲]({data_uri})", "attachments": [{"file_name": "chart.jpg"}]},
+    ]
+    path = tmp_path / "Claude-test.json"
+    path.write_text(json.dumps({"messages": messages}, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def _keys(servers: MockServers) -> HatenaSecretKeys:
+    return HatenaSecretKeys(
+        hatena_entry_url=servers.env()["HATENA_ENTRY_URL"],
+        client_id="key",
+        client_secret="secret",
+        token="token",
+        token_secret="token_secret",
+    )
+
+
+def test_extract_images(tmp_path):
+    images = extract_images([_export(tmp_path)])
+
+    assert [image.alt for image in images] == ["スクショ", "再掲", "chart.jpg"]
+    assert images[0].digest == images[1].digest  # 同じ内容の画像
+    assert images[2].data == JPEG_HEADER
+
+
+def test_pipeline_uploads_each_image_once_across_runs(tmp_path):
+    path = _export(tmp_path)
+    config = MediaConfig(enable=True, cache_path=str(tmp_path / "cache.json"))
+    with MockServers() as servers:
+        uploader = FotolifeUploader(_keys(servers), url=servers.env()["FOTOLIFE_POST_URL"])
+
+        uploaded = asyncio.run(MediaPipeline(config, uploader).run([path]))
+        assert len(uploaded) == 3
+        assert uploaded[0][1] == uploaded[1][1]
+        assert len(servers.fotolife_uploads) == 2  # 重複を除いた2枚だけ
+
+        # 2回目はキャッシュのURLを使い、アップロードしない
+        again = asyncio.run(MediaPipeline(config, uploader).run([path]))
+        assert [url for _, url in again] == [url for _, url in uploaded]
+        assert len(servers.fotolife_uploads) == 2
+
+
+def test_attach_images_replaces_references_and_appends_the_rest():
+    shot = ImageRef(source="shot.png", alt="スクショ", data=PNG_1PX)
+    chart = ImageRef(source="chart.jpg", alt="グラフ", data=JPEG_HEADER)
+    content = "# 記事\n\n![スクショ](shot.png)\n"
+
+    result = attach_images(content, [(shot, "https://f/1.png"), (chart, "https://f/2.jpg")])
+
+    assert "![スクショ](https://f/1.png)" in result
+    assert result.endswith("## 画像\n\n![グラフ](https://f/2.jpg)\n")
+    assert attach_images(content, []) == content
+
+
+def test_optimize_image_resizes_large_images():
+    Image = pytest.importorskip("PIL.Image")
+    import io
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (3200, 1600), "white").save(buffer, format="JPEG")
+
+    data, mime = optimize_image(buffer.getvalue(), max_side=800, quality=80)
+
+    assert mime == "image/jpeg"
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.size == (800, 400)
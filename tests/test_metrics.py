@@ -0,0 +1,64 @@
+import httpx
+import pytest
+
+from cha2hatena.llm.llm_stats import TokenStats
+from cha2hatena.metrics import LLM_FEE, LLM_TOKENS, Registry, record_token_stats
+
+
+def test_render_prometheus_text():
+    registry = Registry()
+    posts = registry.counter("posts_total", "投稿数", ("service", "result"))
+    latency = registry.histogram("post_seconds", "所要時間", ("service",), buckets=(0.5, 1.0))
+    depth = registry.gauge("queue_depth", "待ち件数", ("queue",))
+
+    posts.inc(service="hatena", result="success")
+    posts.inc(2, service="qiita", result="error")
+    latency.observe(0.3, service="hatena")
+    latency.observe(0.7, service="hatena")
+    latency.observe(5, service="hatena")
+    with depth.track(queue="local_llm"):
+        assert depth.get(queue="local_llm") == 1
+
+    text = registry.render()
+    assert "# TYPE posts_total counter" in text
+    assert 'posts_total{service="qiita",result="error"} 2' in text
+    assert 'post_seconds_bucket{service="hatena",le="0.5"} 1' in text
+    assert 'post_seconds_bucket{service="hatena",le="1"} 2' in text
+    assert 'post_seconds_bucket{service="hatena",le="+Inf"} 3' in text
+    assert 'post_seconds_count{service="hatena"} 3' in text
+    assert 'queue_depth{queue="local_llm"} 0' in text
+
+
+def test_label_mismatch_and_negative_counter():
+    counter = Registry().counter("c", "c", ("model",))
+    with pytest.raises(ValueError):
+        counter.inc(service="hatena")
+    with pytest.raises(ValueError):
+        counter.inc(-1, model="x")
+
+
+def test_serve_and_textfile(tmp_path):
+    registry = Registry()
+    registry.counter("jobs_total", "実行回数").inc()
+    server = registry.serve(0)
+    try:
+        response = httpx.get(f"http://127.0.0.1:{server.server_address[1]}/metrics")
+    finally:
+        registry.shutdown()
+    assert response.status_code == 200
+    assert "jobs_total 1" in response.text
+
+    path = tmp_path / "node" / "cha2hatena.prom"
+    registry.write_textfile(path)
+    assert path.read_text(encoding="utf-8") == registry.render()
+    assert list(path.parent.iterdir()) == [path]
+
+
+def test_record_token_stats():
+    model = "gemini-2.5-flash"
+    before = LLM_TOKENS.get(model=model, type="input")
+    stats = TokenStats(1000, 10, 200, 0, 0, model, cached_tokens=400)
+    record_token_stats(stats)
+    assert LLM_TOKENS.get(model=model, type="input") - before == 1000
+    assert LLM_TOKENS.get(model=model, type="cached") >= 400
+    assert LLM_FEE.get(model=model) >= stats.total_fee > 0
@@ -0,0 +1,65 @@
+import asyncio
+
+import httpx
+import pytest
+from mock_servers import Behavior, MockServers
+
+from cha2hatena.blog.blog_schema import BlogClientSchema, HatenaSecretKeys
+from cha2hatena.blog.devto_poster import DevToPoster
+from cha2hatena.blog.hatenablog_poster import HatenaBlogPoster
+from cha2hatena.blog.qiita_poster import QiitaPoster
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    with MockServers() as servers:
+        monkeypatch.setattr(QiitaPoster, "entry_point", servers.env()["QIITA_ENTRY_URL"])
+        monkeypatch.setattr(DevToPoster, "entry_point", servers.env()["DEVTO_ENTRY_URL"])
+        yield servers
+
+
+def _schema(servers: MockServers) -> BlogClientSchema:
+    env = servers.env()
+    return BlogClientSchema(
+        title="モック投稿",
+        content="# 見出し\n\n本文 & <タグ>",
+        categories=["Python"],
+        preset_categories=["自動投稿"],
+        hatena_secret_keys=HatenaSecretKeys(
+            hatena_entry_url=env["HATENA_ENTRY_URL"],
+            client_id="key",
+            client_secret="secret",
+            token="token",
+            token_secret="token_secret",
+        ),
+        qiita_bearer_token="token",
+        devto_api_key="key",
+        is_draft=True,
+    )
+
+
+def test_posters_against_mock_servers(servers):
+    schema = _schema(servers)
+
+    async def _post_all():
+        async with httpx.AsyncClient() as client:
+            posters = [cls.model_validate(schema.model_dump()) for cls in (HatenaBlogPoster, QiitaPoster, DevToPoster)]
+            return await asyncio.gather(*(poster.blog_post(client) for poster in posters))
+
+    hatena, qiita, devto = asyncio.run(_post_all())
+
+    assert hatena.title == "モック投稿"
+    assert hatena.content == "# 見出し\n\n本文 & <タグ>"
+    assert hatena.categories == ["Python", "自動投稿"]
+    assert hatena.is_draft
+    assert qiita.categories == ["Python", "自動投稿"]
+    assert devto.is_draft
+    assert servers.stats[("hatena", 201)] == 1
+
+
+def test_configurable_failures():
+    with MockServers(seed=1, hatena=Behavior(rate_limit_rate=1.0)) as servers:
+        response = httpx.post(servers.env()["HATENA_ENTRY_URL"], content="<entry/>")
+
+    assert response.status_code == 429
+    assert servers.stats[("hatena", 429)] == 1
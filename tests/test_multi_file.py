@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+from cha2hatena.llm.conversational_ai import LlmConfig
+from cha2hatena.llm.llm_stats import TokenStats
+from cha2hatena.llm.multi_file import MultiFileSummarizer
+
+
+class _FakeSummarizer:
+    """barrierを渡すと、その数の要約が同時に実行されるまで待つ（直列に実行されるとタイムアウトする）"""
+
+    def __init__(self, config: LlmConfig, calls: list, barrier: threading.Barrier | None = None):
+        self.config = config
+        self.model = config.model
+        self.barrier = barrier
+        calls.append(config)
+
+    def get_summary(self) -> tuple[dict, TokenStats]:
+        if "失敗" in self.config.conversation:
+            raise RuntimeError("要約に失敗")
+        if "中止" in self.config.conversation:
+            raise SystemExit(1)  # DeepSeekの401・402など
+        if self.barrier and "下書き" not in self.config.conversation:  # 統合は待たない
+            self.barrier.wait(timeout=5)
+        data = {"title": self.config.conversation[:5], "content": self.config.conversation, "categories": ["Python"]}
+        return data, TokenStats(1_000_000, 0, 0, 0, 0, self.model)
+
+
+def _config() -> LlmConfig:
+    return LlmConfig(prompt="要約して", model="deepseek-chat", api_key="k", conversation="")
+
+
+def test_files_are_summarized_concurrently_then_merged(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "g")
+    calls = []
+    barrier = threading.Barrier(3)
+    summarizer = MultiFileSummarizer(
+        _config(),
+        ["a" * 20, "b" * 20, "c" * 20],
+        lambda config: _FakeSummarizer(config, calls, barrier),
+        merge_model="gemini-2.5-flash",
+    )
+
+    _, stats = summarizer.get_summary()
+
+    assert not barrier.broken  # 3ファイルの要約が同時に実行された
+    merge_config = calls[-1]
+    assert merge_config.model == "gemini-2.5-flash"
+    assert merge_config.api_key == "g"
+    assert "3本目の下書き" in merge_config.conversation
+    assert merge_config.prompt.endswith("要約して")
+    assert summarizer.model == "gemini-2.5-flash"
+    assert stats.model_name == "gemini-2.5-flash"
+    assert stats.input_tokens == 4_000_000
+    assert stats.input_fee == pytest.approx(0.28 * 3 + 0.3)
+    # 台帳にはリクエストごとに、それぞれのモデルの料金として記録する
+    assert [s.model_name for s in summarizer.call_stats] == ["deepseek-chat"] * 3 + ["gemini-2.5-flash"]
+    assert sum(s.total_fee for s in summarizer.call_stats) == pytest.approx(stats.total_fee)
+
+
+def test_partial_failure_merges_the_rest():
+    calls = []
+    conversations = ["失敗する会話", "中止する会話", "成功する会話"]
+    summarizer = MultiFileSummarizer(_config(), conversations, lambda config: _FakeSummarizer(config, calls))
+
+    data, _ = summarizer.get_summary()
+
+    # 1本だけ残った場合は統合しない
+    assert data["content"] == "成功する会話"
+    assert len(calls) == 3
+    assert len(summarizer.call_stats) == 1
+
+
+def test_planned_requests_include_the_merge():
+    summarizer = MultiFileSummarizer(
+        _config(), ["a" * 400, "b" * 400], lambda config: _FakeSummarizer(config, []), merge_model="gemini-2.5-flash"
+    )
+
+    requests = summarizer.planned_requests(expected_output_tokens=1000)
+
+    assert [model for model, _ in requests] == ["deepseek-chat", "deepseek-chat", "gemini-2.5-flash"]
+    assert requests[-1][1] > 2 * 1000  # 下書き2本分を入力として見積もる
@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+import pytest
+from mock_servers import MockServers
+
+from cha2hatena import line_message
+from cha2hatena.background import BackgroundLoop
+from cha2hatena.metrics import NOTIFICATIONS
+from cha2hatena.notification import email_notifier
+from cha2hatena.notification.dispatcher import NotificationDispatcher, create_notifiers
+from cha2hatena.notification.email_notifier import EmailNotifier
+from cha2hatena.notification.notifier_schema import AbstractNotifier, EmailConfig, Notification, NotificationConfig
+
+
+class _SlowNotifier(AbstractNotifier):
+    def __init__(self, name: str, delay: float):
+        self.name = name
+        self.delay = delay
+        self.batches: list[list[Notification]] = []
+
+    async def send(self, notifications: list[Notification]) -> bool:
+        await asyncio.sleep(self.delay)
+        self.batches.append(notifications)
+        return True
+
+
+def _notification(idx: int) -> Notification:
+    return Notification(title=f"記事{idx}", text=f"投稿{idx}")
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    with MockServers() as servers:
+        for key, value in servers.env().items():
+            monkeypatch.setenv(key, value)
+        monkeypatch.setattr(line_message, "BROADCAST_URL", servers.env()["LINE_BROADCAST_URL"])
+        yield servers
+
+
+def test_fan_out_to_all_sinks(servers):
+    config = NotificationConfig.model_validate(
+        {"webhook": {"enable": True}, "slack": {"enable": True}, "discord": {"enable": True}}
+    )
+    background = BackgroundLoop()
+    notifiers = create_notifiers(config, background.client, "token")
+    dispatcher = NotificationDispatcher(background, notifiers)
+    assert dispatcher.names == ["line", "webhook", "slack", "discord"]
+
+    dispatcher.publish(Notification(title="記事", text="投稿完了です", url="https://example.com/entry/1"))
+    assert dispatcher.close(timeout=5)
+
+    assert servers.line_broadcasts == [["投稿完了です"]]
+    payloads = dict(servers.webhook_payloads)
+    assert payloads["webhook"]["notifications"][0]["url"] == "https://example.com/entry/1"
+    assert payloads["slack"] == {"text": "投稿完了です"}
+    assert payloads["discord"]["content"] == "投稿完了です"
+
+
+def test_slow_sink_does_not_block_others_or_caller():
+    background = BackgroundLoop()
+    slow, fast = _SlowNotifier("slow", 0.5), _SlowNotifier("fast", 0.0)
+    dispatcher = NotificationDispatcher(background, [slow, fast])
+
+    started = time.perf_counter()
+    for idx in range(3):
+        dispatcher.publish(_notification(idx))
+    assert time.perf_counter() - started < 0.05
+
+    time.sleep(0.2)
+    assert sum(len(batch) for batch in fast.batches) == 3
+    assert slow.batches == []
+    assert dispatcher.close(timeout=5)
+    assert sum(len(batch) for batch in slow.batches) == 3
+
+
+@pytest.mark.parametrize(
+    ("overflow", "expected"),
+    [
+        ("drop_newest", ["投稿0", "投稿1", "投稿2"]),
+        ("drop_oldest", ["投稿0", "投稿3", "投稿4"]),
+        ("coalesce", ["投稿0", "投稿1", "投稿2\n\n投稿3\n\n投稿4"]),
+    ],
+)
+def test_overflow_policies(overflow, expected):
+    background = BackgroundLoop()
+    sink = _SlowNotifier(f"overflow_{overflow}", 0.2)
+    dispatcher = NotificationDispatcher(background, [sink], queue_size=2, overflow=overflow)
+
+    # 1件目の送信中に4件を積む（キューの上限は2件）
+    dispatcher.publish(_notification(0))
+    time.sleep(0.05)
+    for idx in range(1, 5):
+        dispatcher.publish(_notification(idx))
+    assert dispatcher.close(timeout=5)
+
+    assert [notification.text for batch in sink.batches for notification in batch] == expected
+    if overflow == "coalesce":
+        assert sink.batches[-1][-1].count == 3
+        assert sink.batches[-1][-1].title == "記事2 ほか"
+        assert NOTIFICATIONS.get(sink=sink.name, result="coalesced") == 2
+    else:
+        assert NOTIFICATIONS.get(sink=sink.name, result="dropped") == 2
+
+
+def test_missing_webhook_url_is_skipped(monkeypatch):
+    monkeypatch.delenv("SLACK_WEBHOOK_URL", raising=False)
+    config = NotificationConfig.model_validate({"line": False, "slack": {"enable": True}})
+    assert create_notifiers(config, client=None) == []
+
+
+def test_email_notifier(monkeypatch):
+    sent = []
+
+    class _FakeSMTP:
+        def __init__(self, host, port, timeout):
+            self.calls = [("connect", host, port)]
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            sent.append(self.calls)
+
+        def starttls(self):
+            self.calls.append(("starttls",))
+
+        def login(self, username, password):
+            self.calls.append(("login", username, password))
+
+        def send_message(self, message):
+            self.calls.append(("send", message["Subject"], message["To"], message.get_content().strip()))
+
+    monkeypatch.setattr(email_notifier.smtplib, "SMTP", _FakeSMTP)
+    config = EmailConfig(
+        enable=True, host="smtp.example.com", username="me", recipients=["a@example.com", "b@example.com"]
+    )
+    notifier = EmailNotifier(config, password="secret")
+
+    assert asyncio.run(notifier.send([_notification(1), _notification(2)]))
+    assert sent == [
+        [
+            ("connect", "smtp.example.com", 587),
+            ("starttls",),
+            ("login", "me", "secret"),
+            ("send", "[cha2hatena] 2件の投稿通知", "a@example.com, b@example.com", "投稿1\n\n投稿2"),
+        ]
+    ]
@@ -0,0 +1,87 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import ClassVar
+
+import pytest
+
+from cha2hatena.llm.conversational_ai import LlmConfig
+from cha2hatena.llm.openai_compatible_client import OpenAiCompatibleClient
+
+AI_OUTPUT = {"title": "ローカル要約", "content": "本文", "categories": ["テスト"]}
+
+
+class _ChatCompletionsHandler(BaseHTTPRequestHandler):
+    requests: ClassVar[list[dict]] = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.requests.append(body)
+        payload = {
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": json.dumps(AI_OUTPUT, ensure_ascii=False)},
+                }
+            ],
+            "usage": {"prompt_tokens": 120, "completion_tokens": 30, "total_tokens": 150},
+        }
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ChatCompletionsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+
+
+def test_local_summary(local_server):
+    config = LlmConfig(
+        prompt="要約して",
+        model="local:qwen2.5:7b",
+        api_key="no-key",
+        conversation="会話ログ",
+        base_url=local_server,
+    )
+    data, stats = OpenAiCompatibleClient(config).get_summary()
+
+    sent = _ChatCompletionsHandler.requests[-1]
+    assert sent["model"] == "qwen2.5:7b"
+    assert sent["messages"][-1]["content"] == "会話ログ"
+    assert data == AI_OUTPUT
+    assert stats.input_tokens == 120
+    assert stats.total_fee == 0
+
+
+def test_semaphore_follows_max_concurrency():
+    def client(max_concurrency: int) -> OpenAiCompatibleClient:
+        config = LlmConfig(
+            prompt="p",
+            model="local:m",
+            api_key="k",
+            conversation="c",
+            base_url="http://127.0.0.1:1/semaphore-test",
+            max_concurrency=max_concurrency,
+        )
+        return OpenAiCompatibleClient(config)
+
+    first, same, reloaded = client(1), client(1), client(3)
+
+    assert first.semaphore is same.semaphore  # 同じサーバー・同じ上限なら共有
+    assert reloaded.semaphore is not first.semaphore
+    assert all(reloaded.semaphore.acquire(blocking=False) for _ in range(3))
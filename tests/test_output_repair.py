@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from cha2hatena.llm.conversational_ai import ConversationalAi, LlmConfig
+from cha2hatena.llm.llm_stats import TokenStats
+from cha2hatena.llm.output_repair import (
+    PARTIAL_NOTICE,
+    OutputRepairError,
+    is_partial,
+    parse_ai_output,
+    repair_partial_json,
+)
+
+VALID = {"title": "タイトル", "content": "# 見出し\n\n本文 {a, b}", "categories": ["Python", "JSON"]}
+
+
+@pytest.mark.parametrize(
+    "text, stage",
+    [
+        (json.dumps(VALID, ensure_ascii=False), "as_is"),
+        ("以下が記事です。\n```json\n" + json.dumps(VALID, ensure_ascii=False) + "\n```\n以上です。", "extracted"),
+        (json.dumps(VALID, ensure_ascii=False)[:-1] + ",}", "trailing_comma"),
+        ('{"title": "タイトル", "content": "1行目\n2行目", "categories": ["Python"]}', "as_is"),
+    ],
+)
+def test_parse_recovers_common_breakage(text, stage):
+    output, used = parse_ai_output(text)
+    assert used == stage
+    assert output.title == "タイトル"
+    assert not is_partial(output.content)
+
+
+def test_truncated_output_is_closed():
+    text = '```json\n{"title": "タイトル", "categories": ["Python", "JSON"], "content": "# 見出し\\n\\n途中で切れ'
+    output, stage = parse_ai_output(text)
+    assert stage == "partial"
+    # 末尾が欠けている可能性を本文の先頭で知らせる（この記事は下書きとして投稿される）
+    assert output.content == PARTIAL_NOTICE + "# 見出し\n\n途中で切れ"
+    assert is_partial(output.content)
+    assert output.categories == ["Python", "JSON"]
+
+    assert json.loads(repair_partial_json('{"title": "a", "conte')) == {"title": "a"}
+    assert json.loads(repair_partial_json('{"title": "a", "categories": ["x",')) == {"title": "a", "categories": ["x"]}
+
+
+def test_coerce_categories_and_reject_missing_fields():
+    output, _ = parse_ai_output('{"Title": "t", "content": "c", "categories": "a, b、c, d, e"}')
+    assert output.categories == ["a", "b", "c", "d"]
+
+    with pytest.raises(OutputRepairError):
+        parse_ai_output('{"title": "t"}')
+
+
+class _FakeClient(ConversationalAi):
+    def __init__(self, config: LlmConfig, response: str):
+        super().__init__(config)
+        self.response = response
+
+    def get_summary(self):
+        data = self.check_response(self.response)
+        return data, self.add_repair_stats(TokenStats(1_000_000, 0, 0, 0, 0, self.model))
+
+
+def test_fix_call_on_small_model_when_local_repair_fails(monkeypatch):
+    fixer_calls = []
+
+    def _create_client(config: LlmConfig):
+        fixer_calls.append(config)
+        return _FakeClient(config, json.dumps(VALID, ensure_ascii=False))
+
+    monkeypatch.setattr("cha2hatena.llm.factory.create_ai_client", _create_client)
+    monkeypatch.setenv("GEMINI_API_KEY", "g")
+    config = LlmConfig(
+        prompt="要約", model="deepseek-chat", api_key="k", conversation="長い会話ログ", repair_model="gemini-2.5-flash"
+    )
+
+    data, stats = _FakeClient(config, "title: タイトル / content: 本文").get_summary()
+
+    assert data["title"] == "タイトル"
+    assert fixer_calls[0].conversation == "title: タイトル / content: 本文"  # 会話ログは送り直さない
+    assert fixer_calls[0].repair_model is None
+    # deepseek-chat 1Mトークン + gemini-2.5-flash 1Mトークン
+    assert stats.input_fee == pytest.approx(0.28 + 0.3)
+    assert stats.input_tokens == 2_000_000
@@ -0,0 +1,74 @@
+from cha2hatena.compaction import estimate_tokens
+from cha2hatena.retrieval import CONTEXT_FOOTER, CONTEXT_HEADER, ContextConfig, Retriever, build_context, make_digest
+from cha2hatena.search_index import SearchConfig, SearchIndex
+
+ARTICLE = """# SQLiteのWALモード
+
+WALモードでは読み込みと書き込みが同時に行える。チェックポイントで本体に反映される。
+
+```sql
+PRAGMA journal_mode=WAL;
+```
+
+## BEGIN IMMEDIATE
+
+- **書き込みロック**を先に取る。デッドロックを避けられる。
+- 2行目は省略される
+
+## 関連記事
+
+- [前の記事](https://blog.example/1)
+"""
+
+
+def test_make_digest():
+    digest = make_digest(ARTICLE, 300)
+
+    assert digest == (
+        "[SQLiteのWALモード] WALモードでは読み込みと書き込みが同時に行える。 "
+        "[BEGIN IMMEDIATE] 書き込みロックを先に取る。"
+    )
+    assert make_digest(ARTICLE, 20) == digest[:19] + "…"
+
+
+def test_build_context_respects_token_budget(tmp_path):
+    summary_dir = tmp_path / "summary"
+    summary_dir.mkdir()
+    with SearchIndex(tmp_path / "search") as index:
+        for i in range(5):
+            key = f"2511{i:02}-SQLite{i}.txt"
+            (summary_dir / key).write_text(ARTICLE, encoding="utf-8")
+            index.add(key, f"SQLite{i}", ARTICLE, url=f"https://blog.example/{i}")
+        conversation = "SQLiteのWALモードとBEGIN IMMEDIATEについて質問"
+
+        context = build_context(index, summary_dir, conversation, ContextConfig(top_k=5, max_tokens=2000))
+        assert context.startswith(CONTEXT_HEADER) and context.endswith(CONTEXT_FOOTER + "\n\n")
+        assert context.count("https://blog.example/") == 5
+
+        small = build_context(index, summary_dir, conversation, ContextConfig(top_k=5, max_tokens=200))
+        assert 0 < small.count("https://blog.example/") < 5
+        assert estimate_tokens(small) <= 200
+
+        assert build_context(index, summary_dir, "Docker", ContextConfig()) == ""
+
+
+def test_retriever_shares_one_index_and_skips_when_disabled(tmp_path):
+    search_config = SearchConfig(enable=True, index_dir=str(tmp_path / "search"), related_links=3)
+    (tmp_path / "summary").mkdir()
+    with SearchIndex(tmp_path / "search", search_config) as index:
+        for i in range(2):
+            key = f"2511{i:02}-SQLite{i}.txt"
+            (tmp_path / "summary" / key).write_text(ARTICLE, encoding="utf-8")
+            index.add(key, f"SQLite{i}", ARTICLE, url=f"https://blog.example/{i}")
+
+    with Retriever(search_config, ContextConfig(enable=True), tmp_path, None) as retriever:
+        assert retriever.context("SQLiteのWALモード").count("https://blog.example/") == 2
+        content = retriever.add_related_links("WALモード", "本文\n", exclude={"251100-SQLite0.txt"})
+        assert content.startswith("本文\n") and "https://blog.example/1" in content
+        assert "https://blog.example/0" not in content
+
+    with Retriever(
+        search_config.model_copy(update={"enable": False}), ContextConfig(enable=True), tmp_path, None
+    ) as off:
+        assert off.index is None
+        assert off.context("SQLite") == "" and off.add_related_links("WAL", "本文", set()) == "本文"
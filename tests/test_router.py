@@ -0,0 +1,98 @@
+import time
+
+import pytest
+
+from cha2hatena.llm.conversational_ai import ConversationalAi, LlmConfig, LlmOverloadedError
+from cha2hatena.llm.llm_stats import TokenStats
+from cha2hatena.llm.router import LlmRouter
+
+
+class _FakeClient(ConversationalAi):
+    def __init__(self, model: str, delay: float = 0.0, overloaded: bool = False):
+        super().__init__(LlmConfig(prompt="p", model=model, api_key="k", conversation="c"))
+        self.delay = delay
+        self.overloaded = overloaded
+        self.called = False
+
+    def get_summary(self) -> tuple[dict, TokenStats]:
+        self.called = True
+        time.sleep(self.delay)
+        if self.overloaded:
+            raise LlmOverloadedError(self.model)
+        return {"title": self.model}, TokenStats(1, 0, 1, 1, 1, self.model)
+
+
+def test_failover_on_overload():
+    router = LlmRouter([_FakeClient("gemini-2.5-flash", overloaded=True), _FakeClient("deepseek-chat")])
+    data, stats = router.get_summary()
+
+    assert data["title"] == "deepseek-chat"
+    assert router.model == "deepseek-chat"
+
+
+def test_hedged_request_takes_faster_answer():
+    slow = _FakeClient("gemini-2.5-flash", delay=2.0)
+    fast = _FakeClient("deepseek-chat", delay=0.05)
+    router = LlmRouter([slow, fast], hedge_after=0.1)
+
+    started = time.perf_counter()
+    data, _ = router.get_summary()
+
+    assert data["title"] == "deepseek-chat"
+    assert time.perf_counter() - started < 1.0
+
+
+def test_no_hedge_when_primary_is_fast():
+    secondary = _FakeClient("deepseek-chat")
+    router = LlmRouter([_FakeClient("gemini-2.5-flash"), secondary], hedge_after=1.0)
+    router.get_summary()
+
+    assert not secondary.called
+
+
+def test_all_overloaded():
+    router = LlmRouter(
+        [_FakeClient("gemini-2.5-flash", overloaded=True), _FakeClient("deepseek-chat", overloaded=True)]
+    )
+    with pytest.raises(LlmOverloadedError):
+        router.get_summary()
+
+
+class _ExitClient(_FakeClient):
+    def get_summary(self) -> tuple[dict, TokenStats]:
+        time.sleep(self.delay)
+        raise SystemExit(1)  # DeepSeekの401・402など
+
+
+def test_exit_in_one_attempt_lets_the_other_win():
+    router = LlmRouter([_FakeClient("gemini-2.5-flash", delay=0.3), _ExitClient("deepseek-chat")], hedge_after=0.05)
+    data, _ = router.get_summary()
+
+    assert data["title"] == "gemini-2.5-flash"
+
+
+def test_exit_without_other_attempt_stops_the_run():
+    router = LlmRouter([_ExitClient("gemini-2.5-flash"), _FakeClient("deepseek-chat")])
+    with pytest.raises(SystemExit):
+        router.get_summary()
+
+
+def test_losing_attempt_is_cancelled():
+    slow = _FakeClient("gemini-2.5-flash", delay=0.5)
+    router = LlmRouter([slow, _FakeClient("deepseek-chat")], hedge_after=0.05)
+    router.get_summary()
+
+    assert slow.cancelled.is_set()
+    with pytest.raises(LlmOverloadedError):
+        slow.handle_server_error(0, 3)  # キャンセル後はリトライしない
+
+
+def test_losing_attempt_stats_are_reported():
+    discarded = []
+    slow = _FakeClient("gemini-2.5-flash", delay=0.3)
+    router = LlmRouter([slow, _FakeClient("deepseek-chat")], hedge_after=0.05, on_discarded=discarded.append)
+    _, stats = router.get_summary()
+
+    assert stats.model_name == "deepseek-chat"
+    assert [s.model_name for s in router.wait_discarded(timeout=5)] == ["gemini-2.5-flash"]
+    assert [s.model_name for s in discarded] == ["gemini-2.5-flash"]
@@ -0,0 +1,126 @@
+import threading
+import time as time_module
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from cha2hatena.blog.devto_poster import DevToPoster
+from cha2hatena.scheduler import PublishQueue, ScheduleConfig, keep_alive, next_slot, run_queue
+
+JST = ZoneInfo("Asia/Tokyo")
+NOW = datetime(2026, 1, 15, 20, 55, tzinfo=JST)  # 木曜日
+
+
+def test_next_slot_respects_lead_time_weekdays_and_taken():
+    config = ScheduleConfig(slots=[time(21, 0), time(7, 30)], weekdays=["Mon", "thu"], min_lead_minutes=10)
+
+    assert config.slots == [time(7, 30), time(21, 0)]
+    # 21:00まで10分を切っているので次の月曜の朝
+    assert next_slot(config, NOW, set()) == datetime(2026, 1, 19, 7, 30, tzinfo=JST)
+    taken = {datetime(2026, 1, 19, 7, 30, tzinfo=JST)}
+    assert next_slot(config, NOW, taken) == datetime(2026, 1, 19, 21, 0, tzinfo=JST)
+    # 別のタイムゾーンで渡しても同じ枠
+    assert next_slot(config, NOW.astimezone(ZoneInfo("UTC")), taken) == datetime(2026, 1, 19, 21, 0, tzinfo=JST)
+
+
+def test_config_rejects_unknown_weekday():
+    with pytest.raises(ValueError):
+        ScheduleConfig(weekdays=["someday"])
+
+
+def test_backfill_is_spread_over_slots(tmp_path):
+    config = ScheduleConfig(min_lead_minutes=0)
+    with PublishQueue(tmp_path / "schedule.sqlite3") as queue:
+        slots = [queue.enqueue("post", {"post": {"title": f"{i}"}}, config, now=NOW).slot for i in range(3)]
+        # 要約のやり直しは記事の枠を使わない
+        queue.enqueue("summarize", {"inputs": []}, config, now=NOW)
+
+        assert slots == [datetime(2026, 1, day, 21, 0, tzinfo=JST) for day in (15, 16, 17)]
+        assert queue.claim_due(NOW) is None
+        assert len(queue.jobs()) == 4
+
+
+def test_claim_fail_retry_and_recover(tmp_path):
+    config = ScheduleConfig(min_lead_minutes=0, max_attempts=2, retry_minutes=30)
+    with PublishQueue(tmp_path / "schedule.sqlite3") as queue:
+        queue.enqueue("post", {"post": {"title": "a"}}, config, now=NOW)
+        due = NOW + timedelta(minutes=5)
+
+        job = queue.claim_due(due)
+        assert job.status == "running" and job.attempts == 1
+        assert queue.claim_due(due) is None  # 実行中は二重に取り出さない
+
+        assert queue.fail(job, "503", config, due) is True
+        assert queue.claim_due(due) is None
+        assert queue.next_due() == due + timedelta(minutes=30)
+
+        job = queue.claim_due(due + timedelta(minutes=30))
+        assert job.attempts == 2
+        assert queue.fail(job, "503", config, due) is False
+        assert [job.status for job in queue.jobs()] == ["failed"]
+
+    # デーモンが実行中に止まった場合
+    with PublishQueue(tmp_path / "other.sqlite3") as queue:
+        queue.enqueue("post", {"post": {"title": "b"}}, config, now=NOW)
+        job = queue.claim_due(due)
+        lease = timedelta(minutes=10)
+        assert queue.recover(due + timedelta(minutes=9), lease) == 0  # まだ実行中の可能性がある
+        assert queue.recover(due + lease + timedelta(seconds=1), lease) == 1
+        assert queue.claim_due(due + lease).id == job.id
+        queue.complete(job.id, due)
+        assert queue.jobs() == [] and queue.next_due() is None
+
+
+def test_heartbeat_keeps_running_job_from_recovery(tmp_path):
+    config = ScheduleConfig(min_lead_minutes=0)
+    path = tmp_path / "schedule.sqlite3"
+    lease = timedelta(minutes=10)
+    with PublishQueue(path) as queue:
+        queue.enqueue("post", {"post": {"title": "a"}}, config, now=NOW)
+        job = queue.claim_due(NOW + timedelta(minutes=5))
+        now = datetime.now(JST)
+        with keep_alive(path, job.id, interval=0.01):
+            time_module.sleep(0.1)
+            # 別のデーモンからは、heartbeatが続いている間は止まったジョブに見えない
+            assert queue.recover(now + timedelta(minutes=9), lease) == 0
+        assert queue.recover(now + timedelta(minutes=11), lease) == 1
+
+        # 投稿済みにした後のheartbeatで実行中に戻ることはない
+        job = queue.claim_due(NOW + timedelta(minutes=5))
+        queue.complete(job.id)
+        queue.heartbeat(job.id, now)
+        assert queue.get(job.id).status == "done"
+
+
+def test_run_queue_retries_only_jobs_not_yet_posted(tmp_path):
+    config = ScheduleConfig(min_lead_minutes=0, max_attempts=2)
+    path = tmp_path / "schedule.sqlite3"
+    past = datetime.now(JST) - timedelta(days=2)
+    with PublishQueue(path) as queue:
+        posted = queue.enqueue("post", {"post": {"title": "a"}}, config, now=past)
+        failed = queue.enqueue("post", {"post": {"title": "b"}}, config, now=past)
+
+    def execute(job, on_posted):
+        if job.id == posted.id:
+            on_posted()
+            raise OSError("record.csvに書き込めません")
+        raise RuntimeError("503")
+
+    finished = []
+    run_queue(path, lambda: config, execute, threading.Event(), once=True, on_finished=finished.append)
+
+    with PublishQueue(path) as queue:
+        # 投稿済みのジョブは記録の書き出しに失敗しても再試行しない
+        assert queue.get(posted.id).status == "done"
+        assert queue.get(failed.id).status == "pending"
+    assert finished == [posted.id]
+
+
+def test_devto_published_at_only_in_future():
+    base = {"title": "t", "content": "c", "devto_api_key": "k", "is_draft": False}
+    future = datetime.now(JST) + timedelta(days=1)
+
+    assert DevToPoster.model_validate({**base, "updated": future}).published_at == future
+    assert DevToPoster.model_validate({**base, "updated": NOW}).published_at is None
+    assert DevToPoster.model_validate(base).published_at is None
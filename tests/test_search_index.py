@@ -0,0 +1,69 @@
+import csv
+
+import numpy as np
+
+from cha2hatena.search_index import SearchConfig, SearchIndex, related_links, tokenize
+
+POSTS = {
+    "251101-Pythonの非同期処理.txt": ("Pythonの非同期処理", "asyncioとイベントループ、タスクのキャンセルについて学んだ。"),
+    "251102-SQLiteのWALモード.txt": ("SQLiteのWALモード", "SQLiteのジャーナルモードとBEGIN IMMEDIATEによる排他制御。"),
+    "251103-Dockerの基本.txt": ("Dockerの基本", "コンテナとイメージ、Dockerfileの書き方。"),
+}
+
+
+def _add_all(index: SearchIndex) -> None:
+    for key, (title, text) in POSTS.items():
+        index.add(key, title, text, url=f"https://blog.example/{key[:6]}")
+
+
+def test_tokenize():
+    assert tokenize("Python入門、ＡＰＩ") == ["python", "入門", "api"]
+    assert tokenize("非同期処理") == ["非同", "同期", "期処", "処理"]
+
+
+def test_bm25_search(tmp_path):
+    with SearchIndex(tmp_path / "search") as index:
+        _add_all(index)
+        assert index.add("251103-Dockerの基本.txt", "重複", "") is False
+        assert len(index) == 3
+
+        hits = index.search("sqliteの排他制御")
+        assert hits[0].title == "SQLiteのWALモード"
+        assert [hit.title for hit in index.search("asyncio", exclude={"251101-Pythonの非同期処理.txt"})] == []
+        assert index.search("該当なしxyz") == []
+
+
+def test_embeddings_are_fused_with_bm25(tmp_path):
+    # 「コンテナ」を含む文だけDocker寄りのベクトルにする簡易な埋め込み
+    def embed(texts):
+        return [[1.0, 0.0] if "コンテナ" in text or "仮想化" in text else [0.0, 1.0] for text in texts]
+
+    with SearchIndex(tmp_path / "search", SearchConfig(), embed) as index:
+        _add_all(index)
+        assert index.dim == 2
+        matrix = np.memmap(index.vector_path, dtype=np.float32, mode="r").reshape(-1, 2)
+        assert matrix.shape == (3, 2)
+
+        # BM25では一致する語がなくても、埋め込みで近い記事が見つかる
+        assert index.search("仮想化")[0].title == "Dockerの基本"
+
+
+def test_backfill_and_related_links(tmp_path):
+    summary_dir = tmp_path / "summary"
+    summary_dir.mkdir()
+    for key, (_, text) in POSTS.items():
+        (summary_dir / key).write_text(text, encoding="utf-8")
+    csv_path = tmp_path / "record.csv"
+    with csv_path.open("w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=["entry_URL", "entry_title"])
+        writer.writeheader()
+        writer.writerow({"entry_URL": "https://blog.example/docker", "entry_title": "Dockerの基本"})
+
+    with SearchIndex(tmp_path / "search") as index:
+        assert index.backfill(summary_dir, csv_path) == 3
+        assert index.backfill(summary_dir, csv_path) == 0
+        hits = index.search("Docker コンテナ SQLite")
+
+    links = related_links(hits)
+    assert links == "\n\n## 関連記事\n\n- [Dockerの基本](https://blog.example/docker)\n"  # URLのない記事は載せない
+    assert related_links([]) == ""
@@ -0,0 +1,71 @@
+import csv
+
+import pytest
+
+from cha2hatena.blog.tag_index import TagIndex, TagIndexConfig, jaro_winkler, normalize_tag
+
+
+@pytest.fixture
+def index():
+    index = TagIndex(TagIndexConfig(enable=True))
+    index.add(["Python", "生成AI", "Web API", "自動投稿"])
+    index.add(["Python", "JavaScript", "自動投稿"])
+    index.add(["python", "Docker"])
+    return index
+
+
+def test_jaro_winkler():
+    assert jaro_winkler("martha", "marhta") == pytest.approx(0.961, abs=1e-3)
+    assert jaro_winkler("abc", "abc") == 1.0
+    assert jaro_winkler("abc", "xyz") == 0.0
+    assert normalize_tag("Ｗｅｂ-Api") == normalize_tag("web api") == "webapi"
+
+
+def test_snap_to_existing_categories(index):
+    assert len(index) == 6
+    # 表記ゆれは最も多く使われている表記へ
+    assert index.snap(["PYTHON", "生成 AI", "WebAPI"]) == ["Python", "生成AI", "Web API"]
+    # 綴りの近いもの
+    assert index.snap(["Dockr", "Javascripts"]) == ["Docker", "JavaScript"]
+    # 揃えた結果の重複は除く
+    assert index.snap(["Python", "PYTHON", "Pythn"]) == ["Python"]
+
+
+def test_keep_new_categories(index):
+    assert index.snap(["Java", "Rust", "SQLite"]) == ["Java", "Rust", "SQLite"]
+    assert index.match("Java") is None  # JavaScriptとは文字数の差が大きい
+
+
+@pytest.mark.parametrize(
+    ("existing", "tag"),
+    [
+        ("Gemini 2.0", "Gemini 2.5"),
+        ("Python 3.12", "Python 3.13"),
+        ("Claude 3", "Claude 4"),
+        ("Python", "python3"),
+        ("React", "Preact"),
+    ],
+)
+def test_versions_and_different_names_are_not_merged(existing, tag):
+    index = TagIndex(TagIndexConfig(enable=True))
+    index.add([existing])
+    assert index.match(tag) is None
+    assert index.snap([existing, tag]) == [existing, tag]
+
+
+def test_typos_in_versioned_tags_are_merged():
+    index = TagIndex(TagIndexConfig(enable=True))
+    index.add(["Gemini 2.5", "React"])
+    assert index.snap(["Gemnii 2.5", "Reakt"]) == ["Gemini 2.5", "React"]
+
+
+def test_from_csv(tmp_path):
+    path = tmp_path / "record.csv"
+    with path.open("w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=["entry_title", "categories"])
+        writer.writeheader()
+        writer.writerow({"entry_title": "a", "categories": "Python,生成AI,自動投稿"})
+        writer.writerow({"entry_title": "b", "categories": ""})
+
+    assert TagIndex.from_csv(path).snap(["生成ＡＩ"]) == ["生成AI"]
+    assert len(TagIndex.from_csv(tmp_path / "missing.csv")) == 0
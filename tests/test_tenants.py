@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import pytest
+
+from cha2hatena.blog.blog_schema import BlogClientSchema, HatenaSecretKeys
+from cha2hatena.tenants import DEFAULT_TENANT, TenantsConfig, fan_out, tenant_schemas
+
+
+def _job(log: list, name: str, seconds: float):
+    async def _run():
+        await asyncio.sleep(seconds)
+        log.append(name)
+        return name
+
+    return _run
+
+
+def test_slow_tenant_does_not_starve_others():
+    config = TenantsConfig.model_validate(
+        {
+            "max_concurrency": 2,
+            "default": {"max_concurrency": 1},
+            "accounts": [{"name": "slow", "env_prefix": "SLOW", "max_concurrency": 1}],
+        }
+    )
+    log: list[str] = []
+    jobs = {
+        "slow": [_job(log, f"slow{i}", 0.3) for i in range(2)],
+        DEFAULT_TENANT: [_job(log, f"fast{i}", 0.01) for i in range(5)],
+    }
+
+    results = asyncio.run(fan_out(jobs, config))
+
+    assert results[DEFAULT_TENANT] == [f"fast{i}" for i in range(5)]
+    assert results["slow"] == ["slow0", "slow1"]
+    # 遅いアカウントは自分の枠（1つ）しか使わないため、既定のアカウントは先に全部終わる
+    assert log.index("fast4") < log.index("slow0")
+
+
+def test_timeout_and_errors_are_returned_per_job():
+    config = TenantsConfig.model_validate({"default": {"timeout": 0.05}})
+
+    async def _fail():
+        raise ValueError("401")
+
+    results = asyncio.run(fan_out({DEFAULT_TENANT: [_job([], "late", 1), _fail, _job([], "ok", 0)]}, config))
+
+    assert isinstance(results[DEFAULT_TENANT][0], TimeoutError)
+    assert isinstance(results[DEFAULT_TENANT][1], ValueError)
+    assert results[DEFAULT_TENANT][2] == "ok"
+
+
+def test_min_interval_paces_posts():
+    config = TenantsConfig.model_validate({"default": {"max_concurrency": 3, "min_interval": 0.05}})
+    started: list[float] = []
+
+    async def _record():
+        started.append(time.perf_counter())
+
+    asyncio.run(fan_out({DEFAULT_TENANT: [_record] * 3}, config))
+
+    assert started[2] - started[0] >= 0.09
+
+
+def test_tenant_schemas(monkeypatch):
+    monkeypatch.setenv("SUB_HATENA_ENTRY_URL", "https://blog.hatena.ne.jp/sub/sub.hatenablog.com/atom/entry")
+    monkeypatch.setenv("SUB_HATENA_CONSUMER_KEY", "sub-key")
+    monkeypatch.setenv("SUB_QIITA_BEARER_TOKEN", "sub-qiita")
+    monkeypatch.delenv("MISSING_HATENA_ENTRY_URL", raising=False)
+    config = TenantsConfig.model_validate(
+        {
+            "accounts": [
+                {"name": "sub", "env_prefix": "SUB_", "qiita": True, "preset_category": ["サブ"]},
+                {"name": "missing", "env_prefix": "MISSING"},
+            ]
+        }
+    )
+    schema = BlogClientSchema(
+        title="t",
+        content="c",
+        categories=["Python"],
+        preset_categories=["自動投稿"],
+        hatena_secret_keys=HatenaSecretKeys(
+            hatena_entry_url="https://blog.hatena.ne.jp/main/atom/entry",
+            client_id="key",
+            client_secret="secret",
+            token="token",
+            token_secret="token_secret",
+        ),
+        devto_api_key="main-devto",
+    )
+
+    schemas = tenant_schemas(schema, config)
+
+    assert list(schemas) == [DEFAULT_TENANT, "sub"]  # 秘密情報のないアカウントは除く
+    sub = schemas["sub"]
+    assert sub.hatena_secret_keys.hatena_client_key == "sub-key"
+    assert (sub.qiita_bearer_token, sub.devto_api_key) == ("sub-qiita", None)
+    assert sub.preset_categories == ["サブ"]
+    assert schemas[DEFAULT_TENANT].hatena_secret_keys.hatena_client_key == "key"
+
+
+def test_account_names_must_be_unique():
+    with pytest.raises(ValueError):
+        TenantsConfig.model_validate({"accounts": [{"name": "default", "env_prefix": "X"}]})
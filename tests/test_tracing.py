@@ -0,0 +1,89 @@
+import asyncio
+import contextvars
+import json
+import threading
+
+import pytest
+
+from cha2hatena.tracing import Tracer
+
+
+def test_span_parent_child_and_error():
+    tracer = Tracer()
+
+    with tracer.span("pipeline"):
+        with tracer.span("summarize", model="gemini-2.5-flash"):
+            pass
+        with pytest.raises(ValueError):
+            with tracer.span("blog_post"):
+                raise ValueError("失敗")
+
+    spans = {span.name: span for span in tracer.spans}
+    root = spans["pipeline"]
+    assert root.parent_id is None
+    assert spans["summarize"].parent_id == root.span_id
+    assert spans["summarize"].trace_id == root.trace_id
+    assert spans["blog_post"].error == "ValueError: 失敗"
+    assert root.error is None
+
+
+def test_context_propagates_to_tasks_and_threads():
+    tracer = Tracer()
+
+    async def _post(service: str):
+        with tracer.span("http.post", service=service):
+            await asyncio.sleep(0)
+
+    def _thread_target():
+        with tracer.span("llm.request"):
+            pass
+
+    async def _post_all():
+        await asyncio.gather(_post("hatena"), _post("qiita"))
+
+    with tracer.span("pipeline") as root:
+        asyncio.run(_post_all())
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(_thread_target,))
+        thread.start()
+        thread.join()
+
+    children = [span for span in tracer.spans if span.name != "pipeline"]
+    assert len(children) == 3
+    assert all(span.parent_id == root.span_id for span in children)
+
+
+def test_export_json_and_summary(tmp_path):
+    tracer = Tracer()
+    with tracer.span("pipeline"):
+        tracer.record("import_and_setup", 0, 2_000_000_000)
+        with tracer.span("summarize", input_tokens=100, cached=True):
+            pass
+
+    path = tmp_path / "trace.json"
+    tracer.export_json(path)
+    spans = json.loads(path.read_text(encoding="utf-8"))["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    summarize = next(span for span in spans if span["name"] == "summarize")
+    assert {"key": "input_tokens", "value": {"intValue": "100"}} in summarize["attributes"]
+    assert {"key": "cached", "value": {"boolValue": True}} in summarize["attributes"]
+
+    table = tracer.summary_table()
+    assert "import_and_setup" in table
+    assert "summarize" in table
+
+
+def test_new_trace_and_drain(tmp_path):
+    tracer = Tracer()
+    with tracer.span("pipeline"):
+        for job in range(2):
+            with tracer.new_trace(), tracer.span("scheduled_job", job=job), tracer.span("summarize"):
+                pass
+            tracer.export_json(tmp_path / "trace.jsonl", tracer.drain(), append=True)
+            assert tracer.spans == []
+
+    lines = [json.loads(line) for line in (tmp_path / "trace.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert len(lines) == 2
+    for line in lines:
+        spans = {s["name"]: s for s in line["resourceSpans"][0]["scopeSpans"][0]["spans"]}
+        assert "parentSpanId" not in spans["scheduled_job"]
+        assert spans["summarize"]["parentSpanId"] == spans["scheduled_job"]["spanId"]
+    assert [span.name for span in tracer.drain()] == ["pipeline"]